@@ -1,5 +1,6 @@
 import sys
 import atexit
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 
 from codeaide.logic.chat_handler import ChatHandler
@@ -7,6 +8,9 @@ from codeaide.utils import api_utils
 
 
 def main():
+    # Code validation runs in a spawned worker process, which needs this in a
+    # frozen (PyInstaller) build
+    multiprocessing.freeze_support()
     chat_handler = ChatHandler()
     atexit.register(chat_handler.cleanup)
 
@@ -18,6 +22,15 @@ def main():
         else:
             print("Connection failed.")
             print("Error:", message)
+    elif len(sys.argv) > 2 and sys.argv[1] == "autofix":
+        result = chat_handler.run_auto_fix(" ".join(sys.argv[2:]))
+        for iteration in result.iterations:
+            print(iteration.get_summary())
+        print(
+            f"{result.reason} ({len(result.iterations)} iterations, "
+            f"{result.elapsed:.1f} seconds, {result.total_tokens} tokens)"
+        )
+        sys.exit(0 if result.succeeded else 1)
     else:
         app = QApplication(sys.argv)
         chat_handler.start_application()
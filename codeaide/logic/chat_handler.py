@@ -1,25 +1,100 @@
 import json
 import os
 import re
+import threading
+import time
 import traceback
 from codeaide.utils.api_utils import (
     parse_response,
     send_api_request,
     get_api_client,
+    get_response_text,
+    get_token_usage,
     save_api_key,
+    warm_up_api_client,
     QuotaExceededException,
+    RequestCancelled,
 )
 from codeaide.utils.constants import (
     MAX_RETRIES,
     AI_PROVIDERS,
+    AUTO_FIX_BUDGET,
+    AUTO_FIX_MAX_ITERATIONS,
+    AUTO_MIN_TIER,
+    ASSUME_DEFAULTS,
+    ASSUME_DEFAULTS_PROMPT,
+    ASSUME_DEFAULTS_REPLY,
+    CODE_PROBLEMS_ADVICE,
+    EDIT_BLOCKS_ADVICE,
+    AUTO_MODEL,
+    AUTO_PROVIDER,
     DEFAULT_PROVIDER,
+    ELIDE_SUPERSEDED_CODE,
+    EDIT_MODE_PROMPT,
+    BEST_OF_N_VARIANTS,
+    ENABLE_BEST_OF_N,
+    ENABLE_CONTEXT_BUDGET,
+    ENABLE_EDIT_MODE,
+    ENABLE_FAILOVER,
+    ENABLE_HEDGING,
+    ENABLE_LATENCY_PROBES,
+    ENABLE_MODEL_TIERING,
+    ENABLE_RESPONSE_CACHE,
+    ENABLE_STREAMING,
+    ENABLE_TRACEBACK_PREFETCH,
+    SEND_CODE_PROBLEMS_TO_MODEL,
     INITIAL_MESSAGE,
+    JSON_ERROR_ADVICE,
+    SUMMARY_MAX_TOKENS,
+    USE_MODEL_FOR_SUMMARIES,
+    VALIDATE_GENERATED_CODE,
 )
+from codeaide.utils.auto_fix import AutoFixLoop
+from codeaide.utils.best_of_n import BestOfNGenerator
+from codeaide.utils.cancellation import STOPPED_REASON, TurnCancellation
+from codeaide.utils.circuit_breaker import (
+    CLOSED,
+    circuit_breakers,
+    get_failover_chain,
+)
+from codeaide.utils.code_patcher import (
+    CodeEditError,
+    PatchError,
+    apply_patch,
+    is_patch,
+)
+from codeaide.utils.code_validator import CodeValidationError, CodeValidator
+from codeaide.utils.context_utils import (
+    CHARS_PER_TOKEN,
+    SUMMARY_REQUEST,
+    ContextWindowManager,
+    elide_superseded_code,
+    estimate_history_tokens,
+)
+from codeaide.utils.continuation import complete_truncated_response
 from codeaide.utils.cost_tracker import CostTracker
 from codeaide.utils.file_handler import FileHandler
 from codeaide.utils.terminal_manager import TerminalManager
-from codeaide.utils.general_utils import generate_session_id
+from codeaide.utils.general_utils import (
+    format_questions,
+    generate_session_id,
+    increment_version,
+)
+from codeaide.utils.hedging import HedgedRequester, convert_response
+from codeaide.utils.json_repair import record_repair
+from codeaide.utils.latency_router import (
+    LATENCY_PROBE_MAX_TOKENS,
+    LATENCY_PROBE_PROMPT,
+    LatencyRouter,
+)
+from codeaide.utils.model_comparison import ModelComparison
+from codeaide.utils.prefetch import SpeculativePrefetcher
+from codeaide.utils.model_tiering import TieringStats, get_fast_model, is_simple_turn
 from codeaide.utils.logging_config import get_logger, setup_logger
+from codeaide.utils.rate_limiter import request_scheduler
+from codeaide.utils.response_cache import ResponseCache
+from codeaide.utils.stream_parser import StreamingJSONFieldExtractor
+from codeaide.utils.submission_queue import SubmissionQueue
 from PyQt5.QtCore import QObject, pyqtSignal
 from codeaide.utils.environment_manager import EnvironmentManager
 
@@ -31,6 +106,14 @@ class ChatHandler(QObject):
     )  # Signal to update chat with (role, message)
     show_code_signal = pyqtSignal(str, str)  # Signal to show code with (code, version)
     traceback_occurred = pyqtSignal(str)
+    # Signals for streamed responses: new text/code as it arrives, and a reset
+    # whenever a new attempt starts so stale partial output can be discarded
+    stream_text_signal = pyqtSignal(str)
+    stream_code_signal = pyqtSignal(str)
+    stream_reset_signal = pyqtSignal()
+    # Signal for a switch to another model made by failover, with
+    # (provider, model, reason)
+    model_switched_signal = pyqtSignal(str, str, str)
 
     def __init__(self):
         super().__init__()
@@ -66,7 +149,34 @@ class ChatHandler(QObject):
         self.max_tokens = AI_PROVIDERS[self.current_provider]["models"][
             self.current_model
         ]["max_tokens"]
+        # The model chosen by the user, which failover switches back to once its
+        # provider has recovered
+        self.selected_model = (self.current_provider, self.current_model)
         self.env_manager = EnvironmentManager(self.session_id)
+        self.response_cache = ResponseCache() if ENABLE_RESPONSE_CACHE else None
+        self.cached_request_key = None
+        # The provider whose model produced the response to the current attempt,
+        # when a hedged request was answered by another provider
+        self.response_provider = None
+        self.hedged_requester = HedgedRequester() if ENABLE_HEDGING else None
+        self.latency_router = LatencyRouter()
+        self.tiering_stats = TieringStats()
+        self.best_of_n = BestOfNGenerator(self.environment_manager)
+        self.model_comparison = ModelComparison(self.environment_manager)
+        # The prompt and results of the last model comparison
+        self.comparison = None
+        # The lowest capability tier the "auto" provider may choose
+        self.capability_tier = AUTO_MIN_TIER
+        # Whether the model settles its own questions with defaults
+        self.assume_defaults = ASSUME_DEFAULTS
+        # Held while a turn is added to the history, or rolled back if cancelled
+        self.turn_lock = threading.Lock()
+        # Messages submitted while a turn is in flight, sent as the next turn
+        self.submission_queue = SubmissionQueue()
+        # A fix for the last traceback, requested before the user has asked for it
+        self.prefetcher = SpeculativePrefetcher()
+        self.code_validator = CodeValidator() if VALIDATE_GENERATED_CODE else None
+        self.context_window = ContextWindowManager()
 
         self.api_key_valid, self.api_key_message = self.check_api_key()
         self.logger.info(f"New session started with ID: {self.session_id}")
@@ -86,6 +196,10 @@ class ChatHandler(QObject):
         self.update_chat_signal.connect(self.chat_window.add_to_chat)
         self.show_code_signal.connect(self.chat_window.show_code)
         self.traceback_occurred.connect(self.chat_window.show_traceback_dialog)
+        self.stream_text_signal.connect(self.chat_window.append_streamed_text)
+        self.stream_code_signal.connect(self.chat_window.append_streamed_code)
+        self.stream_reset_signal.connect(self.chat_window.reset_streamed_output)
+        self.model_switched_signal.connect(self.chat_window.on_model_switched)
 
     def check_api_key(self):
         """
@@ -101,6 +215,7 @@ class ChatHandler(QObject):
             self.logger.warning("API key not set")
             return False, self.get_api_key_instructions(self.current_provider)
         self.logger.info("API key is valid")
+        warm_up_api_client(self.api_client, self.current_provider)
         return True, None
 
     def get_api_key_instructions(self, provider):
@@ -208,12 +323,14 @@ class ChatHandler(QObject):
         else:
             return False, "Failed to save the API key.", True
 
-    def process_input(self, user_input):
+    def process_input(self, user_input, turn=None):
         """
         Process user input and generate a response.
 
         Args:
             user_input (str): The input provided by the user.
+            turn (TurnCancellation, optional): Lets the turn be stopped with
+                cancel_turn. Its deadline applies across every retry.
 
         Returns:
             dict: A response dictionary containing the type and content of the response.
@@ -226,38 +343,391 @@ class ChatHandler(QObject):
                     "message": self.get_api_key_instructions(self.current_provider),
                 }
 
-            self.add_user_input_to_history(user_input)
-
-            for attempt in range(MAX_RETRIES):
-                try:
-                    response = self.get_ai_response()
-                    if response is None:
-                        if self.is_last_attempt(attempt):
-                            return self.create_error_response(
-                                "Failed to get a response from the AI. Please try again."
-                            )
-                        continue
-
-                    self.cost_tracker.log_request(response)
-
-                    return self.process_ai_response(response)
-                except QuotaExceededException as e:
-                    return self.create_error_response(str(e))
-                except ValueError as e:
-                    self.logger.error(f"ValueError: {str(e)}\n")
-                    if not self.is_last_attempt(attempt):
-                        self.add_error_prompt_to_history(str(e))
-                    else:
+            # The "auto" provider already picks the fastest model of the
+            # session's tier, which the fast tier would drop below
+            use_fast_tier = (
+                ENABLE_MODEL_TIERING
+                and self.selected_model[0] != AUTO_PROVIDER
+                and is_simple_turn(user_input, has_code=self.latest_version != "0.0")
+            )
+            turn = turn or TurnCancellation()
+            with self.turn_lock:
+                turn.check()
+                turn.history_length = len(self.conversation_history)
+                self.add_user_input_to_history(user_input)
+
+            result = self.get_turn_response(turn, use_fast_tier)
+            if (
+                result["type"] == "questions"
+                and self.assume_defaults
+                and user_input != ASSUME_DEFAULTS_REPLY
+            ):
+                return self.reply_with_defaults(result, turn, use_fast_tier)
+            return result
+
+        except RequestCancelled:
+            return self.create_cancelled_response(turn)
+        except Exception as e:
+            return self.handle_unexpected_error(e)
+        finally:
+            # A probe of a recovering provider that ended without a result
+            circuit_breakers.release_probe(self.current_provider)
+
+    def get_turn_response(self, turn, use_fast_tier):
+        """
+        Get the response to a turn whose input is already in the history,
+        retrying until one can be used.
+
+        Args:
+            turn (TurnCancellation): The turn the response is for.
+            use_fast_tier (bool): True if the turn is simple enough for the fast
+                tier model of the current provider.
+
+        Returns:
+            dict: A response dictionary containing the type and content of the response.
+
+        Raises:
+            RequestCancelled: If the turn is stopped or runs past its deadline.
+        """
+        model = self.current_model
+        for attempt in range(MAX_RETRIES):
+            try:
+                turn.check()
+                self.cached_request_key = None
+                self.response_provider = None
+                if self.selected_model[0] == AUTO_PROVIDER:
+                    self.select_fastest_model()
+                elif ENABLE_FAILOVER:
+                    self.select_healthy_model()
+                model = self.get_turn_model(use_fast_tier)
+                started = time.monotonic()
+                if ENABLE_BEST_OF_N:
+                    response = self.get_best_of_n_response(model)
+                else:
+                    response = self.get_ai_response(model, turn)
+                turn.check()
+                if response is None:
+                    circuit_breakers.record_failure(self.current_provider)
+                    use_fast_tier = use_fast_tier and not self.escalate_turn(model)
+                    if self.is_last_attempt(attempt):
                         return self.create_error_response(
-                            f"There was an error processing the AI's response after {MAX_RETRIES} attempts. Please try again."
+                            "Failed to get a response from the AI. Please try again."
                         )
+                    continue
+
+                # A hedged response is in the current provider's format, but
+                # its tokens were used by the provider that answered
+                provider = self.response_provider or self.current_provider
+                circuit_breakers.record_success(provider)
+                usage = self.cost_tracker.log_usage(
+                    provider, get_token_usage(response, self.current_provider)
+                )
+
+                with self.turn_lock:
+                    turn.check()
+                    result = self.process_ai_response(
+                        response,
+                        reject_invalid_code=SEND_CODE_PROBLEMS_TO_MODEL
+                        and not self.is_last_attempt(attempt),
+                    )
+                    turn.committed = True
+                self.record_turn_tier(model, usage, time.monotonic() - started)
+                self.refresh_context_summary()
+                return result
+            except QuotaExceededException as e:
+                return self.create_error_response(str(e))
+            except ValueError as e:
+                self.logger.error(f"ValueError: {str(e)}\n")
+                self.evict_cached_response()
+                use_fast_tier = use_fast_tier and not self.escalate_turn(model)
+                if isinstance(e, CodeValidationError):
+                    # Only raised while retries remain
+                    advice = CODE_PROBLEMS_ADVICE
+                elif not self.is_last_attempt(attempt):
+                    if isinstance(e, CodeEditError):
+                        advice = EDIT_BLOCKS_ADVICE
+                    else:
+                        advice = JSON_ERROR_ADVICE
+                else:
+                    return self.create_error_response(
+                        f"There was an error processing the AI's response after {MAX_RETRIES} attempts. Please try again."
+                    )
+                with self.turn_lock:
+                    turn.check()
+                    self.add_error_prompt_to_history(str(e), advice=advice)
+
+        return self.create_error_response(
+            f"Failed to get a valid response from the AI after {MAX_RETRIES} attempts. Please try again."
+        )
+
+    def set_assume_defaults(self, enabled):
+        self.logger.info(f"Assume defaults mode {'on' if enabled else 'off'}")
+        self.assume_defaults = enabled
 
-            return self.create_error_response(
-                f"Failed to get a valid response from the AI after {MAX_RETRIES} attempts. Please try again."
+    def reply_with_defaults(self, response, turn, use_fast_tier):
+        """
+        Answer the model's questions with ASSUME_DEFAULTS_REPLY, as part of the
+        same turn, instead of waiting for the user.
+
+        The questions are shown in the chat, but stopping the turn still rolls it
+        back whole, from the user's input on. The reply is sent at most once per
+        turn, and to the tier the user's input was given.
+
+        Args:
+            response (dict): The questions response, already in the history.
+            turn (TurnCancellation): The turn that got it.
+            use_fast_tier (bool): The tier decision for the user's input.
+
+        Returns:
+            dict: The response to the reply, or the questions if the turn has
+            been stopped.
+
+        Raises:
+            RequestCancelled: If the turn is stopped while the reply is answered.
+        """
+        with self.turn_lock:
+            if turn.is_cancelled:
+                return response
+            turn.committed = False
+            self.add_user_input_to_history(ASSUME_DEFAULTS_REPLY)
+
+        self.logger.info("Answering the model's questions with defaults")
+        self.stream_reset_signal.emit()
+        self.update_chat_signal.emit(
+            "AI", format_questions(response["message"], response["questions"])
+        )
+        self.update_chat_signal.emit(
+            "System", f"Assume defaults is on, so replied: {ASSUME_DEFAULTS_REPLY}"
+        )
+        return self.get_turn_response(turn, use_fast_tier)
+
+    def queue_input(self, user_input):
+        """
+        Queue user input submitted while a turn is in flight.
+
+        Args:
+            user_input (str): The input provided by the user.
+
+        Returns:
+            int: The number of messages queued, including this one.
+        """
+        count = self.submission_queue.put(user_input)
+        self.logger.info(f"Queued input ({count} queued): {user_input}")
+        return count
+
+    def get_queued_input(self):
+        """
+        Get the queued user input, in the order it was submitted.
+
+        Returns:
+            list: The queued messages.
+        """
+        return self.submission_queue.pending()
+
+    def take_queued_input(self):
+        """
+        Take the queued user input, merged into one message for the next turn.
+
+        Returns:
+            str: The merged input, or None if nothing was queued.
+        """
+        return self.submission_queue.take()
+
+    def cancel_turn(self, turn, reason=STOPPED_REASON):
+        """
+        Stop a turn and remove it from the conversation history.
+
+        Any request in flight is abandoned at its next streamed chunk, and its
+        response is discarded.
+
+        Args:
+            turn (TurnCancellation): The turn passed to process_input.
+            reason (str): Why the turn was stopped.
+
+        Returns:
+            bool: True if the turn was rolled back, False if its response had
+            already been added to the history.
+        """
+        turn.cancel(reason)
+        with self.turn_lock:
+            return self.roll_back_turn(turn)
+
+    def roll_back_turn(self, turn):
+        """
+        Remove the messages a cancelled turn added to the conversation history.
+
+        The caller must hold turn_lock.
+
+        Args:
+            turn (TurnCancellation): The cancelled turn.
+
+        Returns:
+            bool: True if the turn has been rolled back, False if its response had
+            already been added to the history.
+        """
+        if turn.committed:
+            return False
+        if not turn.rolled_back and turn.history_length is not None:
+            del self.conversation_history[turn.history_length :]
+            self.file_handler.save_chat_history(self.conversation_history)
+            self.logger.info(f"Turn cancelled and rolled back: {turn.reason}")
+        turn.rolled_back = True
+        return True
+
+    def create_cancelled_response(self, turn):
+        """
+        Roll back a cancelled turn and create the response reporting it.
+
+        Args:
+            turn (TurnCancellation): The cancelled turn.
+
+        Returns:
+            dict: A response dictionary of type "cancelled".
+        """
+        with self.turn_lock:
+            self.roll_back_turn(turn)
+        return {"type": "cancelled", "message": turn.reason}
+
+    def get_turn_model(self, use_fast_tier):
+        """
+        Get the model to send the current attempt to.
+
+        Args:
+            use_fast_tier (bool): True if the turn is simple enough for the fast
+                tier model of the current provider.
+
+        Returns:
+            str: The model name.
+        """
+        if use_fast_tier:
+            return get_fast_model(self.current_provider) or self.current_model
+        return self.current_model
+
+    def escalate_turn(self, model):
+        """
+        Stop using the fast tier for this turn after it failed.
+
+        Args:
+            model (str): The model the failed attempt was sent to.
+
+        Returns:
+            bool: True if the attempt used the fast tier.
+        """
+        if model == self.current_model:
+            return False
+        self.logger.info(
+            f"Attempt with {model} failed; escalating to {self.current_model}"
+        )
+        self.tiering_stats.record_escalation()
+        return True
+
+    def record_turn_tier(self, model, usage, latency):
+        """
+        Record which tier answered a turn, and the time it saved.
+
+        Args:
+            model (str): The model that answered.
+            usage (dict): The token usage of the response.
+            latency (float): Seconds the request took.
+
+        Returns:
+            None
+        """
+        used_fast_tier = model != self.current_model
+        seconds_saved = 0.0
+        if used_fast_tier:
+            estimate = self.latency_router.get_estimate(
+                self.current_provider, self.current_model, total=True
             )
+            if estimate is not None:
+                seconds_saved = max(0.0, estimate - latency)
+        self.tiering_stats.record_turn(
+            used_fast_tier, sum(usage.values()), seconds_saved
+        )
+        self.logger.info(f"Model tiering: {self.tiering_stats.get_report()}")
 
-        except Exception as e:
-            return self.handle_unexpected_error(e)
+    def select_healthy_model(self):
+        """
+        Switch models before a request if the selected provider isn't healthy.
+
+        While the selected provider's circuit breaker is open, requests go to the
+        next healthy provider in its failover chain. Once the cooldown has passed,
+        the selected model is used again for a probe request.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        provider, model = self.selected_model
+        choice = circuit_breakers.choose_model(provider, model, self.is_model_usable)
+        if choice is None or choice == (self.current_provider, self.current_model):
+            return
+
+        if choice == self.selected_model:
+            reason = f"Trying {provider} again to check if it has recovered."
+        else:
+            reason = (
+                f"{self.current_provider} isn't responding, so requests will be "
+                f"sent to {choice[0]} until it recovers."
+            )
+        self.logger.warning(reason)
+        success, _ = self.switch_model(*choice)
+        if success:
+            self.model_switched_signal.emit(choice[0], choice[1], reason)
+        else:
+            circuit_breakers.release_probe(choice[0])
+
+    def select_fastest_model(self):
+        """
+        Switch to the fastest healthy model of the session's tier, for the "auto"
+        provider.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        choice = self.latency_router.choose_model(
+            self.capability_tier,
+            lambda p, m: self.is_model_usable(p, m)
+            and circuit_breakers.get_breaker(p).allow_request(),
+        )
+        if choice is None or choice == (self.current_provider, self.current_model):
+            return
+
+        estimate = self.latency_router.get_estimate(*choice)
+        reason = f"Auto: sending requests to {choice[1]}"
+        if estimate is not None:
+            reason += f", currently the fastest model ({estimate:.1f} seconds)."
+        else:
+            reason += "."
+        self.logger.info(reason)
+        success, _ = self.switch_model(*choice)
+        if success:
+            self.model_switched_signal.emit(choice[0], choice[1], reason)
+        else:
+            circuit_breakers.release_probe(choice[0])
+
+    def is_model_usable(self, provider, model):
+        return get_api_client(provider, model) is not None
+
+    def send_latency_probe(self, provider, model, stream_callback):
+        return request_scheduler.run(
+            provider,
+            model,
+            lambda: send_api_request(
+                get_api_client(provider, model),
+                [{"role": "user", "content": LATENCY_PROBE_PROMPT}],
+                LATENCY_PROBE_MAX_TOKENS,
+                model,
+                provider,
+                stream_callback=stream_callback,
+                structured_output=False,
+            ),
+        )
 
     def add_user_input_to_history(self, user_input):
         """
@@ -269,29 +739,501 @@ class ChatHandler(QObject):
         Returns:
             None
         """
-        version_info = f"\n\nThe latest code version was {self.latest_version}. If you're making minor changes to the previous code, increment the minor version (e.g., 1.0 to 1.1). If you're creating entirely new code, increment the major version (e.g., 1.1 to 2.0). Ensure the new version is higher than {self.latest_version}."
-        self.conversation_history.append(
-            {"role": "user", "content": user_input + version_info}
-        )
+        self.conversation_history.append(self.build_user_message(user_input))
         self.file_handler.save_chat_history(self.conversation_history)
 
-    def get_ai_response(self):
+    def build_user_message(self, user_input):
+        """
+        Build the history message for user input, with version information.
+
+        Args:
+            user_input (str): The input provided by the user.
+
+        Returns:
+            dict: The message.
+        """
+        version_info = f"\n\nThe latest code version was {self.latest_version}. If you're making minor changes to the previous code, increment the minor version (e.g., 1.0 to 1.1). If you're creating entirely new code, increment the major version (e.g., 1.1 to 2.0). Ensure the new version is higher than {self.latest_version}."
+        if ENABLE_EDIT_MODE and self.latest_version in self.file_handler.versions_dict:
+            version_info += EDIT_MODE_PROMPT.format(version=self.latest_version)
+        if self.assume_defaults:
+            version_info += ASSUME_DEFAULTS_PROMPT
+        return {"role": "user", "content": user_input + version_info}
+
+    def get_ai_response(self, model=None, turn=None):
         """
         Send a request to the AI API and get a response.
 
         Args:
-            None
+            model (str, optional): The model of the current provider to use,
+                instead of the current model.
+            turn (TurnCancellation, optional): The turn the request is for. The
+                request is then always streamed, and abandoned by raising
+                RequestCancelled once the turn is cancelled.
 
         Returns:
             dict: The response from the AI API, or None if the request failed.
         """
-        return send_api_request(
+        stream_callback = None
+        if ENABLE_STREAMING:
+            self.stream_reset_signal.emit()
+            extractor = StreamingJSONFieldExtractor(
+                ["text", "code"], self.emit_stream_signal
+            )
+            stream_callback = extractor.feed
+        if turn is not None:
+            stream_callback = turn.wrap_callback(stream_callback)
+
+        request_history = self.build_request_history()
+        model = model or self.current_model
+        max_tokens = AI_PROVIDERS[self.current_provider]["models"][model]["max_tokens"]
+
+        prefetched = self.prefetcher.take(
+            (self.current_provider, model, request_history)
+        )
+        if prefetched is not None:
+            self.logger.info("Using the response requested speculatively")
+            response = prefetched.adopt(stream_callback)
+            if response is not None:
+                return response
+
+        def schedule_request(provider, model, callback):
+            return self.schedule_request(
+                request_history, provider, model, callback, turn
+            )
+
+        def use_winner(arm):
+            self.response_provider = arm.provider
+
+        def log_abandoned(arm, response):
+            self.log_abandoned_request(
+                arm.provider, request_history, response, arm.streamed_chars
+            )
+
+        def send_request():
+            if self.hedged_requester is None:
+                return schedule_request(self.current_provider, model, stream_callback)
+            return self.hedged_requester.send(
+                (self.current_provider, model),
+                self.get_hedge_model(),
+                schedule_request,
+                stream_callback,
+                on_winner=use_winner,
+                on_abandoned=log_abandoned,
+            )
+
+        if self.response_cache is None:
+            return send_request()
+
+        # Kept so the entry can be evicted if the response can't be processed
+        self.cached_request_key = ResponseCache.make_key(
+            self.current_provider, model, max_tokens, request_history
+        )
+        response = self.response_cache.get_or_send(
+            self.current_provider,
+            model,
+            max_tokens,
+            request_history,
+            send_request,
+        )
+        self.logger.info(f"Response cache stats: {self.response_cache.get_stats()}")
+        return response
+
+    def log_abandoned_request(
+        self, provider, request_history, response=None, streamed_chars=0
+    ):
+        """
+        Log the tokens used by a request that was abandoned for another one.
+
+        Args:
+            provider (str): The provider the request was sent to.
+            request_history (list): The messages that were sent.
+            response (optional): The response, if the request ended anyway.
+            streamed_chars (int): How much of the response had been streamed when
+                the request was cancelled, if it has no response.
+
+        Returns:
+            dict: The token usage that was recorded.
+        """
+        if response is not None:
+            return self.cost_tracker.log_request(response, provider)
+        # The provider bills for the whole input and the output streamed before
+        # the request was cancelled, so both are estimated
+        return self.cost_tracker.log_usage(
+            provider,
+            {
+                "input_tokens": estimate_history_tokens(request_history),
+                "cache_read_tokens": 0,
+                "cache_write_tokens": 0,
+                "output_tokens": streamed_chars // CHARS_PER_TOKEN,
+            },
+        )
+
+    def evict_cached_response(self):
+        # A response that fails to parse or validate would otherwise be replayed
+        # whenever the same request is made again
+        if self.response_cache is not None and self.cached_request_key is not None:
+            self.response_cache.evict(self.cached_request_key)
+        self.cached_request_key = None
+
+    def schedule_request(
+        self, request_history, provider, model, stream_callback, turn=None
+    ):
+        """
+        Send a request through the rate limiter, completing it if truncated.
+
+        Every request is timed, so the "auto" provider can pick the fastest model.
+
+        Args:
+            request_history (list): The messages to send.
+            provider (str): The provider to send the request to.
+            model (str): The model to use.
+            stream_callback (callable): Called with the streamed text, or None.
+            turn (TurnCancellation, optional): The turn the request is for, so it
+                can be stopped while it waits for the rate limiter.
+
+        Returns:
+            The response, or None if the request failed.
+        """
+        if (provider, model) == (self.current_provider, self.current_model):
+            api_client = self.api_client
+        else:
+            api_client = get_api_client(provider, model)
+        max_tokens = AI_PROVIDERS[provider]["models"][model]["max_tokens"]
+
+        def send_and_continue(callback):
+            response = send_api_request(
+                api_client,
+                request_history,
+                max_tokens,
+                model,
+                provider,
+                stream_callback=callback,
+            )
+            return complete_truncated_response(
+                api_client,
+                request_history,
+                response,
+                max_tokens,
+                model,
+                provider,
+                stream_callback=callback,
+            )
+
+        return request_scheduler.run(
+            provider,
+            model,
+            lambda: self.latency_router.measure(
+                provider, model, send_and_continue, stream_callback
+            ),
+            turn,
+        )
+
+    def get_best_of_n_response(self, model):
+        """
+        Send the request once per BEST_OF_N_VARIANTS and pick the first response
+        whose code runs cleanly.
+
+        Args:
+            model (str): The model of the current provider to use for variants
+                that don't name one.
+
+        Returns:
+            The chosen response, or None if every request failed.
+        """
+        provider = self.current_provider
+        request_history = self.build_request_history()
+
+        def send_variant(variant):
+            variant_model = variant.get("model", model)
+            if variant_model not in AI_PROVIDERS[provider]["models"]:
+                variant_model = model
+            api_client = get_api_client(provider, variant_model)
+            max_tokens = AI_PROVIDERS[provider]["models"][variant_model]["max_tokens"]
+
+            def send():
+                response = send_api_request(
+                    api_client,
+                    request_history,
+                    max_tokens,
+                    variant_model,
+                    provider,
+                    temperature=variant.get("temperature"),
+                )
+                return complete_truncated_response(
+                    api_client,
+                    request_history,
+                    response,
+                    max_tokens,
+                    variant_model,
+                    provider,
+                )
+
+            return request_scheduler.run(provider, variant_model, send)
+
+        def resolve_code(code):
+            return self.apply_code_edits(code) if is_patch(code) else code
+
+        # The winner's usage is logged with the rest of the turn
+        winner, candidates = self.best_of_n.generate(
+            BEST_OF_N_VARIANTS,
+            send_variant,
+            provider,
+            resolve_code,
+            on_abandoned=lambda candidate: self.cost_tracker.log_request(
+                candidate.response, provider
+            ),
+        )
+        return winner.response if winner is not None else None
+
+    def compare_models(self, user_input):
+        """
+        Send the input to every model with an API key at once and check each
+        response, without adding anything to the conversation history.
+
+        Args:
+            user_input (str): The input provided by the user.
+
+        Returns:
+            list: A ComparisonResult per model. Each one can be added to the
+            session with adopt_comparison_result.
+        """
+        message = self.build_user_message(user_input)
+        request_history = self.build_request_history() + [message]
+        models = [
+            (provider, model)
+            for provider, config in AI_PROVIDERS.items()
+            for model in config["models"]
+            if self.is_model_usable(provider, model)
+        ]
+        self.logger.info(f"Comparing {len(models)} models")
+
+        def send_model(provider, model, stream_callback):
+            api_client = get_api_client(provider, model)
+            max_tokens = AI_PROVIDERS[provider]["models"][model]["max_tokens"]
+
+            def send():
+                response = send_api_request(
+                    api_client,
+                    request_history,
+                    max_tokens,
+                    model,
+                    provider,
+                    stream_callback=stream_callback,
+                )
+                return complete_truncated_response(
+                    api_client,
+                    request_history,
+                    response,
+                    max_tokens,
+                    model,
+                    provider,
+                    stream_callback=stream_callback,
+                )
+
+            return request_scheduler.run(provider, model, send)
+
+        def resolve_code(code):
+            return self.apply_code_edits(code) if is_patch(code) else code
+
+        results = self.model_comparison.compare(models, send_model, resolve_code)
+        for result in results:
+            if result.response is None:
+                continue
+            self.cost_tracker.log_request(result.response, result.provider)
+            self.latency_router.record(
+                result.provider,
+                result.model,
+                result.total_latency,
+                result.first_token_latency,
+            )
+            if result.code:
+                self.file_handler.save_candidate(
+                    result.code, f"{result.provider}_{result.model}"
+                )
+        self.comparison = (message, results)
+        return results
+
+    def adopt_comparison_result(self, index):
+        """
+        Add the prompt of the last comparison and one model's response to the
+        session, as if that model had answered it.
+
+        Args:
+            index (int): The index of the result returned by compare_models.
+
+        Returns:
+            dict: A response dictionary containing the type and content of the response.
+        """
+        message, results = self.comparison
+        result = results[index]
+        self.logger.info(f"Adopting the response of {result.provider}/{result.model}")
+        with self.turn_lock:
+            history_length = len(self.conversation_history)
+            self.conversation_history.append(message)
+            self.file_handler.save_chat_history(self.conversation_history)
+            try:
+                return self.process_ai_response(
+                    convert_response(
+                        result.response, result.provider, self.current_provider
+                    )
+                )
+            except Exception as e:
+                # Don't leave the prompt in the history without its response
+                del self.conversation_history[history_length:]
+                self.file_handler.save_chat_history(self.conversation_history)
+                if not isinstance(e, ValueError):
+                    return self.handle_unexpected_error(e)
+                return self.create_error_response(
+                    f"The response of {result.model} couldn't be used: {str(e)}"
+                )
+
+    def get_hedge_model(self):
+        """
+        Get the model to send hedged requests to: the default model of the first
+        provider in the failover chain that has an API key and is healthy.
+
+        Args:
+            None
+
+        Returns:
+            tuple: The (provider, model), or None if there isn't one.
+        """
+        for provider, model in get_failover_chain(self.current_provider):
+            if circuit_breakers.get_breaker(
+                provider
+            ).state == CLOSED and self.is_model_usable(provider, model):
+                return provider, model
+        return None
+
+    def build_request_history(self, history=None):
+        """
+        Build the list of messages to send for the next request.
+
+        The saved conversation history is left untouched; only the copy that is
+        sent is trimmed.
+
+        Args:
+            history (list, optional): The messages to build it from, instead of
+                the conversation history.
+
+        Returns:
+            list: The messages to send.
+        """
+        request_history = self.elide_history(history)
+        if ENABLE_CONTEXT_BUDGET:
+            request_history = self.context_window.fit_to_budget(
+                request_history, self.get_context_budget()
+            )
+        return request_history
+
+    def elide_history(self, history=None):
+        if history is None:
+            history = self.conversation_history
+        if not ELIDE_SUPERSEDED_CODE:
+            return history
+
+        request_history = elide_superseded_code(
+            history, self.file_handler.get_versions_dict()
+        )
+        full_tokens = estimate_history_tokens(history)
+        sent_tokens = estimate_history_tokens(request_history)
+        if sent_tokens < full_tokens:
+            self.logger.info(
+                f"Elided superseded code versions: ~{full_tokens} -> ~{sent_tokens} "
+                f"estimated input tokens ({1 - sent_tokens / full_tokens:.0%} reduction)"
+            )
+        return request_history
+
+    def get_context_budget(self):
+        return AI_PROVIDERS[self.current_provider]["models"][self.current_model][
+            "context_budget"
+        ]
+
+    def refresh_context_summary(self):
+        """
+        Start updating the rolling summary in the background after a turn.
+
+        Only does anything when the history has grown past the model's context
+        budget, so short sessions never pay for a summary request.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if not (ENABLE_CONTEXT_BUDGET and USE_MODEL_FOR_SUMMARIES):
+            return
+        self.context_window.refresh_summary_async(
+            self.elide_history(), self.get_context_budget(), self.summarize_messages
+        )
+
+    def summarize_messages(self, messages, previous_summary):
+        """
+        Ask the current model for a summary of part of the conversation.
+
+        Runs on a background thread, so it uses the client, provider and model
+        that were current when it was started and never streams to the UI.
+
+        Args:
+            messages (list): The messages to summarize, starting with a user message.
+            previous_summary (str): The summary of the messages before these, if any.
+
+        Returns:
+            str: The new summary, or None if the request failed.
+        """
+        api_client, provider, model = (
             self.api_client,
-            self.conversation_history,
-            self.max_tokens,
-            self.current_model,
             self.current_provider,
+            self.current_model,
+        )
+        previous = (
+            f"\n\nThis is your summary of the conversation before these messages; "
+            f"include it in the new summary:\n{previous_summary}"
+            if previous_summary
+            else ""
         )
+        prompt = SUMMARY_REQUEST.format(previous_summary=previous)
+        request_history = list(messages)
+        if request_history and request_history[-1]["role"] == "user":
+            request_history[-1] = {
+                "role": "user",
+                "content": f"{request_history[-1]['content']}\n\n{prompt}",
+            }
+        else:
+            request_history.append({"role": "user", "content": prompt})
+
+        try:
+            response = request_scheduler.run(
+                provider,
+                model,
+                lambda: send_api_request(
+                    api_client, request_history, SUMMARY_MAX_TOKENS, model, provider
+                ),
+            )
+            if response is None:
+                return None
+            self.cost_tracker.log_request(response, provider)
+            return parse_response(response, provider=provider)[0] or None
+        except Exception as e:
+            self.logger.warning(f"Failed to summarize the conversation: {str(e)}")
+            return None
+
+    def emit_stream_signal(self, field, text):
+        """
+        Forward newly streamed field text to the UI.
+
+        Args:
+            field (str): The name of the JSON field the text belongs to.
+            text (str): The newly received text.
+
+        Returns:
+            None
+        """
+        if field == "text":
+            self.stream_text_signal.emit(text)
+        elif field == "code":
+            self.stream_code_signal.emit(text)
 
     def is_last_attempt(self, attempt):
         """
@@ -305,12 +1247,14 @@ class ChatHandler(QObject):
         """
         return attempt == MAX_RETRIES - 1
 
-    def process_ai_response(self, response):
+    def process_ai_response(self, response, reject_invalid_code=False):
         """
         Process the AI's response and create an appropriate response object.
 
         Args:
             response (dict): The response from the AI API.
+            reject_invalid_code (bool): Raise CodeValidationError for code that
+                static checks show can't run, instead of flagging its problems.
 
         Returns:
             dict: A response dictionary containing the type and content of the response.
@@ -335,51 +1279,124 @@ class ChatHandler(QObject):
             requirements,
         ) = parsed_response
 
-        if code and self.compare_versions(code_version, self.latest_version) <= 0:
-            raise ValueError(
-                f"New version {code_version} is not higher than the latest version {self.latest_version}"
+        corrected = False
+        if is_patch(code):
+            code = self.apply_code_edits(code)
+            corrected = True
+        if code and not self.is_new_version(code_version):
+            # Renumber locally instead of asking the model for a new response
+            new_version = increment_version(
+                self.latest_version,
+                major_or_minor="major" if self.latest_version == "0.0" else "minor",
+            )
+            self.logger.info(
+                f"New version {code_version} is not higher than the latest version "
+                f"{self.latest_version}; renumbered it to {new_version}"
+            )
+            record_repair("version")
+            code_version = new_version
+            corrected = True
+
+        problems = []
+        if code and VALIDATE_GENERATED_CODE:
+            problems = self.code_validator.validate(code)
+            errors = [problem for problem in problems if problem.is_error]
+            if errors and reject_invalid_code:
+                raise CodeValidationError(errors)
+            if problems:
+                self.logger.info(f"Static checks found problems: {problems}")
+
+        content = None
+        if corrected:
+            # Store the corrected response, with the complete code, so later
+            # requests (and edits) are based on it
+            content = json.dumps(
+                {
+                    "text": text,
+                    "questions": questions,
+                    "code": code,
+                    "code_version": code_version,
+                    "version_description": version_description,
+                    "requirements": requirements,
+                },
+                ensure_ascii=False,
             )
 
-        self.update_conversation_history(response)
+        self.update_conversation_history(response, content)
 
         if questions:
             return self.create_questions_response(text, questions)
         elif code:
             return self.create_code_response(
-                text, code, code_version, version_description, requirements
+                text,
+                code,
+                code_version,
+                version_description,
+                requirements,
+                [str(problem) for problem in problems],
             )
         else:
             return self.create_message_response(text)
 
-    def update_conversation_history(self, response):
+    def apply_code_edits(self, patch):
+        """
+        Apply search/replace edit blocks to the latest version of the code.
+
+        Args:
+            patch (str): The edit blocks from the 'code' field of the response.
+
+        Returns:
+            str: The complete edited code.
+
+        Raises:
+            CodeEditError: If the edits don't apply, so the request is retried
+                and the model is asked to fix the edits or send the complete code.
+        """
+        try:
+            latest_code = self.file_handler.get_code(self.latest_version)
+            code = apply_patch(latest_code, patch)
+        except (OSError, PatchError) as e:
+            self.logger.warning(f"Failed to apply code edits: {str(e)}")
+            raise CodeEditError(
+                f"The code edits could not be applied to version {self.latest_version} "
+                f"({str(e)})"
+            )
+        self.logger.info(
+            f"Applied {len(patch)} characters of code edits to version "
+            f"{self.latest_version} ({len(code)} characters)"
+        )
+        return code
+
+    def is_new_version(self, code_version):
+        """
+        Check if a code version is valid and higher than the latest version.
+
+        Args:
+            code_version (str): The version of the new code.
+
+        Returns:
+            bool: True if the version can be used as is, False otherwise.
+        """
+        try:
+            return self.compare_versions(str(code_version), self.latest_version) > 0
+        except ValueError:
+            return False
+
+    def update_conversation_history(self, response, content=None):
         """
         Add the AI's response to the conversation history.
 
         Args:
             response (dict): The response from the AI API.
+            content (str, optional): The content to store instead of the response
+                text, e.g. after the response was corrected locally.
 
         Returns:
             None
         """
-        if self.current_provider.lower() == "anthropic":
-            self.conversation_history.append(
-                {"role": "assistant", "content": response.content[0].text}
-            )
-        elif self.current_provider.lower() == "openai":
-            self.conversation_history.append(
-                {"role": "assistant", "content": response.choices[0].message.content}
-            )
-        elif self.current_provider.lower() == "google":
-            self.conversation_history.append(
-                {
-                    "role": "assistant",
-                    "content": response.candidates[0].content.parts[0].text,
-                }
-            )
-        else:
-            raise ValueError(
-                f"In update_conversation_history, unsupported provider: {self.current_provider}"
-            )
+        if content is None:
+            content = get_response_text(response, self.current_provider)
+        self.conversation_history.append({"role": "assistant", "content": content})
         self.file_handler.save_chat_history(self.conversation_history)
 
     def create_questions_response(self, text, questions):
@@ -396,7 +1413,7 @@ class ChatHandler(QObject):
         return {"type": "questions", "message": text, "questions": questions}
 
     def create_code_response(
-        self, text, code, code_version, version_description, requirements
+        self, text, code, code_version, version_description, requirements, problems=()
     ):
         """
         Create a response object for code generation.
@@ -407,19 +1424,21 @@ class ChatHandler(QObject):
             code_version (str): The version of the generated code.
             version_description (str): A description of the code version.
             requirements (str): Any additional requirements for the code.
+            problems (list): Problems found in the code by static checks.
 
         Returns:
             dict: A response dictionary with type 'code'.
         """
         self.latest_version = code_version
         self.file_handler.save_code(
-            code, code_version, version_description, requirements
+            code, code_version, version_description, requirements, list(problems)
         )
         return {
             "type": "code",
             "message": f"{text}\n\nOpening in the code window as v{code_version}...",
             "code": code,
             "requirements": requirements,
+            "problems": list(problems),
         }
 
     def create_message_response(self, text):
@@ -446,17 +1465,18 @@ class ChatHandler(QObject):
         """
         return {"type": "error", "message": message}
 
-    def add_error_prompt_to_history(self, error_message):
+    def add_error_prompt_to_history(self, error_message, advice=JSON_ERROR_ADVICE):
         """
         Add an error prompt to the conversation history.
 
         Args:
             error_message (str): The error message to be added.
+            advice (str): How to avoid the error.
 
         Returns:
             None
         """
-        error_prompt = f"\n\nThere was an error in your last response: {error_message}. Please ensure you're using proper JSON formatting to avoid this error and others like it. Please don't apologize for the error because it will be hidden from the end user."
+        error_prompt = f"\n\nThere was an error in your last response: {error_message}. {advice} Please don't apologize for the error because it will be hidden from the end user."
         self.conversation_history[-1]["content"] += error_prompt
         self.file_handler.save_chat_history(self.conversation_history)
 
@@ -526,27 +1546,88 @@ class ChatHandler(QObject):
         return bool(self.conversation_history)
 
     def set_model(self, provider, model):
+        """
+        Select the model to send requests to.
+
+        Args:
+            provider (str): The provider name, or AUTO_PROVIDER.
+            model (str): The model name.
+
+        Returns:
+            tuple: A tuple containing a boolean indicating success, a message, and a
+            boolean indicating if waiting for the provider's API key.
+        """
         self.logger.info(f"In set_model: provider: {provider}, model: {model}")
+        if provider == AUTO_PROVIDER:
+            return self.set_auto_model()
+        self.latency_router.stop()
         if provider not in AI_PROVIDERS:
             self.logger.error(f"Invalid provider: {provider}")
-            return False, None
+            return False, None, False
         if model not in AI_PROVIDERS[provider]["models"]:
             self.logger.error(f"Invalid model {model} for provider {provider}")
-            return False, None
+            return False, None, False
+
+        # Check API key when setting a new model
+        api_key_valid, message = self.switch_model(provider, model)
+        if not api_key_valid:
+            return False, message, True
+
+        self.selected_model = (provider, model)
+        self.logger.info(f"Model {model} for provider {provider} set successfully.")
+        return True, None, False
+
+    def set_auto_model(self):
+        """
+        Select the "auto" provider, which sends each turn to the fastest model.
+
+        Args:
+            None
+
+        Returns:
+            tuple: (success, message, waiting_for_api_key), like set_model. Without
+            a usable model there's no single provider to ask for a key, so the
+            message is only shown.
+        """
+        choice = self.latency_router.choose_model(
+            self.capability_tier, self.is_model_usable
+        )
+        if choice is None:
+            return (
+                False,
+                f"Auto mode needs an API key for at least one {self.capability_tier} "
+                "model. Please select a provider to set one up.",
+                False,
+            )
+        success, message = self.switch_model(*choice)
+        if not success:
+            return False, message, True
+
+        self.selected_model = (AUTO_PROVIDER, AUTO_MODEL)
+        if ENABLE_LATENCY_PROBES:
+            self.latency_router.start_probes(
+                self.capability_tier, self.is_model_usable, self.send_latency_probe
+            )
+        self.logger.info(f"Auto mode selected; starting with {choice[1]}")
+        return True, None, False
+
+    def switch_model(self, provider, model):
+        """
+        Send requests to a different model, without changing the selected model.
+
+        Args:
+            provider (str): The provider name.
+            model (str): The model name.
 
+        Returns:
+            tuple: The result of check_api_key for the new model.
+        """
         self.current_provider = provider
         self.current_model = model
         self.max_tokens = AI_PROVIDERS[self.current_provider]["models"][
             self.current_model
         ]["max_tokens"]
-
-        # Check API key when setting a new model
-        api_key_valid, message = self.check_api_key()
-        if not api_key_valid:
-            return False, message
-
-        self.logger.info(f"Model {model} for provider {provider} set successfully.")
-        return True, None
+        return self.check_api_key()
 
     def clear_conversation_history(self):
         """
@@ -590,6 +1671,13 @@ class ChatHandler(QObject):
 
         # Clear conversation history
         self.conversation_history = []
+        self.submission_queue.clear()
+        self.prefetcher.discard()
+        self.context_window = ContextWindowManager()
+        self.logger.info(f"Model tiering: {self.tiering_stats.get_report()}")
+        self.tiering_stats = TieringStats()
+        if self.hedged_requester is not None:
+            self.hedged_requester.start_session()
 
         # Clear chat display in UI
         chat_window.clear_chat_display()
@@ -621,21 +1709,101 @@ class ChatHandler(QObject):
         self.logger.info(
             f"ChatHandler: Emitting traceback signal with text: {traceback_text[:50]}..."
         )
+        if ENABLE_TRACEBACK_PREFETCH and self.api_key_set:
+            self.prefetch_traceback_fix(traceback_text)
         self.traceback_occurred.emit(traceback_text)
 
-    def send_traceback_to_agent(self, traceback_text):
-        self.logger.info(
-            f"ChatHandler: Sending traceback to agent: {traceback_text[:50]}..."
-        )
-        message = (
+    def build_traceback_message(self, traceback_text):
+        return (
             "The following error occurred when running the code you just provided:\n\n"
             f"```\n{traceback_text}\n```\n\n"
             "Please provide a solution that avoids this error."
         )
+
+    def prefetch_traceback_fix(self, traceback_text):
+        """
+        Start requesting a fix for a traceback before the user has asked for one.
+
+        The request is sent exactly as send_traceback_to_agent would send it, but
+        without adding it to the conversation history. If the user requests the
+        fix, the turn adopts it (see get_ai_response); otherwise it is discarded
+        by discard_traceback_fix or the next turn.
+
+        Args:
+            traceback_text (str): The traceback of the failed run.
+
+        Returns:
+            None
+        """
+        history = self.conversation_history + [
+            self.build_user_message(self.build_traceback_message(traceback_text))
+        ]
+        request_history = self.build_request_history(history)
+        provider, model = self.current_provider, self.current_model
+        self.logger.info(f"Speculatively requesting a fix from {provider}/{model}")
+        self.prefetcher.start(
+            (provider, model, request_history),
+            lambda callback: self.schedule_request(
+                request_history, provider, model, callback
+            ),
+        )
+
+    def discard_traceback_fix(self):
+        self.prefetcher.discard()
+
+    def run_auto_fix(
+        self, prompt, max_iterations=AUTO_FIX_MAX_ITERATIONS, budget=AUTO_FIX_BUDGET
+    ):
+        """
+        Generate code for a prompt, then run each new version headlessly and send
+        its errors back until it runs cleanly, without any user involvement.
+
+        Args:
+            prompt (str): The request for code.
+            max_iterations (int): The most requests to make.
+            budget (float): The most seconds to spend, including the runs.
+
+        Returns:
+            AutoFixResult: The iterations, with their timing and token usage.
+        """
+
+        def send_message(message, seconds_left):
+            logged = len(self.cost_tracker.cost_log)
+            response = self.process_input(
+                message, TurnCancellation(deadline=seconds_left)
+            )
+            tokens = sum(
+                value
+                for entry in self.cost_tracker.cost_log[logged:]
+                for key, value in entry.items()
+                if key.endswith("_tokens")
+            )
+            return response, tokens
+
+        def run_latest_version(timeout):
+            version = self.file_handler.get_versions_dict()[self.latest_version]
+            return self.terminal_manager.run_script_captured(
+                version["code_path"], version["requirements_path"], timeout
+            )
+
+        self.logger.info(f"Starting the auto-fix loop for: {prompt}")
+        return AutoFixLoop(max_iterations, budget).run(
+            prompt, send_message, run_latest_version, self.build_traceback_message
+        )
+
+    def send_traceback_to_agent(self, traceback_text):
+        self.logger.info(
+            f"ChatHandler: Sending traceback to agent: {traceback_text[:50]}..."
+        )
+        message = self.build_traceback_message(traceback_text)
         self.logger.info("ChatHandler: Setting input text in chat window")
         self.chat_window.input_text.setPlainText(message)
         self.logger.info("ChatHandler: Calling on_submit in chat window")
         self.chat_window.on_submit()
 
     def cleanup(self):
+        self.logger.info(f"Model tiering: {self.tiering_stats.get_report()}")
+        if self.code_validator is not None:
+            self.code_validator.shutdown()
+        self.latency_router.stop()
         self.env_manager.cleanup()
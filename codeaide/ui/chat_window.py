@@ -9,6 +9,7 @@ from PyQt5.QtCore import (
 from PyQt5.QtGui import QColor, QIcon
 from PyQt5.QtWidgets import (
     QApplication,
+    QCheckBox,
     QHBoxLayout,
     QMainWindow,
     QMessageBox,
@@ -21,8 +22,10 @@ from PyQt5.QtWidgets import (
     QProgressDialog,
 )
 from codeaide.ui.code_popup import CodePopup
+from codeaide.ui.comparison_dialog import show_comparison_dialog
 from codeaide.ui.example_selection_dialog import show_example_dialog
 from codeaide.utils import general_utils
+from codeaide.utils.cancellation import STOPPED_REASON, TurnCancellation
 from codeaide.utils.constants import (
     AI_EMOJI,
     AI_FONT,
@@ -35,8 +38,11 @@ from codeaide.utils.constants import (
     USER_FONT,
     USER_MESSAGE_COLOR,
     AI_PROVIDERS,
+    AUTO_MODEL,
+    AUTO_PROVIDER,
     DEFAULT_PROVIDER,
     MODEL_SWITCH_MESSAGE,
+    TURN_DEADLINE,
 )
 from codeaide.utils.logging_config import get_logger
 from codeaide.ui.traceback_dialog import TracebackDialog
@@ -126,6 +132,59 @@ class TranscriptionThread(QThread):
         self.finished.emit(transcribed_text)
 
 
+class ProcessInputThread(QThread):
+    """
+    Runs ChatHandler.process_input off the GUI thread.
+
+    The request, parse and persist pipeline all happen in run(); the result is
+    handed back to the GUI thread through the response_ready signal so that the
+    event loop stays responsive for the whole round trip (including retries).
+    """
+
+    response_ready = pyqtSignal(dict)
+
+    def __init__(self, chat_handler, user_input, logger):
+        super().__init__()
+        self.chat_handler = chat_handler
+        self.user_input = user_input
+        self.logger = logger
+        self.is_cancelled = False
+        # Created here so the turn can be stopped before it has started
+        self.turn = TurnCancellation()
+
+    def run(self):
+        self.logger.info(
+            f"ProcessInputThread: processing input: {self.user_input[:50]}..."
+        )
+        response = self.chat_handler.process_input(self.user_input, self.turn)
+        if self.is_cancelled:
+            self.logger.info("ProcessInputThread: cancelled, discarding response")
+            return
+        if response["type"] == "cancelled":
+            # So the message can be put back in the input box
+            response = {**response, "user_input": self.user_input}
+        self.response_ready.emit(response)
+
+    def cancel(self):
+        self.is_cancelled = True
+
+
+class CompareModelsThread(QThread):
+    """
+    Runs ChatHandler.compare_models off the GUI thread.
+    """
+
+    results_ready = pyqtSignal(list)
+
+    def __init__(self, chat_handler, user_input):
+        super().__init__()
+        self.chat_handler = chat_handler
+        self.user_input = user_input
+
+    def run(self):
+        self.results_ready.emit(self.chat_handler.compare_models(self.user_input))
+
+
 class ChatWindow(QMainWindow):
     def __init__(self, chat_handler):
         super().__init__()
@@ -138,6 +197,12 @@ class ChatWindow(QMainWindow):
         self.waiting_for_api_key = False
         self.chat_contents = []
         self.is_recording = False
+        self.process_thread = None
+        # Stopped threads still finishing their request, kept until they're done
+        self.stopped_threads = []
+        self.compare_thread = None
+        self.streamed_text_start = None
+        self.is_streaming_code = False
 
         # Load microphone icons
         self.green_mic_icon = QIcon(get_resource_path("codeaide/assets/green_mic.png"))
@@ -166,6 +231,11 @@ class ChatWindow(QMainWindow):
         self.timer.start(500)
         self.timer.timeout.connect(lambda: None)
 
+        # Stops a turn that has run past TURN_DEADLINE
+        self.deadline_timer = QTimer()
+        self.deadline_timer.setSingleShot(True)
+        self.deadline_timer.timeout.connect(self.on_deadline_passed)
+
         self.logger.info("Chat window initialized")
 
     def setup_ui(self):
@@ -183,7 +253,7 @@ class ChatWindow(QMainWindow):
 
         # Provider dropdown
         self.provider_dropdown = QComboBox()
-        self.provider_dropdown.addItems(AI_PROVIDERS.keys())
+        self.provider_dropdown.addItems(list(AI_PROVIDERS.keys()) + [AUTO_PROVIDER])
         self.provider_dropdown.setCurrentText(DEFAULT_PROVIDER)
         self.provider_dropdown.currentTextChanged.connect(self.update_model_dropdown)
         dropdown_layout.addWidget(QLabel("Provider:"))
@@ -196,6 +266,18 @@ class ChatWindow(QMainWindow):
         dropdown_layout.addWidget(QLabel("Model:"))
         dropdown_layout.addWidget(self.model_dropdown)
 
+        # Lets the model settle its own questions instead of asking them
+        self.assume_defaults_checkbox = QCheckBox("Assume defaults")
+        self.assume_defaults_checkbox.setChecked(self.chat_handler.assume_defaults)
+        self.assume_defaults_checkbox.setToolTip(
+            "Ask for code straight away, with sensible defaults for anything "
+            "unspecified, instead of clarifying questions"
+        )
+        self.assume_defaults_checkbox.toggled.connect(
+            self.chat_handler.set_assume_defaults
+        )
+        dropdown_layout.addWidget(self.assume_defaults_checkbox)
+
         # Add stretch to push everything to the left
         dropdown_layout.addStretch(1)
 
@@ -210,6 +292,12 @@ class ChatWindow(QMainWindow):
         )
         main_layout.addWidget(self.chat_display, stretch=3)
 
+        # Messages submitted while a response is on its way, shown until sent
+        self.queue_label = QLabel(self)
+        self.queue_label.setWordWrap(True)
+        self.queue_label.hide()
+        main_layout.addWidget(self.queue_label)
+
         # Input text area
         self.input_text = QTextEdit(self)
         self.input_text.setStyleSheet(
@@ -252,6 +340,15 @@ class ChatWindow(QMainWindow):
         self.submit_button.clicked.connect(self.on_submit)
         button_layout.addWidget(self.submit_button)
 
+        self.stop_button = QPushButton("Stop", self)
+        self.stop_button.clicked.connect(self.on_stop_clicked)
+        self.stop_button.setEnabled(False)
+        button_layout.addWidget(self.stop_button)
+
+        self.compare_button = QPushButton("Compare Models", self)
+        self.compare_button.clicked.connect(self.on_compare_clicked)
+        button_layout.addWidget(self.compare_button)
+
         self.example_button = QPushButton("Load Example", self)
         self.example_button.clicked.connect(self.load_example)
         button_layout.addWidget(self.example_button)
@@ -271,6 +368,7 @@ class ChatWindow(QMainWindow):
         # After creating all buttons and dropdowns, add them to the list
         self.widgets_to_disable_when_recording = [
             self.submit_button,
+            self.compare_button,
             self.example_button,
             self.new_session_button,
             self.provider_dropdown,
@@ -317,22 +415,167 @@ class ChatWindow(QMainWindow):
             self.add_to_chat("AI", message)
             if success:
                 self.enable_ui_elements()
+        elif self.is_processing():
+            self.logger.info("ChatWindow: Queueing user input")
+            self.chat_handler.queue_input(user_input)
+            self.update_queue_status()
         else:
-            self.logger.info("ChatWindow: Adding user input to chat")
-            self.add_to_chat("User", user_input)
-            self.disable_ui_elements()
-            self.add_to_chat("AI", "Thinking... 🤔")
-            self.logger.info("ChatWindow: Scheduling call_process_input_async")
-            QTimer.singleShot(100, lambda: self.call_process_input_async(user_input))
+            self.send_user_input(user_input)
 
         self.update_submit_button_state()
 
-    def call_process_input_async(self, user_input):
+    def send_user_input(self, user_input):
+        self.logger.info("ChatWindow: Adding user input to chat")
+        self.add_to_chat("User", user_input)
+        self.disable_ui_elements()
+        self.add_to_chat("AI", "Thinking... 🤔")
+        self.logger.info("ChatWindow: Starting process input thread")
+        self.start_process_input_thread(user_input)
+
+    def send_queued_input(self):
+        user_input = self.chat_handler.take_queued_input()
+        self.update_queue_status()
+        if user_input is None:
+            return
+        if self.waiting_for_api_key:
+            self.input_text.setPlainText(user_input)
+            return
+        self.send_user_input(user_input)
+
+    def update_queue_status(self):
+        queued = self.chat_handler.get_queued_input()
+        if not queued:
+            self.queue_label.hide()
+            return
+        previews = ", ".join(
+            f"“{message[:40]}{'...' if len(message) > 40 else ''}”"
+            for message in queued
+        )
+        noun = "message" if len(queued) == 1 else "messages"
+        self.queue_label.setText(
+            f"⏳ {len(queued)} queued {noun}, to be sent together when this "
+            f"response arrives: {previews}"
+        )
+        self.queue_label.show()
+
+    def start_process_input_thread(self, user_input):
         self.logger.info(
-            f"ChatWindow: call_process_input_async called with input: {user_input[:50]}..."
+            f"ChatWindow: start_process_input_thread called with input: {user_input[:50]}..."
+        )
+        self.process_thread = ProcessInputThread(
+            self.chat_handler, user_input, self.logger
+        )
+        self.process_thread.response_ready.connect(self.handle_response)
+        self.process_thread.start()
+        self.stop_button.setEnabled(True)
+        # More messages can be typed while waiting; they're queued for the next turn
+        self.input_text.setEnabled(True)
+        if TURN_DEADLINE is not None:
+            self.deadline_timer.start(int(TURN_DEADLINE * 1000))
+
+    def on_stop_clicked(self):
+        self.stop_turn(STOPPED_REASON)
+
+    def on_deadline_passed(self):
+        self.stop_turn(f"No response within {TURN_DEADLINE} seconds")
+
+    def stop_turn(self, reason):
+        """
+        Stop the turn in progress without waiting for its request to finish.
+
+        The turn is removed from the conversation, its response is discarded when
+        it arrives, and the message is put back in the input box to edit or send
+        again.
+        """
+        if not self.is_processing():
+            return
+        self.deadline_timer.stop()
+        thread = self.process_thread
+        if not self.chat_handler.cancel_turn(thread.turn, reason):
+            # Too late: the response is already in the conversation and on its way
+            return
+        thread.cancel()
+        # The thread is kept referenced until its request has been abandoned
+        self.stopped_threads.append(thread)
+        thread.finished.connect(lambda: self.on_stopped_thread_finished(thread))
+        self.process_thread = None
+        self.logger.info(f"ChatWindow: turn stopped: {reason}")
+        self.finish_stopped_turn(reason, thread.user_input)
+
+    def on_stopped_thread_finished(self, thread):
+        self.stopped_threads.remove(thread)
+        compare_running = self.compare_thread is not None and (
+            self.compare_thread.isRunning()
+        )
+        if (
+            not self.stopped_threads
+            and not self.is_processing()
+            and not compare_running
+        ):
+            self.set_session_controls_enabled(True)
+
+    def finish_stopped_turn(self, reason, user_input):
+        self.enable_ui_elements()
+        self.remove_streamed_text()
+        self.remove_thinking_messages()
+        if self.is_streaming_code:
+            self.is_streaming_code = False
+            if self.code_popup:
+                self.code_popup.discard_streamed_code()
+        message = f"{reason}. Your message wasn't sent; it's back in the input box."
+        queued_input = self.chat_handler.take_queued_input()
+        self.update_queue_status()
+        if queued_input is not None:
+            user_input = f"{user_input}\n\n{queued_input}"
+            message = (
+                f"{reason}. Your message and the queued ones weren't sent; "
+                "they're back in the input box."
+            )
+        self.add_to_chat("System", message)
+        self.input_text.setPlainText(user_input)
+        self.input_text.moveCursor(self.input_text.textCursor().End)
+        self.input_text.setFocus()
+        self.update_submit_button_state()
+
+    def on_compare_clicked(self):
+        user_input = self.input_text.toPlainText().strip()
+        if not user_input or self.waiting_for_api_key:
+            QMessageBox.information(
+                self,
+                "Compare Models",
+                "Enter a prompt to send to every model you have an API key for.",
+            )
+            return
+
+        self.logger.info("ChatWindow: Comparing models")
+        self.input_text.clear()
+        self.add_to_chat("User", user_input)
+        self.add_to_chat(
+            "System",
+            "Comparing the response of every model to this prompt. It won't be "
+            "added to the conversation unless you adopt one of the responses.",
+        )
+        self.disable_ui_elements()
+        self.add_to_chat("AI", "Thinking... 🤔")
+        self.compare_thread = CompareModelsThread(self.chat_handler, user_input)
+        self.compare_thread.results_ready.connect(self.handle_comparison_results)
+        self.compare_thread.start()
+
+    def handle_comparison_results(self, results):
+        self.enable_ui_elements()
+        self.remove_thinking_messages()
+        index = show_comparison_dialog(self, results)
+        if index is None:
+            self.add_to_chat("System", "No response was adopted.")
+            return
+        result = results[index]
+        self.add_to_chat(
+            "System", f"Adopted the response of {result.provider} - {result.model}."
         )
-        response = self.chat_handler.process_input(user_input)
-        self.handle_response(response)
+        self.handle_response(self.chat_handler.adopt_comparison_result(index))
+
+    def is_processing(self):
+        return self.process_thread is not None and self.process_thread.isRunning()
 
     def on_modify(self):
         self.input_text.ensureCursorVisible()
@@ -367,25 +610,88 @@ class ChatWindow(QMainWindow):
     def display_thinking(self):
         self.add_to_chat("AI", "Thinking... 🤔")
 
+    def append_streamed_text(self, text):
+        # The streamed text is shown as a temporary message that is replaced by
+        # the final message in handle_response
+        if self.streamed_text_start is None:
+            self.remove_thinking_messages()
+            self.streamed_text_start = self.chat_display.document().characterCount()
+            self.chat_display.append(
+                general_utils.format_chat_message(
+                    AI_EMOJI, "", AI_FONT, AI_MESSAGE_COLOR
+                )
+            )
+
+        cursor = self.chat_display.textCursor()
+        cursor.movePosition(cursor.End)
+        cursor.insertText(text)
+        self.chat_display.setTextCursor(cursor)
+        self.chat_display.ensureCursorVisible()
+
+    def append_streamed_code(self, code):
+        if not self.is_streaming_code:
+            self.is_streaming_code = True
+            if self.code_popup is None:
+                self.update_or_create_code_popup({"code": "", "requirements": []})
+            self.code_popup.start_streaming()
+        self.code_popup.append_streamed_code(code)
+
+    def reset_streamed_output(self):
+        if self.streamed_text_start is not None:
+            self.remove_streamed_text()
+            self.display_thinking()
+        if self.is_streaming_code:
+            self.is_streaming_code = False
+            if self.code_popup:
+                self.code_popup.discard_streamed_code()
+
+    def remove_streamed_text(self):
+        if self.streamed_text_start is None:
+            return
+        cursor = self.chat_display.textCursor()
+        cursor.setPosition(max(self.streamed_text_start - 1, 0))
+        cursor.movePosition(cursor.End, cursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self.streamed_text_start = None
+
     def handle_response(self, response):
+        self.deadline_timer.stop()
+        if response["type"] == "cancelled":
+            if self.process_thread is None:
+                # Emitted just before stop_turn, which has already finished it
+                return
+            self.process_thread = None
+            self.finish_stopped_turn(response["message"], response["user_input"])
+            return
         self.enable_ui_elements()
+        self.remove_streamed_text()
         self.remove_thinking_messages()
+        if self.is_streaming_code:
+            self.is_streaming_code = False
+            if self.code_popup and response["type"] != "code":
+                self.code_popup.discard_streamed_code()
 
         if response["type"] == "message":
             self.add_to_chat("AI", response["message"])
         elif response["type"] == "questions":
-            message = response["message"]
-            questions = response["questions"]
-            combined_message = f"{message}\n" + "\n".join(
-                f"  * {question}" for question in questions
+            self.add_to_chat(
+                "AI",
+                general_utils.format_questions(
+                    response["message"], response["questions"]
+                ),
             )
-            self.add_to_chat("AI", combined_message)
             if self.chat_handler.is_task_in_progress():
                 self.add_to_chat(
                     "AI", "Please provide answers to these questions to continue."
                 )
         elif response["type"] == "code":
             self.add_to_chat("AI", response["message"])
+            if response.get("problems"):
+                self.add_to_chat(
+                    "System",
+                    "Static checks found problems in this version:\n"
+                    + "\n".join(response["problems"]),
+                )
             self.update_or_create_code_popup(response)
         elif response["type"] in ["error", "internal_error"]:
             self.add_to_chat("AI", response["message"])
@@ -393,6 +699,8 @@ class ChatWindow(QMainWindow):
             self.waiting_for_api_key = True
             self.add_to_chat("AI", response["message"])
 
+        self.send_queued_input()
+
     def remove_thinking_messages(self):
         cursor = self.chat_display.textCursor()
         cursor.setPosition(0)
@@ -405,14 +713,31 @@ class ChatWindow(QMainWindow):
                 cursor.movePosition(cursor.NextBlock)
 
     def disable_ui_elements(self):
+        # The provider, model and session can't change while a request is in
+        # flight on the worker thread
         self.input_text.setEnabled(False)
         self.submit_button.setEnabled(False)
+        self.stop_button.setEnabled(False)
+        self.compare_button.setEnabled(False)
         self.example_button.setEnabled(False)
+        self.new_session_button.setEnabled(False)
+        self.provider_dropdown.setEnabled(False)
+        self.model_dropdown.setEnabled(False)
 
     def enable_ui_elements(self):
         self.input_text.setEnabled(True)
         self.submit_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.compare_button.setEnabled(True)
         self.example_button.setEnabled(True)
+        # A stopped turn's request may still be running on its thread, so the
+        # session controls stay disabled until it has finished
+        self.set_session_controls_enabled(not self.stopped_threads)
+
+    def set_session_controls_enabled(self, enabled):
+        self.new_session_button.setEnabled(enabled)
+        self.provider_dropdown.setEnabled(enabled)
+        self.model_dropdown.setEnabled(enabled)
 
     def update_or_create_code_popup(self, response):
         code = response.get("code", "")
@@ -453,6 +778,10 @@ class ChatWindow(QMainWindow):
             self.close()
 
     def closeEvent(self, event):
+        # Discard any in-flight response so it isn't delivered to a closing window
+        if self.is_processing():
+            self.process_thread.cancel()
+
         # Perform cleanup
         if hasattr(self, "code_popup") and self.code_popup:
             self.code_popup.terminal_manager.cleanup()
@@ -470,7 +799,10 @@ class ChatWindow(QMainWindow):
 
     def update_model_dropdown(self, provider, add_message_to_chat=False):
         self.model_dropdown.clear()
-        models = AI_PROVIDERS[provider]["models"].keys()
+        if provider == AUTO_PROVIDER:
+            models = [AUTO_MODEL]
+        else:
+            models = AI_PROVIDERS[provider]["models"].keys()
         self.model_dropdown.addItems(models)
 
         # Set the current item to the first model in the list (default)
@@ -493,7 +825,7 @@ class ChatWindow(QMainWindow):
             return  # Exit early if either provider or model is not set
 
         current_version = self.chat_handler.get_latest_version()
-        success, message = self.chat_handler.set_model(provider, model)
+        success, message, needs_api_key = self.chat_handler.set_model(provider, model)
 
         self.logger.info(f"In update_chat_handler: current_version: {current_version}")
         self.logger.info(f"In update_chat_handler, success: {success}")
@@ -501,9 +833,11 @@ class ChatWindow(QMainWindow):
 
         if not success:
             self.logger.info("In update_chat_handler, not success")
-            if message:  # This indicates that an API key is required
+            if needs_api_key:
                 self.waiting_for_api_key = True
                 self.add_to_chat("AI", message)
+            elif message:
+                self.add_to_chat("System", message)
             else:
                 self.logger.info("In update_chat_handler, not success, no message")
                 self.add_to_chat(
@@ -520,6 +854,27 @@ class ChatWindow(QMainWindow):
 
         self.add_to_chat("System", switch_message)
 
+    def on_model_switched(self, provider, model, reason):
+        if self.provider_dropdown.currentText() == AUTO_PROVIDER:
+            # Auto mode stays selected; only say which model it's using
+            self.add_to_chat("System", reason)
+            return
+
+        # The chat handler has already switched, so update the dropdowns without
+        # triggering update_chat_handler (which would also change the selected model)
+        for dropdown in (self.provider_dropdown, self.model_dropdown):
+            dropdown.blockSignals(True)
+        self.provider_dropdown.setCurrentText(provider)
+        self.update_model_dropdown(provider)
+        self.model_dropdown.setCurrentText(model)
+        for dropdown in (self.provider_dropdown, self.model_dropdown):
+            dropdown.blockSignals(False)
+
+        self.add_to_chat("System", reason)
+        self.add_to_chat(
+            "System", MODEL_SWITCH_MESSAGE.format(provider=provider, model=model)
+        )
+
     def on_new_session_clicked(self):
         self.logger.info("User clicked New Session button")
         reply = QMessageBox.question(
@@ -581,6 +936,7 @@ class ChatWindow(QMainWindow):
             self.chat_handler.send_traceback_to_agent(traceback_text)
         else:
             self.logger.info("ChatWindow: User chose to ignore the traceback")
+            self.chat_handler.discard_traceback_fix()
 
     def update_submit_button_state(self):
         if not self.is_recording:
@@ -286,6 +286,13 @@ class CodePopup(QDialog):
         self.highlighter = PythonHighlighter(self.text_area.document())
         layout.addWidget(self.text_area)
 
+        # Problems found in the version shown by static checks, if any
+        self.problems_label = QLabel(self)
+        self.problems_label.setWordWrap(True)
+        self.problems_label.setStyleSheet("color: #d9822b;")
+        self.problems_label.hide()
+        layout.addWidget(self.problems_label)
+
         controls_layout = QVBoxLayout()
 
         version_label = QLabel("Choose a version to display/run:")
@@ -333,15 +340,43 @@ class CodePopup(QDialog):
         self.version_dropdown.addItems(version_values)
         if version_values:
             self.version_dropdown.setCurrentIndex(len(version_values) - 1)
+            self.show_problems(list(self.versions_dict.values())[-1].get("problems"))
         self.loading_versions = (
             False  # Reset flag after loading to allow on_version_change to run
         )
 
+    def show_problems(self, problems):
+        if not problems:
+            self.problems_label.hide()
+            return
+        self.problems_label.setText(
+            "⚠️ Static checks found problems in this version:\n" + "\n".join(problems)
+        )
+        self.problems_label.show()
+
     def show_code(self, code, requirements):
         self.text_area.setPlainText(code)
         self.current_requirements = requirements
         self.bring_to_front()
 
+    def start_streaming(self):
+        self.text_area.clear()
+        self.bring_to_front()
+
+    def append_streamed_code(self, code):
+        cursor = self.text_area.textCursor()
+        cursor.movePosition(cursor.End)
+        cursor.insertText(code)
+        self.text_area.setTextCursor(cursor)
+        self.text_area.ensureCursorVisible()
+
+    def discard_streamed_code(self):
+        # Go back to the selected version if the stream didn't produce a new one
+        if self.versions_dict:
+            self.on_version_change()
+        else:
+            self.text_area.clear()
+
     def on_version_change(self):
         if self.loading_versions:
             return  # Exit early if we're still loading versions
@@ -354,6 +389,7 @@ class CodePopup(QDialog):
             code = file.read()
         requirements = version_data["requirements"]
         self.show_code(code, requirements)
+        self.show_problems(version_data.get("problems"))
 
     def on_run(self):
         selected = self.version_dropdown.currentText()
@@ -0,0 +1,123 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (
+    QDialog,
+    QPushButton,
+    QSplitter,
+    QTableWidget,
+    QTableWidgetItem,
+    QTextBrowser,
+    QVBoxLayout,
+)
+
+COLUMNS = [
+    "Model",
+    "First token (s)",
+    "Total (s)",
+    "Input tokens",
+    "Output tokens",
+    "JSON parsed",
+    "Code ran",
+    "",
+]
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "✅" if value else "❌"
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+
+class ComparisonDialog(QDialog):
+    """
+    Shows the results of a model comparison side by side.
+
+    Selecting a row shows that model's response below the table, and its Adopt
+    button closes the dialog with the result chosen (see adopted_index).
+    """
+
+    def __init__(self, parent, results):
+        super().__init__(parent)
+        self.setWindowTitle("Model Comparison")
+        self.setGeometry(100, 100, 900, 600)
+        self.setModal(True)
+        self.results = results
+        self.adopted_index = None
+
+        layout = QVBoxLayout()
+        layout.setSpacing(5)
+        layout.setContentsMargins(8, 8, 8, 8)
+        splitter = QSplitter(Qt.Vertical)
+
+        self.table = QTableWidget(len(results), len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        for row, result in enumerate(results):
+            summary = result.get_summary()
+            values = [
+                summary["model"],
+                summary["first_token_latency"],
+                summary["total_latency"],
+                summary["input_tokens"],
+                summary["output_tokens"],
+                summary["json_parsed"],
+                summary["code_ran"],
+            ]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(format_value(value)))
+            adopt_button = QPushButton("Adopt")
+            adopt_button.setEnabled(result.json_parsed)
+            adopt_button.clicked.connect(lambda _, row=row: self.adopt(row))
+            self.table.setCellWidget(row, len(COLUMNS) - 1, adopt_button)
+        self.table.resizeColumnsToContents()
+        self.table.currentCellChanged.connect(self.update_preview)
+
+        self.preview_text = QTextBrowser()
+        splitter.addWidget(self.table)
+        splitter.addWidget(self.preview_text)
+        splitter.setStretchFactor(0, 1)
+        splitter.setStretchFactor(1, 2)
+        layout.addWidget(splitter)
+
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.reject)
+        layout.addWidget(close_button)
+        self.setLayout(layout)
+
+        if results:
+            self.table.selectRow(0)
+            self.update_preview(0)
+
+    def update_preview(self, row, *args):
+        if row < 0:
+            return
+        result = self.results[row]
+        sections = []
+        if result.parsed is not None:
+            sections.append(result.parsed[0] or "")
+        if result.error:
+            sections.append(f"Error:\n{result.error}")
+        if result.code:
+            sections.append(result.code)
+        self.preview_text.setPlainText("\n\n".join(sections))
+
+    def adopt(self, row):
+        self.adopted_index = row
+        self.accept()
+
+
+def show_comparison_dialog(parent, results):
+    """
+    Show the results of a model comparison.
+
+    Returns:
+        int: The index of the result to adopt, or None.
+    """
+    dialog = ComparisonDialog(parent, results)
+    if dialog.exec_():
+        return dialog.adopted_index
+    return None
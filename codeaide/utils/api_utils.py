@@ -1,15 +1,29 @@
 import anthropic
 import openai
 import google.generativeai as genai
+import datetime
+import email.utils
+import functools
+import hashlib
 import hjson
+import json
 import re
+import threading
+import time
+from types import SimpleNamespace
+from google.generativeai import protos
 from google.generativeai.types import GenerationConfig
 from google.api_core import exceptions as google_exceptions
 from codeaide.utils.config_manager import ConfigManager
+from codeaide.utils.json_repair import record_repair, repair_json
 
 from codeaide.utils.constants import (
     AI_PROVIDERS,
     DEFAULT_PROVIDER,
+    ENABLE_PROMPT_CACHING,
+    ENABLE_STRUCTURED_OUTPUT,
+    GOOGLE_CACHE_TTL_MINUTES,
+    GOOGLE_MIN_CACHE_TOKENS,
     SYSTEM_PROMPT,
 )
 from codeaide.utils.logging_config import get_logger
@@ -17,6 +31,51 @@ from codeaide.utils.logging_config import get_logger
 logger = get_logger()
 config_manager = ConfigManager()
 
+# Clients by (provider, model, key fingerprint) and shared HTTP clients by provider
+client_registry = {}
+client_registry_lock = threading.Lock()
+http_clients = {}
+
+# Gemini calls the assistant role "model"
+GOOGLE_ROLES = {"user": "user", "assistant": "model"}
+
+QUOTA_EXCEEDED_MESSAGE = "Your quota has been exceeded. You might need to wait briefly before trying again or try using a different model."
+
+# Anthropic allows 4 cache breakpoints; one is used for the system prompt
+ANTHROPIC_CACHE_CONTROL = {"type": "ephemeral"}
+ANTHROPIC_HISTORY_BREAKPOINTS = 2
+
+# The schema of the JSON object that every response must be (see SYSTEM_PROMPT)
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "text": {"type": "string"},
+        "questions": {"type": "array", "items": {"type": "string"}},
+        "code": {"type": ["string", "null"]},
+        "code_version": {"type": ["string", "null"]},
+        "version_description": {"type": ["string", "null"]},
+        "requirements": {"type": ["array", "null"], "items": {"type": "string"}},
+    },
+    "required": [
+        "text",
+        "questions",
+        "code",
+        "code_version",
+        "version_description",
+        "requirements",
+    ],
+    "additionalProperties": False,
+}
+RESPONSE_TOOL_NAME = "codeaide_response"
+
+# OpenAI models that support json_schema response formats; the others use JSON mode
+OPENAI_JSON_SCHEMA_MODELS = {"gpt-4o-mini"}
+
+# Gemini CachedContent resources by model, as
+# (number of contents, prefix hash, cache, time.monotonic() it expires at)
+google_cached_contents = {}
+google_cached_contents_lock = threading.Lock()
+
 
 class MissingAPIKeyException(Exception):
     def __init__(self, service):
@@ -27,6 +86,21 @@ class MissingAPIKeyException(Exception):
 
 
 def get_api_client(provider=DEFAULT_PROVIDER, model=None):
+    """
+    Get a client for the given provider and model.
+
+    Clients are kept in a registry keyed by (provider, model, key fingerprint), so
+    repeated calls (API key checks, model switches) reuse the existing client and
+    its open HTTP connections instead of building a new one each time. Anthropic
+    and OpenAI clients also share one HTTP connection pool per provider.
+
+    Args:
+        provider (str): The provider name.
+        model (str, optional): The model name.
+
+    Returns:
+        The provider client, or None if the API key is missing or invalid.
+    """
     try:
         api_key = config_manager.get_api_key(provider)
         logger.info(f"Attempting to get API key for {provider}")
@@ -36,21 +110,92 @@ def get_api_client(provider=DEFAULT_PROVIDER, model=None):
             logger.warning(f"API key for {provider} is missing or empty")
             return None
 
-        if provider.lower() == "anthropic":
-            return anthropic.Anthropic(api_key=api_key)
-        elif provider.lower() == "openai":
-            return openai.OpenAI(api_key=api_key)
-        elif provider.lower() == "google":
-            genai.configure(api_key=api_key)
-            client = genai.GenerativeModel(model, system_instruction=SYSTEM_PROMPT)
-            return client
-        else:
-            raise ValueError(f"In get_api_client, unsupported provider: {provider}")
+        registry_key = (provider.lower(), model, get_key_fingerprint(api_key))
+        with client_registry_lock:
+            client = client_registry.get(registry_key)
+            if client is None:
+                client = create_api_client(provider, model, api_key)
+                client_registry[registry_key] = client
+            else:
+                logger.info(f"Reusing existing {provider} client for {model}")
+        return client
     except Exception as e:
         logger.error(f"Error initializing {provider.capitalize()} API client: {str(e)}")
         return None
 
 
+def create_api_client(provider, model, api_key):
+    if provider.lower() == "anthropic":
+        return anthropic.Anthropic(
+            api_key=api_key, http_client=get_http_client(provider)
+        )
+    elif provider.lower() == "openai":
+        return openai.OpenAI(api_key=api_key, http_client=get_http_client(provider))
+    elif provider.lower() == "google":
+        genai.configure(api_key=api_key)
+        client = genai.GenerativeModel(model, system_instruction=SYSTEM_PROMPT)
+        return client
+    else:
+        raise ValueError(f"In get_api_client, unsupported provider: {provider}")
+
+
+def get_http_client(provider):
+    """
+    Get the shared HTTP client (and connection pool) for a provider.
+    """
+    provider = provider.lower()
+    if provider not in http_clients:
+        if provider == "anthropic":
+            http_clients[provider] = anthropic.DefaultHttpxClient()
+        else:
+            http_clients[provider] = openai.DefaultHttpxClient()
+    return http_clients[provider]
+
+
+def get_key_fingerprint(api_key):
+    # Only a hash of the key is kept in the registry key
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def warm_up_api_client(api_client, provider):
+    """
+    Open a connection to the provider in the background.
+
+    This is called when the model changes, so that the TCP/TLS handshake has
+    already happened by the time the first real request is sent.
+
+    Args:
+        api_client: The client returned by get_api_client.
+        provider (str): The provider name.
+
+    Returns:
+        threading.Thread: The started warm-up thread.
+    """
+    thread = threading.Thread(
+        target=_warm_up_api_client, args=(api_client, provider), daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _warm_up_api_client(api_client, provider):
+    start_time = time.time()
+    try:
+        if provider.lower() in ["anthropic", "openai"]:
+            # Any response will do; the point is to leave an open connection
+            # in the shared pool
+            get_http_client(provider).head(str(api_client.base_url))
+        elif provider.lower() == "google":
+            # count_tokens is free and goes over the same channel as
+            # generate_content
+            api_client.count_tokens("ping")
+        logger.info(
+            f"Warmed up {provider} connection in {time.time() - start_time:.2f} seconds"
+        )
+    except Exception as e:
+        logger.warning(f"Failed to warm up {provider} connection: {str(e)}")
+
+
 def save_api_key(service, api_key):
     try:
         cleaned_key = api_key.strip().strip("'\"")  # Remove quotes and whitespace
@@ -61,55 +206,88 @@ def save_api_key(service, api_key):
         return False
 
 
-def send_api_request(api_client, conversation_history, max_tokens, model, provider):
+def send_api_request(
+    api_client,
+    conversation_history,
+    max_tokens,
+    model,
+    provider,
+    stream_callback=None,
+    structured_output=True,
+    temperature=None,
+):
+    """
+    Send the conversation to the given provider and return its response.
+
+    Args:
+        api_client: The provider client returned by get_api_client.
+        conversation_history (list): The messages to send.
+        max_tokens (int): The maximum number of output tokens.
+        model (str): The model name.
+        provider (str): The provider name.
+        stream_callback (callable, optional): If given, the response is streamed
+            and the callback is called with each new chunk of text as it arrives.
+            The complete response is still returned at the end.
+        structured_output (bool, optional): Constrain the response to
+            RESPONSE_SCHEMA if ENABLE_STRUCTURED_OUTPUT is set. Continuations of a
+            truncated response turn this off, since they are only part of the
+            object.
+        temperature (float, optional): The sampling temperature, instead of the
+            provider's default.
+
+    Returns:
+        The provider's response object, or None if the request failed.
+    """
     logger.info(f"Sending API request with model: {model} and max_tokens: {max_tokens}")
     logger.debug(f"Conversation history: {conversation_history}")
 
+    if stream_callback is not None:
+        return stream_api_request(
+            api_client,
+            conversation_history,
+            max_tokens,
+            model,
+            provider,
+            stream_callback,
+            structured_output,
+            temperature,
+        )
+
     try:
         if provider.lower() == "anthropic":
             response = api_client.messages.create(
                 model=model,
                 max_tokens=max_tokens,
-                messages=conversation_history,
-                system=SYSTEM_PROMPT,
+                **build_anthropic_request(conversation_history, structured_output),
+                **get_temperature_options(temperature),
             )
             if not response.content:
                 return None
         elif provider.lower() == "openai":
-            messages = [
-                {"role": "system", "content": SYSTEM_PROMPT}
-            ] + conversation_history
             response = api_client.chat.completions.create(
                 model=model,
-                messages=messages,
                 max_tokens=max_tokens,
+                **build_openai_request(model, conversation_history, structured_output),
+                **get_temperature_options(temperature),
             )
             if not response.choices:
                 return None
         elif provider.lower() == "google":
             try:
-                prompt = ""
-                for message in conversation_history:
-                    role = message["role"]
-                    content = message["content"]
-                    prompt += f"{role.capitalize()}: {content}\n\n"
-
-                # Create a GenerationConfig object
-                generation_config = GenerationConfig(
-                    max_output_tokens=max_tokens,
-                    temperature=0.7,  # You can adjust this as needed
-                    top_p=0.95,  # You can adjust this as needed
-                    top_k=40,  # You can adjust this as needed
-                )
-
-                response = api_client.generate_content(
-                    contents=prompt, generation_config=generation_config
+                response = send_google_request(
+                    api_client,
+                    model,
+                    conversation_history,
+                    lambda google_client, contents: google_client.generate_content(
+                        contents=contents,
+                        generation_config=build_google_generation_config(
+                            max_tokens, structured_output, temperature
+                        ),
+                    ),
                 )
             except google_exceptions.ResourceExhausted:
                 logger.error("Google API quota exceeded")
-                raise QuotaExceededException(
-                    "Your quota has been exceeded. You might need to wait briefly before trying again or try using a different model."
-                )
+                raise RateLimitException(QUOTA_EXCEEDED_MESSAGE)
         else:
             raise NotImplementedError(f"API request for {provider} not implemented")
 
@@ -120,44 +298,671 @@ def send_api_request(api_client, conversation_history, max_tokens, model, provid
         logger.error(f"Error in API request to {provider}: {str(e)}")
         if isinstance(e, QuotaExceededException):
             raise
+        if isinstance(e, (anthropic.RateLimitError, openai.RateLimitError)):
+            raise RateLimitException(
+                QUOTA_EXCEEDED_MESSAGE, retry_after=get_retry_after(e.response)
+            )
         return None
 
 
-def parse_response(response, provider):
+def stream_api_request(
+    api_client,
+    conversation_history,
+    max_tokens,
+    model,
+    provider,
+    stream_callback,
+    structured_output=True,
+    temperature=None,
+):
+    """
+    Stream a response from the given provider, passing each text chunk to
+    stream_callback as it arrives.
+
+    The return value has the same shape as the non-streamed response for the
+    provider, so it can be passed straight to parse_response.
+    """
+    logger.info(f"Streaming API request from {provider}")
+    try:
+        if provider.lower() == "anthropic":
+            with api_client.messages.stream(
+                model=model,
+                max_tokens=max_tokens,
+                **build_anthropic_request(conversation_history, structured_output),
+                **get_temperature_options(temperature),
+            ) as stream:
+                chunks = []
+                for event in stream:
+                    # Forced tool use streams the response JSON as input_json
+                    # deltas instead of text deltas
+                    if event.type == "content_block_delta":
+                        chunk = getattr(event.delta, "text", None) or getattr(
+                            event.delta, "partial_json", None
+                        )
+                        if chunk:
+                            chunks.append(chunk)
+                            stream_callback(chunk)
+                response = stream.get_final_message()
+            if (
+                response.content
+                and getattr(response.content[0], "type", None) == "tool_use"
+                and response.stop_reason == "max_tokens"
+            ):
+                # The input of a truncated tool call is incomplete, so keep the
+                # raw JSON that was streamed in order to continue it
+                response = build_response(
+                    provider, "".join(chunks), response.stop_reason, response.usage
+                )
+            if not response.content:
+                return None
+        elif provider.lower() == "openai":
+            stream = api_client.chat.completions.create(
+                model=model,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                **build_openai_request(model, conversation_history, structured_output),
+                **get_temperature_options(temperature),
+            )
+            chunks = []
+            finish_reason = None
+            usage = None
+            for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta and choice.delta.content:
+                    chunks.append(choice.delta.content)
+                    stream_callback(choice.delta.content)
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+            if not chunks:
+                return None
+            response = build_openai_response(
+                "".join(chunks), finish_reason=finish_reason, usage=usage
+            )
+        elif provider.lower() == "google":
+            streamed = []
+
+            def send_streamed(google_client, contents):
+                response = google_client.generate_content(
+                    contents=contents,
+                    generation_config=build_google_generation_config(
+                        max_tokens, structured_output, temperature
+                    ),
+                    stream=True,
+                )
+                for chunk in response:
+                    for part in chunk.candidates[0].content.parts:
+                        if part.text:
+                            streamed.append(part.text)
+                            stream_callback(part.text)
+                return response
+
+            try:
+                response = send_google_request(
+                    api_client,
+                    model,
+                    conversation_history,
+                    send_streamed,
+                    # Text already passed on can't be taken back
+                    can_resend=lambda: not streamed,
+                )
+            except google_exceptions.ResourceExhausted:
+                logger.error("Google API quota exceeded")
+                raise RateLimitException(QUOTA_EXCEEDED_MESSAGE)
+        else:
+            raise NotImplementedError(f"API request for {provider} not implemented")
+
+        logger.info(f"Received streamed response from {provider}")
+        logger.debug(f"Response object: {response}")
+        return response
+    except Exception as e:
+        if isinstance(e, RequestCancelled):
+            logger.info(f"Streamed API request to {provider} was cancelled")
+            raise
+        logger.error(f"Error in streamed API request to {provider}: {str(e)}")
+        if isinstance(e, QuotaExceededException):
+            raise
+        if isinstance(e, (anthropic.RateLimitError, openai.RateLimitError)):
+            raise RateLimitException(
+                QUOTA_EXCEEDED_MESSAGE, retry_after=get_retry_after(e.response)
+            )
+        return None
+
+
+def get_retry_after(http_response):
+    """
+    Get the delay requested by a 429 response's retry-after headers, in seconds.
+
+    Args:
+        http_response: The httpx response of the failed request.
+
+    Returns:
+        float: The delay, or None if the response doesn't specify one.
+    """
+    headers = getattr(http_response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        retry_after = headers.get("retry-after")
+        if retry_after is None:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_temperature_options(temperature):
+    """
+    Get the request arguments that set the temperature, if one was given.
+    """
+    return {} if temperature is None else {"temperature": temperature}
+
+
+def build_anthropic_request(conversation_history, structured_output=True):
+    """
+    Build the system prompt, messages and tools for an Anthropic request.
+
+    With prompt caching enabled, cache breakpoints are set on the system prompt and
+    on the last two user messages. The breakpoint on the last message writes the
+    whole conversation to the cache, and the one before it reads the prefix that
+    was written by the previous request, so each turn only pays full price for the
+    messages added since then.
+
+    With structured output enabled, the model is made to call a tool whose input
+    schema is the response schema, so the response is always a valid object.
+
+    Args:
+        conversation_history (list): The messages to send.
+        structured_output (bool, optional): Whether to use the response tool.
+
+    Returns:
+        dict: Keyword arguments for messages.create / messages.stream.
+    """
+    request = {"system": SYSTEM_PROMPT, "messages": conversation_history}
+    if ENABLE_STRUCTURED_OUTPUT and structured_output:
+        request["tools"] = [
+            {
+                "name": RESPONSE_TOOL_NAME,
+                "description": "Send the response to the user.",
+                "input_schema": RESPONSE_SCHEMA,
+            }
+        ]
+        request["tool_choice"] = {"type": "tool", "name": RESPONSE_TOOL_NAME}
+    if not ENABLE_PROMPT_CACHING:
+        return request
+
+    system = [
+        {
+            "type": "text",
+            "text": SYSTEM_PROMPT,
+            "cache_control": ANTHROPIC_CACHE_CONTROL,
+        }
+    ]
+    messages = list(conversation_history)
+    user_indices = [
+        i for i, message in enumerate(messages) if message["role"] == "user"
+    ]
+    for i in user_indices[-ANTHROPIC_HISTORY_BREAKPOINTS:]:
+        messages[i] = {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": messages[i]["content"],
+                    "cache_control": ANTHROPIC_CACHE_CONTROL,
+                }
+            ],
+        }
+    request["system"], request["messages"] = system, messages
+    return request
+
+
+def build_openai_request(model, conversation_history, structured_output=True):
+    """
+    Build the messages and response format for an OpenAI request.
+
+    The system prompt is always sent first so that it is part of the prefix that
+    OpenAI caches automatically. With structured output enabled, models that
+    support it are constrained to the response schema; the others use JSON mode,
+    which guarantees a valid JSON object but not its fields.
+
+    Args:
+        model (str): The model name.
+        conversation_history (list): The messages to send.
+        structured_output (bool, optional): Whether to set a response format.
+
+    Returns:
+        dict: Keyword arguments for chat.completions.create.
+    """
+    request = {
+        "messages": [{"role": "system", "content": SYSTEM_PROMPT}]
+        + conversation_history
+    }
+    if ENABLE_STRUCTURED_OUTPUT and structured_output:
+        if model in OPENAI_JSON_SCHEMA_MODELS:
+            request["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": RESPONSE_TOOL_NAME,
+                    "strict": True,
+                    "schema": RESPONSE_SCHEMA,
+                },
+            }
+        else:
+            request["response_format"] = {"type": "json_object"}
+    return request
+
+
+def send_google_request(
+    api_client, model, conversation_history, send, can_resend=lambda: True
+):
+    """
+    Send a Gemini request, using cached content where possible.
+
+    If the request fails while using cached content, which happens once the
+    server has expired it, the cache is forgotten and the request is sent again
+    with the uncached contents.
+
+    Args:
+        api_client: The GenerativeModel returned by get_api_client.
+        model (str): The model name.
+        conversation_history (list): The messages to send.
+        send (callable): Sends the request, given the GenerativeModel to call and
+            the contents to send, and returns the response.
+        can_resend (callable, optional): Returns False if a failed request can no
+            longer be sent again, such as once part of a stream has been used.
+
+    Returns:
+        The response returned by send.
+    """
+    google_client, contents, cached_content = build_google_request(
+        api_client, model, conversation_history
+    )
+    if cached_content is None:
+        return send(google_client, contents)
+    try:
+        return send(google_client, contents)
+    except (google_exceptions.ResourceExhausted, RequestCancelled):
+        raise
+    except Exception as e:
+        forget_google_cached_content(model, cached_content)
+        if not can_resend():
+            raise
+        logger.warning(
+            f"Gemini request with cached content {cached_content.name} failed; "
+            f"sending it uncached: {str(e)}"
+        )
+        return send(api_client, build_google_contents(conversation_history))
+
+
+def get_google_cached_contents(model):
+    # The caller must hold google_cached_contents_lock
+    now = time.monotonic()
+    entries = [
+        entry for entry in google_cached_contents.get(model, []) if entry[3] > now
+    ]
+    google_cached_contents[model] = entries
+    return entries
+
+
+def forget_google_cached_content(model, cached_content):
+    with google_cached_contents_lock:
+        google_cached_contents[model] = [
+            entry
+            for entry in google_cached_contents.get(model, [])
+            if entry[2] is not cached_content
+        ]
+
+
+def build_google_request(api_client, model, conversation_history):
+    """
+    Get the client and contents to use for a Gemini request.
+
+    With prompt caching enabled, the longest previously cached prefix of the
+    conversation is reused, and the request only carries the contents after it.
+    A new CachedContent is created for everything but the latest message once the
+    uncached part is large enough to be cached on its own. Caches are forgotten a
+    minute before the server expires them. If caching fails for any reason the
+    request is sent uncached.
+
+    Args:
+        api_client: The GenerativeModel returned by get_api_client.
+        model (str): The model name.
+        conversation_history (list): The messages to send.
+
+    Returns:
+        tuple: The GenerativeModel to call, the list of contents to send, and the
+        CachedContent used (or None).
+    """
+    contents = build_google_contents(conversation_history)
+    if not ENABLE_PROMPT_CACHING:
+        return api_client, contents, None
+
+    prefix_hashes = get_google_prefix_hashes(contents)
+    with google_cached_contents_lock:
+        cached = None
+        for length, prefix_hash, cached_content, _ in get_google_cached_contents(model):
+            if length < len(contents) and prefix_hashes[length - 1] == prefix_hash:
+                if cached is None or length > cached[0]:
+                    cached = (length, cached_content)
+
+    start = cached[0] if cached else 0
+    uncached_tokens = sum(
+        estimate_google_content_tokens(content) for content in contents[start:-1]
+    )
+    if uncached_tokens >= GOOGLE_MIN_CACHE_TOKENS:
+        try:
+            ttl = datetime.timedelta(minutes=GOOGLE_CACHE_TTL_MINUTES)
+            cached_content = genai.caching.CachedContent.create(
+                model=model,
+                system_instruction=SYSTEM_PROMPT,
+                contents=contents[:-1],
+                ttl=ttl,
+            )
+            cached = (len(contents) - 1, cached_content)
+            expires_at = time.monotonic() + ttl.total_seconds() - 60
+            with google_cached_contents_lock:
+                get_google_cached_contents(model).append(
+                    (
+                        cached[0],
+                        prefix_hashes[cached[0] - 1],
+                        cached_content,
+                        expires_at,
+                    )
+                )
+            logger.info(f"Cached {cached[0]} Gemini contents as {cached_content.name}")
+        except Exception as e:
+            logger.warning(f"Failed to create Gemini cached content: {str(e)}")
+
+    if cached is None:
+        return api_client, contents, None
+    try:
+        cached_client = genai.GenerativeModel.from_cached_content(cached[1])
+    except Exception as e:
+        logger.warning(f"Failed to use Gemini cached content: {str(e)}")
+        return api_client, contents, None
+    return cached_client, contents[cached[0] :], cached[1]
+
+
+def get_google_prefix_hashes(contents):
+    # prefix_hashes[i] identifies contents[: i + 1]
+    digest = hashlib.sha256()
+    prefix_hashes = []
+    for content in contents:
+        digest.update(protos.Content.serialize(content))
+        prefix_hashes.append(digest.copy().hexdigest())
+    return prefix_hashes
+
+
+def estimate_google_content_tokens(content):
+    return sum(len(part.text) for part in content.parts) // 4 + 1
+
+
+def build_google_contents(conversation_history):
+    """
+    Convert the conversation history to Gemini's multi-turn contents format.
+
+    Each turn is sent with its own role instead of re-serializing the whole
+    conversation into a single prompt string. Converted turns are cached, so on
+    each new request only the messages added since the last one are converted and
+    earlier turns are reused as-is. Consecutive messages from the same role (e.g. a
+    user message left behind by a failed request) are merged, since Gemini expects
+    the roles to alternate.
+
+    Args:
+        conversation_history (list): Messages with 'role' and 'content' keys.
+
+    Returns:
+        list: The protos.Content list to pass to generate_content.
+    """
+    turns = []
+    for message in conversation_history:
+        role = GOOGLE_ROLES.get(message["role"], message["role"])
+        if turns and turns[-1][0] == role:
+            turns[-1][1].append(message["content"])
+        else:
+            turns.append((role, [message["content"]]))
+    return [to_google_content(role, tuple(parts)) for role, parts in turns]
+
+
+@functools.lru_cache(maxsize=1024)
+def to_google_content(role, parts):
+    return protos.Content(role=role, parts=[protos.Part(text=part) for part in parts])
+
+
+def build_google_generation_config(
+    max_tokens, structured_output=True, temperature=None
+):
+    response_format = {}
+    if ENABLE_STRUCTURED_OUTPUT and structured_output:
+        response_format = {
+            "response_mime_type": "application/json",
+            "response_schema": to_google_schema(RESPONSE_SCHEMA),
+        }
+    return GenerationConfig(
+        max_output_tokens=max_tokens,
+        temperature=0.7 if temperature is None else temperature,
+        top_p=0.95,  # You can adjust this as needed
+        top_k=40,  # You can adjust this as needed
+        **response_format,
+    )
+
+
+def to_google_schema(schema):
+    """
+    Convert a JSON schema to the OpenAPI subset that Gemini accepts.
+
+    Gemini has no union types, so ["<type>", "null"] becomes a nullable type, and
+    it doesn't support additionalProperties.
+    """
+    google_schema = {}
+    for key, value in schema.items():
+        if key == "additionalProperties":
+            continue
+        if key == "type" and isinstance(value, list):
+            google_schema["type"] = next(t for t in value if t != "null")
+            if "null" in value:
+                google_schema["nullable"] = True
+        elif key == "properties":
+            google_schema[key] = {
+                name: to_google_schema(prop) for name, prop in value.items()
+            }
+        elif key == "items":
+            google_schema[key] = to_google_schema(value)
+        else:
+            google_schema[key] = value
+    return google_schema
+
+
+def build_openai_response(text, finish_reason=None, usage=None):
+    """
+    Build an object shaped like an OpenAI chat completion from assembled text,
+    so streamed responses can be handled the same way as regular ones.
+    """
+    message = SimpleNamespace(role="assistant", content=text)
+    choice = SimpleNamespace(index=0, message=message, finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice], usage=usage)
+
+
+def build_response(provider, text, finish_reason=None, usage=None):
+    """
+    Build an object shaped like the given provider's response from plain text.
+
+    This lets responses that didn't come straight from the SDK (cached or stitched
+    together from several requests) go through parse_response and the rest of the
+    pipeline unchanged.
+
+    Args:
+        provider (str): The provider whose response shape to use.
+        text (str): The text of the reply.
+        finish_reason (optional): The stop/finish reason to report.
+        usage (optional): The usage object to report.
+
+    Returns:
+        An object with the same attributes as the provider's response.
+    """
+    if provider.lower() == "anthropic":
+        block = SimpleNamespace(type="text", text=text)
+        return SimpleNamespace(content=[block], stop_reason=finish_reason, usage=usage)
+    elif provider.lower() == "openai":
+        return build_openai_response(text, finish_reason=finish_reason, usage=usage)
+    elif provider.lower() == "google":
+        content = SimpleNamespace(role="model", parts=[SimpleNamespace(text=text)])
+        candidate = SimpleNamespace(content=content, finish_reason=finish_reason)
+        return SimpleNamespace(candidates=[candidate], usage_metadata=usage)
+    else:
+        raise ValueError(f"In build_response, unsupported provider: {provider}")
+
+
+def get_response_text(response, provider):
+    """
+    Extract the raw text of the model's reply from a provider response.
+
+    Args:
+        response: The response object returned by send_api_request.
+        provider (str): The provider that produced the response.
+
+    Returns:
+        str: The text of the reply.
+
+    Raises:
+        ValueError: If the response is empty or the provider is unsupported.
+    """
     if not response:
         raise ValueError("Empty or invalid response received")
 
-    logger.info(f"Received response: {response}")
-
     if provider.lower() == "anthropic":
         if not response.content:
             raise ValueError("Empty or invalid response received")
-        json_str = response.content[0].text
+        block = response.content[0]
+        if getattr(block, "type", None) == "tool_use":
+            # Structured output: the response object is the tool input
+            return json.dumps(block.input, ensure_ascii=False)
+        return block.text
     elif provider.lower() == "openai":
         if not response.choices:
             raise ValueError("Empty or invalid response received")
-        json_str = response.choices[0].message.content
+        return response.choices[0].message.content
     elif provider.lower() == "google":
-        json_str = response.candidates[0].content.parts[0].text
+        return response.candidates[0].content.parts[0].text
     else:
-        raise ValueError(f"In parse_response, unsupported provider: {provider}")
+        raise ValueError(f"In get_response_text, unsupported provider: {provider}")
 
-    # Remove the triple backticks and language identifier if present
-    if json_str.startswith("```json"):
-        json_str = json_str[7:-3].strip()
-    elif json_str.startswith("```"):
-        json_str = json_str[3:-3].strip()
+
+def get_finish_reason(response, provider):
+    """
+    Get the reason the model stopped generating, as a string.
+
+    Args:
+        response: The response object returned by send_api_request.
+        provider (str): The provider that produced the response.
+
+    Returns:
+        str: The provider's stop/finish reason (e.g. 'max_tokens', 'length' or
+        'MAX_TOKENS'), or None if it isn't available.
+    """
+    if provider.lower() == "anthropic":
+        reason = getattr(response, "stop_reason", None)
+    elif provider.lower() == "openai":
+        choices = getattr(response, "choices", None)
+        reason = choices[0].finish_reason if choices else None
+    elif provider.lower() == "google":
+        candidates = getattr(response, "candidates", None)
+        reason = candidates[0].finish_reason if candidates else None
+    else:
+        raise ValueError(f"In get_finish_reason, unsupported provider: {provider}")
+
+    if reason is None or isinstance(reason, str):
+        return reason
+    # Gemini reports an enum
+    return getattr(reason, "name", str(reason))
+
+
+def get_token_usage(response, provider):
+    """
+    Get the token counts for a response, including prompt caching.
+
+    Args:
+        response: The response object returned by send_api_request.
+        provider (str): The provider that produced the response.
+
+    Returns:
+        dict: 'input_tokens' (input that was neither read from nor written to the
+        cache), 'cache_read_tokens', 'cache_write_tokens' and 'output_tokens'.
+        Counts the provider didn't report are 0.
+    """
+
+    def count(obj, name):
+        return (getattr(obj, name, None) or 0) if obj is not None else 0
+
+    if provider.lower() == "anthropic":
+        usage = getattr(response, "usage", None)
+        return {
+            "input_tokens": count(usage, "input_tokens"),
+            "cache_read_tokens": count(usage, "cache_read_input_tokens"),
+            "cache_write_tokens": count(usage, "cache_creation_input_tokens"),
+            "output_tokens": count(usage, "output_tokens"),
+        }
+    elif provider.lower() == "openai":
+        usage = getattr(response, "usage", None)
+        cached = count(getattr(usage, "prompt_tokens_details", None), "cached_tokens")
+        return {
+            "input_tokens": count(usage, "prompt_tokens") - cached,
+            "cache_read_tokens": cached,
+            "cache_write_tokens": 0,
+            "output_tokens": count(usage, "completion_tokens"),
+        }
+    elif provider.lower() == "google":
+        usage = getattr(response, "usage_metadata", None)
+        cached = count(usage, "cached_content_token_count")
+        return {
+            "input_tokens": count(usage, "prompt_token_count") - cached,
+            "cache_read_tokens": cached,
+            "cache_write_tokens": 0,
+            "output_tokens": count(usage, "candidates_token_count"),
+        }
+    else:
+        raise ValueError(f"In get_token_usage, unsupported provider: {provider}")
+
+
+def parse_response(response, provider):
+    if not response:
+        raise ValueError("Empty or invalid response received")
+
+    logger.info(f"Received response: {response}")
+
+    response_text = get_response_text(response, provider)
+
+    json_str = strip_json_fences(response_text)
 
     try:
         # Parse the outer structure using hjson
         outer_json = hjson.loads(json_str)
+        error = None
     except hjson.HjsonDecodeError as e:
-        raise ValueError(
-            f"Failed to parse response: {str(e)}\nProblematic string: {json_str}"
-        )
+        outer_json, error = None, e
 
     if not isinstance(outer_json, dict):
-        raise ValueError("Parsed response is not a valid JSON object")
+        # Recover locally (stray text, unescaped characters) before giving up,
+        # which would cost a retry request
+        repaired_json = repair_json(response_text)
+        if repaired_json is not None:
+            record_repair("json")
+            outer_json = repaired_json
+        elif error is not None:
+            raise ValueError(
+                f"Failed to parse response: {str(error)}\nProblematic string: {json_str}"
+            )
+        else:
+            raise ValueError("Parsed response is not a valid JSON object")
 
     text = outer_json.get("text")
     code = outer_json.get("code")
@@ -173,6 +978,15 @@ def parse_response(response, provider):
     return text, questions, code, code_version, version_description, requirements
 
 
+def strip_json_fences(json_str):
+    # Remove the triple backticks and language identifier if present
+    if json_str.startswith("```json"):
+        json_str = json_str[7:-3].strip()
+    elif json_str.startswith("```"):
+        json_str = json_str[3:-3].strip()
+    return json_str
+
+
 def clean_code(code):
     """
     Clean the code by removing triple backticks and language identifiers.
@@ -220,3 +1034,25 @@ if __name__ == "__main__":
 # Add this new exception class at the end of the file
 class QuotaExceededException(Exception):
     pass
+
+
+class RateLimitException(QuotaExceededException):
+    """
+    Raised when a provider rejects a request with a rate limit (429) error.
+
+    The scheduler in rate_limiter catches it and sends the request again once
+    there is capacity; it only reaches the user if that takes too long.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RequestCancelled(Exception):
+    """
+    Raised by a stream callback to abandon a streamed request.
+
+    stream_api_request lets it through (closing the stream) instead of treating
+    it as a failed request.
+    """
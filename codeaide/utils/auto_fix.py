@@ -0,0 +1,147 @@
+import time
+
+from codeaide.utils.constants import (
+    AUTO_FIX_BUDGET,
+    AUTO_FIX_MAX_ITERATIONS,
+    HEADLESS_RUN_TIMEOUT,
+)
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+# How much of the output of a failed run without a traceback is sent back
+MAX_ERROR_OUTPUT_CHARS = 2000
+
+
+class Iteration:
+    """
+    One request of the auto-fix loop, and the run of the code it returned.
+    """
+
+    def __init__(self, number):
+        self.number = number
+        self.response_type = None
+        self.request_seconds = None
+        self.tokens = 0
+        self.run_result = None
+
+    @property
+    def succeeded(self):
+        return self.run_result is not None and self.run_result.succeeded
+
+    def get_summary(self):
+        return {
+            "iteration": self.number,
+            "response_type": self.response_type,
+            "request_seconds": self.request_seconds,
+            "run_seconds": self.run_result.duration if self.run_result else None,
+            "tokens": self.tokens,
+            "succeeded": self.succeeded,
+        }
+
+
+class AutoFixResult:
+    def __init__(self, iterations, elapsed, reason):
+        self.iterations = iterations
+        self.elapsed = elapsed
+        self.reason = reason
+
+    @property
+    def succeeded(self):
+        return bool(self.iterations) and self.iterations[-1].succeeded
+
+    @property
+    def total_tokens(self):
+        return sum(iteration.tokens for iteration in self.iterations)
+
+
+def get_error_report(run_result):
+    """
+    Describe a failed run: its traceback, or the end of its output.
+    """
+    if run_result.traceback:
+        return run_result.traceback
+    output = run_result.output.strip()[-MAX_ERROR_OUTPUT_CHARS:]
+    return f"ERROR: Script exited with code {run_result.returncode}\n{output}"
+
+
+class AutoFixLoop:
+    """
+    Generates code, runs it and sends its errors back, until it runs cleanly.
+
+    Every iteration makes one request and, if it returned code, runs the new
+    version headlessly. The loop stops at the first clean run, at a response
+    without code (e.g. clarifying questions), after max_iterations requests or
+    once budget seconds have passed.
+    """
+
+    def __init__(self, max_iterations=AUTO_FIX_MAX_ITERATIONS, budget=AUTO_FIX_BUDGET):
+        self.max_iterations = max_iterations
+        self.budget = budget
+
+    def run(self, prompt, send_message, run_latest_version, build_fix_message):
+        """
+        Run the loop.
+
+        Args:
+            prompt (str): The first message to send.
+            send_message (callable): Called with (message, seconds_left); sends
+                the message as a turn and returns (response, tokens used).
+            run_latest_version (callable): Called with a timeout; runs the latest
+                version and returns its RunResult.
+            build_fix_message (callable): Turns the error of a failed run into
+                the next message.
+
+        Returns:
+            AutoFixResult: Each iteration, the total time and why the loop ended.
+        """
+        started = time.monotonic()
+        iterations = []
+        message = prompt
+        reason = f"No clean run after {self.max_iterations} iterations"
+
+        def seconds_left():
+            return self.budget - (time.monotonic() - started)
+
+        for number in range(1, self.max_iterations + 1):
+            if seconds_left() <= 0:
+                reason = f"Out of time after {self.budget} seconds"
+                break
+            iteration = Iteration(number)
+            iterations.append(iteration)
+
+            request_started = time.monotonic()
+            response, iteration.tokens = send_message(message, seconds_left())
+            iteration.request_seconds = time.monotonic() - request_started
+            iteration.response_type = response["type"]
+            if response["type"] != "code":
+                reason = f"The response had no code: {response.get('message')}"
+                self.log_iteration(iteration)
+                break
+
+            iteration.run_result = run_latest_version(
+                max(0.1, min(HEADLESS_RUN_TIMEOUT, seconds_left()))
+            )
+            self.log_iteration(iteration)
+            if iteration.succeeded:
+                reason = "The code ran cleanly"
+                break
+            message = build_fix_message(get_error_report(iteration.run_result))
+
+        result = AutoFixResult(iterations, time.monotonic() - started, reason)
+        logger.info(
+            f"Auto-fix loop finished after {len(iterations)} iterations, "
+            f"{result.elapsed:.1f} seconds and {result.total_tokens} tokens: {reason}"
+        )
+        return result
+
+    def log_iteration(self, iteration):
+        summary = iteration.get_summary()
+        run_seconds = summary["run_seconds"]
+        logger.info(
+            f"Auto-fix iteration {iteration.number}: "
+            f"request {summary['request_seconds']:.1f}s, "
+            f"run {'-' if run_seconds is None else f'{run_seconds:.1f}s'}, "
+            f"{iteration.tokens} tokens, "
+            f"{'succeeded' if iteration.succeeded else 'failed'}"
+        )
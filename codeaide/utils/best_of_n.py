@@ -0,0 +1,161 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from codeaide.utils.api_utils import parse_response
+from codeaide.utils.constants import BEST_OF_N_MAX_WORKERS, HEADLESS_RUN_TIMEOUT
+from codeaide.utils.headless_runner import check_syntax, run_headless
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+
+class Candidate:
+    """
+    One of the responses generated by BestOfNGenerator, and how it was checked.
+    """
+
+    def __init__(self, variant):
+        self.variant = variant
+        self.response = None
+        self.parsed = None
+        self.run_result = None
+        self.error = None
+
+    @property
+    def succeeded(self):
+        return self.run_result is not None and self.run_result.succeeded
+
+    def describe(self):
+        if self.succeeded:
+            return f"{self.variant}: ran cleanly"
+        return f"{self.variant}: {self.error or 'not finished'}"
+
+
+class BestOfNGenerator:
+    """
+    Generates several responses concurrently and picks the first one whose code
+    runs without errors.
+
+    Each variant is a dict of request options (e.g. a model or temperature). The
+    requests, syntax checks and headless runs of all variants share a pool of
+    max_workers threads, so the wait is close to that of a single request.
+    """
+
+    def __init__(
+        self,
+        environment_manager,
+        max_workers=BEST_OF_N_MAX_WORKERS,
+        timeout=HEADLESS_RUN_TIMEOUT,
+    ):
+        self.environment_manager = environment_manager
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def generate(
+        self, variants, send_variant, provider, resolve_code=None, on_abandoned=None
+    ):
+        """
+        Send a request per variant and return the first candidate that runs.
+
+        Args:
+            variants (list): The request options of each candidate.
+            send_variant (callable): Called with a variant; returns the provider
+                response, or None if the request failed.
+            provider (str): The provider the responses come from.
+            resolve_code (callable, optional): Turns the 'code' field of a
+                response into the complete code (e.g. by applying edit blocks).
+                It may raise ValueError.
+            on_abandoned (callable, optional): Called with each candidate other
+                than the winner that got a response, so its usage can be logged.
+                Requests still running when the winner is picked can't be
+                stopped, so those are reported from a worker thread once their
+                response arrives.
+
+        Returns:
+            tuple: (winner, candidates), where winner is the first Candidate that
+            ran cleanly, or else the first one with a valid response (None if no
+            request succeeded), and candidates lists every Candidate.
+
+        Raises:
+            Exception: The error raised by send_variant, if no request succeeded
+                and at least one raised an error (e.g. QuotaExceededException).
+        """
+        stop = threading.Event()
+
+        def evaluate(candidate):
+            candidate.response = send_variant(candidate.variant)
+            if candidate.response is None:
+                candidate.error = "the request failed"
+                return candidate
+            try:
+                candidate.parsed = parse_response(candidate.response, provider)
+                code = candidate.parsed[2]
+                if code and resolve_code is not None:
+                    code = resolve_code(code)
+            except ValueError as e:
+                candidate.error = f"invalid response ({e})"
+                return candidate
+            if not code:
+                candidate.error = "no code to run"
+                return candidate
+            syntax_error = check_syntax(code)
+            if syntax_error:
+                candidate.error = syntax_error
+                return candidate
+            if stop.is_set():
+                candidate.error = "not run, another candidate already succeeded"
+                return candidate
+            candidate.run_result = run_headless(
+                code,
+                candidate.parsed[5] or [],
+                self.environment_manager,
+                self.timeout,
+            )
+            if not candidate.succeeded:
+                candidate.error = (
+                    candidate.run_result.traceback
+                    or f"exited with code {candidate.run_result.returncode}"
+                )
+            return candidate
+
+        candidates = [Candidate(variant) for variant in variants]
+        winner = None
+        errors = []
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(evaluate, c): c for c in candidates}
+            pending = set(futures)
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        candidate = future.result()
+                    except Exception as e:
+                        futures[future].error = str(e)
+                        errors.append(e)
+                        continue
+                    if candidate.succeeded and winner is None:
+                        winner = candidate
+                        stop.set()
+        finally:
+            # Requests that are still running finish in the background; only
+            # their usage is reported
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for candidate in candidates:
+            logger.info(f"Best-of-N candidate {candidate.describe()}")
+        if winner is None:
+            winner = next((c for c in candidates if c.parsed is not None), None)
+
+        def report_abandoned(future):
+            candidate = futures[future]
+            if candidate is not winner and candidate.response is not None:
+                on_abandoned(candidate)
+
+        if on_abandoned is not None:
+            # Called straight away for the futures that are already done
+            for future in futures:
+                future.add_done_callback(report_abandoned)
+        if winner is None and errors:
+            raise errors[-1]
+        return winner, candidates
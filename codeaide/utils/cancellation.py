@@ -0,0 +1,79 @@
+import threading
+import time
+
+from codeaide.utils.api_utils import RequestCancelled
+from codeaide.utils.constants import TURN_DEADLINE
+
+STOPPED_REASON = "Stopped by the user"
+
+
+class TurnCancellation:
+    """
+    Tracks whether a turn has been stopped or has run past its deadline.
+
+    The deadline covers the whole turn, including every retry, and is checked
+    along with the stop request by check() and the callbacks from wrap_callback(),
+    which abandon a streamed request from within the stream.
+
+    Attributes:
+        history_length (int): The length of the conversation history before the
+            turn added to it, which it is rolled back to if cancelled, or None
+            until the turn has started.
+        committed (bool): True once the response has been added to the history,
+            after which the turn can no longer be rolled back.
+        rolled_back (bool): True once the turn has been removed from the history.
+    """
+
+    def __init__(self, deadline=TURN_DEADLINE):
+        self.history_length = None
+        self.committed = False
+        self.rolled_back = False
+        self.started = time.monotonic()
+        self.deadline = None if deadline is None else self.started + deadline
+        self.timeout = deadline
+        self.stopped = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason=STOPPED_REASON):
+        if not self.stopped.is_set():
+            self.reason = reason
+            self.stopped.set()
+
+    @property
+    def is_cancelled(self):
+        if self.stopped.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(f"No response within {self.timeout} seconds")
+            return True
+        return False
+
+    def remaining(self):
+        """
+        Seconds left before the deadline, or None if the turn has none.
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """
+        Raise RequestCancelled if the turn has been stopped or is past its deadline.
+        """
+        if self.is_cancelled:
+            raise RequestCancelled(self.reason)
+
+    def wrap_callback(self, stream_callback=None):
+        """
+        Wrap a stream callback so the stream is abandoned once the turn is cancelled.
+
+        Without a callback to wrap, the returned one only checks for cancellation,
+        so requests are streamed and can still be abandoned part way through.
+        """
+
+        def callback(text):
+            self.check()
+            if stream_callback is not None:
+                stream_callback(text)
+
+        return callback
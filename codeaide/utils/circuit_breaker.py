@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+
+from codeaide.utils.constants import (
+    AI_PROVIDERS,
+    CIRCUIT_BREAKER_BASE_COOLDOWN,
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    CIRCUIT_BREAKER_MAX_COOLDOWN,
+    CIRCUIT_BREAKER_PROBE_TIMEOUT,
+)
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Cooldowns are stretched by a random factor up to this much, so instances that
+# tripped together don't all probe the provider at the same moment
+COOLDOWN_JITTER = 0.25
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one provider.
+
+    The breaker is closed while requests succeed. After failure_threshold failures
+    in a row it opens, and no requests are allowed until the cooldown has passed.
+    It's then half-open: a single probe request is allowed, which closes the
+    breaker if it succeeds and opens it again, with twice the cooldown, if it
+    fails. A probe that ends without either (e.g. the turn was stopped) should be
+    released; one that is never released is given up on after probe_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        base_cooldown=CIRCUIT_BREAKER_BASE_COOLDOWN,
+        max_cooldown=CIRCUIT_BREAKER_MAX_COOLDOWN,
+        probe_timeout=CIRCUIT_BREAKER_PROBE_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.open_until = 0.0
+        self.probe_started = 0.0
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        Check if a request can be sent, claiming the probe if one is due.
+
+        Returns:
+            bool: True if the request can be sent.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if (
+                self.state == HALF_OPEN
+                and now >= self.probe_started + self.probe_timeout
+            ):
+                logger.warning("Giving up on a circuit breaker probe with no result")
+                self.state = OPEN
+            if self.state == OPEN and now >= self.open_until:
+                self.state = HALF_OPEN
+                self.probe_started = now
+                return True
+            return self.state == CLOSED
+
+    def release_probe(self):
+        """
+        Give back a probe that ended without a result, so another can be sent.
+        """
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self.open_until = time.monotonic()
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.times_opened = 0
+
+    def record_failure(self):
+        """
+        Record a failed request, opening the breaker if there have been too many.
+
+        Returns:
+            bool: True if the breaker is open.
+        """
+        with self.lock:
+            self.consecutive_failures += 1
+            if (
+                self.state == HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                self.times_opened += 1
+                cooldown = min(
+                    self.max_cooldown,
+                    self.base_cooldown * 2 ** (self.times_opened - 1),
+                ) * random.uniform(1, 1 + COOLDOWN_JITTER)
+                self.state = OPEN
+                self.open_until = time.monotonic() + cooldown
+            return self.state == OPEN
+
+
+class CircuitBreakerRegistry:
+    """
+    Holds a CircuitBreaker per provider and picks where to send requests.
+    """
+
+    def __init__(self, **breaker_options):
+        self.breaker_options = breaker_options
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get_breaker(self, provider):
+        with self.lock:
+            provider = provider.lower()
+            if provider not in self.breakers:
+                self.breakers[provider] = CircuitBreaker(**self.breaker_options)
+            return self.breakers[provider]
+
+    def record_success(self, provider):
+        self.get_breaker(provider).record_success()
+
+    def release_probe(self, provider):
+        self.get_breaker(provider).release_probe()
+
+    def record_failure(self, provider):
+        if self.get_breaker(provider).record_failure():
+            logger.warning(f"Circuit breaker for {provider} is open")
+
+    def choose_model(self, provider, model, is_usable):
+        """
+        Pick the model for a request, following the failover chain.
+
+        The given model is used if its provider's breaker allows the request;
+        otherwise the default model of the next provider in its failover_to chain
+        that is usable and allows the request.
+
+        Args:
+            provider (str): The selected provider.
+            model (str): The selected model.
+            is_usable (callable): Called with (provider, model); returns False if
+                the model can't be used, e.g. because there is no API key for it.
+
+        Returns:
+            tuple: The (provider, model) to use, or None if every provider in the
+                chain is unavailable.
+        """
+        for candidate in [(provider, model)] + get_failover_chain(provider):
+            if is_usable(*candidate) and self.get_breaker(candidate[0]).allow_request():
+                return candidate
+        return None
+
+
+def get_failover_chain(provider):
+    """
+    Get the default models of the providers to fail over to, in order.
+
+    Args:
+        provider (str): The provider the chain starts from (not included).
+
+    Returns:
+        list: (provider, model) tuples.
+    """
+    chain = []
+    seen = {provider}
+    next_provider = AI_PROVIDERS.get(provider, {}).get("failover_to")
+    while next_provider in AI_PROVIDERS and next_provider not in seen:
+        seen.add(next_provider)
+        default_model = next(iter(AI_PROVIDERS[next_provider]["models"]))
+        chain.append((next_provider, default_model))
+        next_provider = AI_PROVIDERS[next_provider].get("failover_to")
+    return chain
+
+
+# Shared by every ChatHandler in the process, like the request scheduler
+circuit_breakers = CircuitBreakerRegistry()
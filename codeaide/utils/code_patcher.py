@@ -0,0 +1,117 @@
+import ast
+import re
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+EDIT_BLOCK_PATTERN = re.compile(
+    r"^<<<<<<< SEARCH[ \t]*\n(.*?)^=======[ \t]*\n(.*?)^>>>>>>> REPLACE[ \t]*$",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+class PatchError(Exception):
+    pass
+
+
+class CodeEditError(ValueError):
+    """
+    Raised for edit blocks that can't be applied, to ask the model to resend them.
+    """
+
+
+def is_patch(code):
+    """
+    Check if a 'code' field contains search/replace edit blocks instead of code.
+    """
+    return bool(code) and SEARCH_MARKER in code and REPLACE_MARKER in code
+
+
+def parse_edit_blocks(patch):
+    """
+    Parse search/replace edit blocks.
+
+    Args:
+        patch (str): One or more blocks of the form
+            <<<<<<< SEARCH / lines to find / ======= / replacement / >>>>>>> REPLACE
+
+    Returns:
+        list: (search, replace) tuples, in order.
+
+    Raises:
+        PatchError: If the blocks are malformed.
+    """
+    patch = patch.replace("\r\n", "\n")
+    if not patch.endswith("\n"):
+        patch += "\n"
+    blocks = [
+        (search, replace) for search, replace in EDIT_BLOCK_PATTERN.findall(patch)
+    ]
+    if not blocks or len(blocks) != patch.count(SEARCH_MARKER):
+        raise PatchError("The edit blocks are malformed")
+    return blocks
+
+
+def find_block(code, search):
+    """
+    Find where a search block occurs in the code.
+
+    An exact match is tried first, then a match that ignores trailing whitespace
+    on each line.
+
+    Returns:
+        tuple: The (start, end) offsets of the unique match.
+
+    Raises:
+        PatchError: If the block isn't found or matches more than once.
+    """
+    if search == "":
+        raise PatchError("A SEARCH section is empty")
+
+    count = code.count(search)
+    if count == 1:
+        start = code.index(search)
+        return start, start + len(search)
+    if count > 1:
+        raise PatchError(f"A SEARCH section matches {count} places:\n{search}")
+
+    # Compare line by line, ignoring trailing whitespace
+    lines = code.splitlines(keepends=True)
+    search_lines = [line.rstrip() for line in search.splitlines()]
+    matches = []
+    for i in range(len(lines) - len(search_lines) + 1):
+        window = lines[i : i + len(search_lines)]
+        if [line.rstrip() for line in window] == search_lines:
+            start = sum(len(line) for line in lines[:i])
+            matches.append((start, start + sum(len(line) for line in window)))
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        raise PatchError(f"A SEARCH section matches {len(matches)} places:\n{search}")
+    raise PatchError(f"A SEARCH section doesn't match the code:\n{search}")
+
+
+def apply_patch(code, patch):
+    """
+    Apply search/replace edit blocks to the code and check the result parses.
+
+    Args:
+        code (str): The latest version of the code.
+        patch (str): The edit blocks returned by the model.
+
+    Returns:
+        str: The edited code.
+
+    Raises:
+        PatchError: If the blocks don't apply or the result isn't valid Python.
+    """
+    for search, replace in parse_edit_blocks(patch):
+        start, end = find_block(code, search)
+        code = code[:start] + replace + code[end:]
+
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        raise PatchError(f"The edited code is not valid Python: {e}")
+    return code
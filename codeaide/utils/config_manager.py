@@ -15,6 +15,8 @@ class ConfigManager:
             self.config_dir = Path(__file__).parent.parent.parent
             self.env_file = self.config_dir / ".env"
             self._ensure_env_file()
+            self._env_config = None
+            self._env_mtime = None
 
     def _get_app_config_dir(self):
         system = platform.system()
@@ -29,6 +31,14 @@ class ConfigManager:
         if not self.env_file.exists():
             self.env_file.touch()
 
+    def _get_env_config(self):
+        # Only re-read the .env file when it has changed
+        mtime = self.env_file.stat().st_mtime_ns
+        if self._env_config is None or mtime != self._env_mtime:
+            self._env_config = Config(RepositoryEnv(self.env_file))
+            self._env_mtime = mtime
+        return self._env_config
+
     def get_api_key(self, provider):
         if self.is_packaged_app:
             import keyring
@@ -38,7 +48,7 @@ class ConfigManager:
             )
         else:
             try:
-                config = Config(RepositoryEnv(self.env_file))
+                config = self._get_env_config()
                 return config(f"{provider.upper()}_API_KEY")
             except UndefinedValueError:
                 return None
@@ -1,30 +1,82 @@
 # API Configuration
 # This dictionary defines the supported API providers and the supported models for each.
 # The max_tokens argument is the max output tokens, which is generally specified in the API documentation
+# The context_budget argument is the max estimated input tokens sent per request (see ENABLE_CONTEXT_BUDGET)
+# The requests_per_minute argument is the rate limit the request scheduler keeps to (the free tier for Google)
+# The tier argument is the model's capability tier (see MODEL_TIERS)
+# The failover_to argument is the provider to switch to when this one keeps failing (see ENABLE_FAILOVER)
 # The default model for each provider will be the first model in the list
 AI_PROVIDERS = {
     "google": {
         "api_key_name": "GOOGLE_API_KEY",
+        "failover_to": "anthropic",
         "models": {
-            "gemini-1.5-pro": {"max_tokens": 8192},
-            "gemini-1.5-flash": {"max_tokens": 8192},
+            "gemini-1.5-pro": {
+                "max_tokens": 8192,
+                "context_budget": 64000,
+                "requests_per_minute": 2,
+                "tier": "strong",
+            },
+            "gemini-1.5-flash": {
+                "max_tokens": 8192,
+                "context_budget": 64000,
+                "requests_per_minute": 15,
+                "tier": "fast",
+            },
         },
     },
     "anthropic": {
         "api_key_name": "ANTHROPIC_API_KEY",
+        "failover_to": "openai",
         "models": {
-            "claude-3-5-sonnet-20240620": {"max_tokens": 8192},
-            "claude-3-haiku-20240307": {"max_tokens": 4096},
-            "claude-3-opus-20240229": {"max_tokens": 4096},
+            "claude-3-5-sonnet-20240620": {
+                "max_tokens": 8192,
+                "context_budget": 32000,
+                "requests_per_minute": 50,
+                "tier": "strong",
+            },
+            "claude-3-haiku-20240307": {
+                "max_tokens": 4096,
+                "context_budget": 32000,
+                "requests_per_minute": 50,
+                "tier": "fast",
+            },
+            "claude-3-opus-20240229": {
+                "max_tokens": 4096,
+                "context_budget": 32000,
+                "requests_per_minute": 50,
+                "tier": "strong",
+            },
         },
     },
     "openai": {
         "api_key_name": "OPENAI_API_KEY",
+        "failover_to": "google",
         "models": {
-            "gpt-3.5-turbo": {"max_tokens": 4096},
-            "gpt-4-turbo": {"max_tokens": 4096},
-            "chatgpt-4o-latest": {"max_tokens": 16384},
-            "gpt-4o-mini": {"max_tokens": 16384},
+            "gpt-3.5-turbo": {
+                "max_tokens": 4096,
+                "context_budget": 12000,
+                "requests_per_minute": 500,
+                "tier": "standard",
+            },
+            "gpt-4-turbo": {
+                "max_tokens": 4096,
+                "context_budget": 32000,
+                "requests_per_minute": 500,
+                "tier": "strong",
+            },
+            "chatgpt-4o-latest": {
+                "max_tokens": 16384,
+                "context_budget": 32000,
+                "requests_per_minute": 200,
+                "tier": "strong",
+            },
+            "gpt-4o-mini": {
+                "max_tokens": 16384,
+                "context_budget": 32000,
+                "requests_per_minute": 500,
+                "tier": "fast",
+            },
         },
     },
 }
@@ -32,9 +84,171 @@ AI_PROVIDERS = {
 # This sets the default provider when the application launches
 DEFAULT_PROVIDER = "google"
 
+# Capability tiers of the models, from least to most capable
+MODEL_TIERS = ["fast", "standard", "strong"]
+
+# The "auto" provider sends each turn to the model with the lowest average time to
+# first token (or total latency, if streaming is off) among the models of at least
+# AUTO_MIN_TIER. Averages are exponentially weighted (LATENCY_EWMA_ALPHA is the
+# weight of each new measurement) and saved between launches. Models that haven't
+# been measured yet are only used if no measured model is available, unless
+# ENABLE_LATENCY_PROBES sends a small request to each model every
+# LATENCY_PROBE_INTERVAL seconds while "auto" is selected.
+AUTO_PROVIDER = "auto"
+AUTO_MODEL = "fastest"
+AUTO_MIN_TIER = "strong"
+LATENCY_EWMA_ALPHA = 0.3
+ENABLE_LATENCY_PROBES = False
+LATENCY_PROBE_INTERVAL = 600  # seconds
+
+# Short follow-up turns that edit existing code (and aren't fixing a traceback) are
+# sent to the fast tier model of the current provider, such as claude-3-haiku or
+# gemini-1.5-flash. If that attempt fails, the turn is retried with the selected
+# model. A turn counts as short if it has at most SIMPLE_TURN_MAX_CHARS characters.
+ENABLE_MODEL_TIERING = True
+SIMPLE_TURN_MAX_CHARS = 200
+
+# Generated code can be run headlessly (without a terminal window, using
+# non-interactive plotting/GUI backends) in the session's environment. A run that
+# is still going after HEADLESS_RUN_TIMEOUT seconds is stopped, and counts as a
+# success if it hasn't raised an error by then.
+HEADLESS_RUN_TIMEOUT = 10  # seconds
+
+# The auto-fix loop (python -m codeaide autofix "<prompt>") runs each new version
+# headlessly and sends its traceback back to the model, until a version runs
+# cleanly, it has made AUTO_FIX_MAX_ITERATIONS requests, or AUTO_FIX_BUDGET
+# seconds have passed
+AUTO_FIX_MAX_ITERATIONS = 5
+AUTO_FIX_BUDGET = 600  # seconds
+
+# Best-of-N mode sends each turn once per variant at the same time, with the
+# options in the variant: a temperature and/or another model of the current
+# provider. The code of each response is checked and run headlessly, and the first
+# one that runs without errors is used. At most BEST_OF_N_MAX_WORKERS requests and
+# runs happen at once.
+ENABLE_BEST_OF_N = False
+BEST_OF_N_VARIANTS = [
+    {"temperature": 0.2},
+    {"temperature": 0.7},
+    {"temperature": 1.0},
+]
+BEST_OF_N_MAX_WORKERS = 3
+
+# Comparing models sends the prompt to every model with an API key at once, at
+# most COMPARISON_MAX_WORKERS at a time (including running their code)
+COMPARISON_MAX_WORKERS = 4
+
 # Other existing constants remain unchanged
 MAX_RETRIES = 3
 
+# Requests are scheduled per (provider, model) to stay within requests_per_minute.
+# Rate limit (429) errors halve the number of concurrent requests and delay the
+# next ones by the provider's retry-after time; requests are queued and sent again
+# automatically, and only fail if they've waited longer than RATE_LIMIT_MAX_WAIT.
+MAX_CONCURRENT_REQUESTS = 4
+RATE_LIMIT_MAX_WAIT = 120  # seconds
+
+# Each provider has a circuit breaker that opens after this many failed requests in
+# a row (errors or timeouts). While it's open, turns are sent to the next provider
+# in the failover_to chain that has an API key. After a cooldown, which doubles
+# each time the breaker opens again, one request is sent to the selected provider
+# to check whether it has recovered. A probe that hasn't succeeded or failed after
+# CIRCUIT_BREAKER_PROBE_TIMEOUT seconds (e.g. its turn was stopped) is given up on,
+# and another one is allowed.
+ENABLE_FAILOVER = True
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 2
+CIRCUIT_BREAKER_BASE_COOLDOWN = 30  # seconds
+CIRCUIT_BREAKER_MAX_COOLDOWN = 600  # seconds
+CIRCUIT_BREAKER_PROBE_TIMEOUT = 300  # seconds
+
+# Hedged requests: if the first streamed token hasn't arrived after
+# HEDGE_LATENCY_PERCENTILE of the model's recent times to first token, the same
+# request is also sent to the next provider in the failover_to chain. The first
+# response wins and the other request is cancelled. Until there are
+# HEDGE_MIN_SAMPLES measurements, HEDGE_DEFAULT_DELAY is used instead. Each session
+# sends at most MAX_HEDGES_PER_SESSION hedged requests, since they cost extra tokens.
+ENABLE_HEDGING = False
+HEDGE_LATENCY_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 5
+HEDGE_DEFAULT_DELAY = 15  # seconds
+MAX_HEDGES_PER_SESSION = 10
+
+# A turn is stopped, as if with the Stop button, if it hasn't got a response within
+# this many seconds, counting every retry. None for no deadline.
+TURN_DEADLINE = 300  # seconds
+
+# When a response is cut off at max_tokens, request up to this many continuations
+# and join them instead of retrying from scratch
+MAX_CONTINUATIONS = 3
+
+# Stream responses token by token so the 'text' and 'code' fields are shown as they arrive
+ENABLE_STREAMING = True
+
+# Opt-in: request a fix for a traceback as soon as it's captured, while the dialog
+# asking whether to request one is still open. Requesting the fix adopts the
+# response, even part way through; ignoring the traceback discards it.
+ENABLE_TRACEBACK_PREFETCH = False
+
+# Opt-in on-disk cache of responses, keyed by the full request (provider, model,
+# max_tokens, system prompt and conversation history). Repeated identical requests,
+# such as re-running an example, are answered from the cache.
+ENABLE_RESPONSE_CACHE = False
+RESPONSE_CACHE_MAX_MB = 100
+
+# Only send the latest version of the code in full; older versions in the history
+# are replaced with a short stub (the saved chat history is not changed)
+ELIDE_SUPERSEDED_CODE = True
+
+# Keep each request within the model's context_budget by replacing the oldest turns
+# with a summary. The rolling summary is written by the current model in the
+# background after a turn; if USE_MODEL_FOR_SUMMARIES is False (or the summary isn't
+# ready yet) a local extractive summary is used instead.
+ENABLE_CONTEXT_BUDGET = True
+USE_MODEL_FOR_SUMMARIES = True
+SUMMARY_MAX_TOKENS = 1024
+
+# Let the providers cache the system prompt and the stable start of the history.
+# Anthropic caches up to explicit cache_control breakpoints, OpenAI caches prompt
+# prefixes automatically (the system prompt is always sent first), and Gemini uses a
+# CachedContent resource. Gemini only caches prefixes of at least
+# GOOGLE_MIN_CACHE_TOKENS, so the Gemini models have a context_budget above that.
+ENABLE_PROMPT_CACHING = True
+GOOGLE_MIN_CACHE_TOKENS = 32768
+GOOGLE_CACHE_TTL_MINUTES = 30
+
+# Constrain responses to the JSON schema described in SYSTEM_PROMPT (OpenAI
+# response_format, an Anthropic tool call, Gemini response_schema), so the
+# provider can't return malformed JSON that would need a retry
+ENABLE_STRUCTURED_OUTPUT = True
+
+# Let the model return search/replace edit blocks against the latest version instead
+# of the complete code, so the response size scales with the size of the change.
+# The edits are applied locally; if they don't apply the model is asked for the
+# complete code instead.
+ENABLE_EDIT_MODE = False
+
+# Every new version is parsed and checked for undefined names and unused imports
+# (from its symbol tables, in a worker process) before it is shown. With
+# SEND_CODE_PROBLEMS_TO_MODEL, code that can't run is sent back to the model with
+# its problems while retries remain; otherwise the problems are flagged in the
+# code window.
+VALIDATE_GENERATED_CODE = True
+SEND_CODE_PROBLEMS_TO_MODEL = True
+CODE_VALIDATION_TIMEOUT = 5  # seconds
+
+# In "assume defaults" mode (toggled per session in the chat window), each request
+# asks the model to settle its own questions with sensible defaults and send code
+# in the same response. If it asks questions anyway, they are answered with
+# ASSUME_DEFAULTS_REPLY without waiting for the user, once per turn.
+ASSUME_DEFAULTS = False
+ASSUME_DEFAULTS_PROMPT = "\n\nDon't ask clarifying questions: choose sensible defaults for anything unspecified, mention them briefly in 'text', and return the code in this response."
+ASSUME_DEFAULTS_REPLY = "Use your best defaults for anything you were going to ask about, and send the code."
+
+# Appended to the error prompt sent to the model after a failed attempt
+JSON_ERROR_ADVICE = "Please ensure you're using proper JSON formatting to avoid this error and others like it."
+CODE_PROBLEMS_ADVICE = "Please fix these problems, making sure every name is defined or imported before it is used."
+EDIT_BLOCKS_ADVICE = "Please copy each SEARCH section exactly from the latest version of the code, including its indentation and enough lines to match only one place, or send the complete code instead of edit blocks."
+
 # UI Configuration
 CHAT_WINDOW_WIDTH = 800
 CHAT_WINDOW_HEIGHT = 600
@@ -125,3 +339,14 @@ Format your responses as a JSON object with six keys:
 * 'requirements': an array of strings listing any required Python packages or modules that are necessary to run the code. This should be null if no additional requirements are needed beyond the standard Python libraries.
 Do not include any text outside of the JSON object.
 """
+
+# Appended to the user's message in edit mode
+EDIT_MODE_PROMPT = """
+
+If you're only changing part of version {version}, you can put search/replace edit blocks in the 'code' field instead of the complete code. Each block has this form:
+<<<<<<< SEARCH
+lines copied exactly from version {version}, including indentation
+=======
+the lines that replace them
+>>>>>>> REPLACE
+Each SEARCH section must match exactly one place in the code, so include enough lines to make it unique. Use as many blocks as needed, and send the complete code instead if you're changing most of it."""
@@ -0,0 +1,336 @@
+import functools
+import json
+import threading
+
+import hjson
+
+from codeaide.utils.api_utils import strip_json_fences
+from codeaide.utils.json_repair import repair_json
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+# Rough number of characters per token, used for estimates when the provider's
+# tokenizer isn't available
+CHARS_PER_TOKEN = 4
+
+SUPERSEDED_CODE_STUB = (
+    "[Code for version {version} omitted because it has been superseded by a later "
+    "version. Version description: {description}]"
+)
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a string.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_history_tokens(conversation_history):
+    return sum(estimate_tokens(message["content"]) for message in conversation_history)
+
+
+@functools.lru_cache(maxsize=1024)
+def get_message_code_version(content):
+    """
+    Get the code version contained in an assistant message, if any.
+
+    Args:
+        content (str): The raw content of an assistant message.
+
+    Returns:
+        str: The message's code_version, or None if it has no code.
+    """
+    parsed = parse_assistant_message(content)
+    if parsed is None or not parsed.get("code"):
+        return None
+    return str(parsed.get("code_version"))
+
+
+def parse_assistant_message(content):
+    try:
+        parsed = hjson.loads(strip_json_fences(content))
+    except hjson.HjsonDecodeError:
+        parsed = None
+    return parsed if isinstance(parsed, dict) else repair_json(content)
+
+
+@functools.lru_cache(maxsize=1024)
+def elide_message_code(content, description):
+    """
+    Replace the code in an assistant message with a short stub.
+
+    Args:
+        content (str): The raw content of an assistant message.
+        description (str): The version description to include in the stub.
+
+    Returns:
+        str: The message content with its code replaced.
+    """
+    parsed = dict(parse_assistant_message(content))
+    version = parsed.get("code_version")
+    parsed["code"] = SUPERSEDED_CODE_STUB.format(
+        version=version,
+        description=description or parsed.get("version_description"),
+    )
+    return json.dumps(parsed, ensure_ascii=False)
+
+
+def elide_superseded_code(conversation_history, versions_dict=None):
+    """
+    Build a copy of the history where only the latest code version is sent in full.
+
+    Every assistant message that contains an older version of the code has its
+    'code' field replaced with a stub that refers to the version number and
+    description, so the request doesn't carry a full copy of the script for every
+    version in the session. The history passed in is not modified.
+
+    Args:
+        conversation_history (list): The full conversation history.
+        versions_dict (dict, optional): FileHandler.versions_dict, used to look up
+            version descriptions.
+
+    Returns:
+        list: The history to send.
+    """
+    versions_dict = versions_dict or {}
+    code_message_indices = [
+        i
+        for i, message in enumerate(conversation_history)
+        if message["role"] == "assistant"
+        and get_message_code_version(message["content"]) is not None
+    ]
+    if len(code_message_indices) < 2:
+        return list(conversation_history)
+
+    request_history = list(conversation_history)
+    for i in code_message_indices[:-1]:
+        content = conversation_history[i]["content"]
+        version = get_message_code_version(content)
+        description = versions_dict.get(version, {}).get("version_description")
+        request_history[i] = {
+            "role": "assistant",
+            "content": elide_message_code(content, description),
+        }
+    return request_history
+
+
+SUMMARY_HEADER = (
+    "Summary of the earlier conversation (older messages were removed to keep the "
+    "request short):\n{summary}\n\n---\n\n"
+)
+
+SUMMARY_REQUEST = (
+    "Summarize the conversation so far for your own future reference. Include the "
+    "user's goals and requirements, decisions that were made, the code versions that "
+    "were produced and what changed in each, and any open problems. Be concise and "
+    "don't include any code. Put the summary in the 'text' field and leave every "
+    "other field empty.{previous_summary}"
+)
+
+# Appended to user messages by ChatHandler.add_user_input_to_history
+VERSION_INFO_MARKER = "\n\nThe latest code version was"
+
+SUMMARY_LINE_LENGTH = 200
+SUMMARY_GAP = "- ..."
+
+
+def summarize_locally(messages):
+    """
+    Build a short extractive summary of a list of messages without calling a model.
+
+    Args:
+        messages (list): The messages to summarize.
+
+    Returns:
+        str: One line per message with the gist of what was said.
+    """
+    lines = []
+    for message in messages:
+        content = message["content"]
+        if message["role"] == "user":
+            request = content.split(VERSION_INFO_MARKER)[0].strip()
+            lines.append(f"- User: {shorten(request)}")
+            continue
+        parsed = parse_assistant_message(content)
+        if parsed is None:
+            lines.append(f"- Assistant: {shorten(content)}")
+            continue
+        line = f"- Assistant: {shorten(parsed.get('text') or '')}"
+        if parsed.get("code"):
+            line += (
+                f" (code version {parsed.get('code_version')}: "
+                f"{parsed.get('version_description')})"
+            )
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def shorten(text):
+    text = " ".join(text.split())
+    if len(text) <= SUMMARY_LINE_LENGTH:
+        return text
+    return text[: SUMMARY_LINE_LENGTH - 3] + "..."
+
+
+class ContextWindowManager:
+    """
+    Keeps requests within a token budget for long sessions.
+
+    When the history no longer fits the budget, the oldest turns are dropped and
+    replaced with a summary that is prepended to the first message that is kept.
+    A rolling summary written by the model is refreshed in the background after a
+    turn completes, so it never adds latency to a request; until it is ready (or
+    for messages it doesn't cover yet) a local extractive summary is used instead.
+    """
+
+    def __init__(self, summary_share=0.15):
+        self.summary_share = summary_share
+        self.summary = None
+        self.summarized_count = 0
+        self.summary_thread = None
+        self.lock = threading.Lock()
+
+    def find_boundary(self, conversation_history, budget):
+        """
+        Find the index of the first message to keep so the rest fits the budget.
+
+        The boundary is always at a user message, so roles still alternate, and
+        never after the latest message that contains code.
+        """
+        tail_budget = budget * (1 - self.summary_share)
+        tokens = 0
+        boundary = None
+        for i in range(len(conversation_history) - 1, -1, -1):
+            tokens += estimate_tokens(conversation_history[i]["content"])
+            if tokens > tail_budget and boundary is not None:
+                break
+            if conversation_history[i]["role"] == "user":
+                boundary = i
+        if boundary is None:
+            return 0
+
+        for i in range(len(conversation_history) - 1, -1, -1):
+            message = conversation_history[i]
+            if message["role"] == "assistant" and get_message_code_version(
+                message["content"]
+            ):
+                latest_code_turn = max(i - 1, 0)
+                if boundary > latest_code_turn:
+                    boundary = latest_code_turn
+                break
+
+        while boundary > 0 and conversation_history[boundary]["role"] != "user":
+            boundary -= 1
+        return boundary
+
+    def fit_to_budget(self, conversation_history, budget):
+        """
+        Return the messages to send so the request stays within the budget.
+
+        Args:
+            conversation_history (list): The history that would otherwise be sent.
+            budget (int): The maximum number of estimated input tokens.
+
+        Returns:
+            list: The history itself if it fits, otherwise the most recent turns
+            with a summary of the earlier ones.
+        """
+        total_tokens = estimate_history_tokens(conversation_history)
+        if total_tokens <= budget:
+            return conversation_history
+
+        boundary = self.find_boundary(conversation_history, budget)
+        if boundary == 0:
+            return conversation_history
+
+        with self.lock:
+            summary, summarized_count = self.summary, self.summarized_count
+        if summary and summarized_count <= boundary:
+            missing = summarize_locally(conversation_history[summarized_count:boundary])
+            summary = f"{summary}\n{missing}" if missing else summary
+        else:
+            summary = summarize_locally(conversation_history[:boundary])
+        summary = self.trim_summary(summary, budget)
+
+        first_kept = conversation_history[boundary]
+        request_history = [
+            {
+                "role": first_kept["role"],
+                "content": SUMMARY_HEADER.format(summary=summary)
+                + first_kept["content"],
+            }
+        ] + conversation_history[boundary + 1 :]
+        logger.info(
+            f"Fitted request to a budget of {budget} tokens: dropped {boundary} "
+            f"messages, ~{total_tokens} -> "
+            f"~{estimate_history_tokens(request_history)} estimated input tokens"
+        )
+        return request_history
+
+    def trim_summary(self, summary, budget):
+        """
+        Keep the summary within its share of the budget.
+
+        The first line (usually the original request) and as many of the most recent
+        lines as fit are kept; the lines in between are dropped.
+        """
+        max_chars = int(budget * self.summary_share * CHARS_PER_TOKEN)
+        if len(summary) <= max_chars:
+            return summary
+        lines = summary.split("\n")
+        kept = []
+        remaining = max_chars - len(lines[0]) - len(SUMMARY_GAP)
+        for line in reversed(lines[1:]):
+            remaining -= len(line) + 1
+            if remaining < 0:
+                break
+            kept.insert(0, line)
+        return "\n".join([shorten(lines[0]), SUMMARY_GAP] + kept)
+
+    def refresh_summary_async(self, conversation_history, budget, summarize):
+        """
+        Update the rolling summary in the background if the history is over budget.
+
+        Args:
+            conversation_history (list): The history that will be sent next.
+            budget (int): The maximum number of estimated input tokens.
+            summarize (callable): Called with (messages, previous_summary) and
+                returns the new summary text, or None if it failed.
+
+        Returns:
+            None
+        """
+        if estimate_history_tokens(conversation_history) <= budget:
+            return
+        if self.summary_thread is not None and self.summary_thread.is_alive():
+            return
+
+        boundary = self.find_boundary(conversation_history, budget)
+        with self.lock:
+            if boundary <= self.summarized_count:
+                return
+            previous_summary, summarized_count = self.summary, self.summarized_count
+
+        if previous_summary:
+            messages = conversation_history[summarized_count:boundary]
+        else:
+            messages = conversation_history[:boundary]
+
+        def run():
+            summary = summarize(messages, previous_summary)
+            if summary:
+                with self.lock:
+                    self.summary = summary
+                    self.summarized_count = boundary
+                logger.info(f"Updated rolling summary to cover {boundary} messages")
+
+        self.summary_thread = threading.Thread(target=run, daemon=True)
+        self.summary_thread.start()
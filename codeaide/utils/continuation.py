@@ -0,0 +1,187 @@
+from types import SimpleNamespace
+
+from codeaide.utils.api_utils import (
+    build_response,
+    get_finish_reason,
+    get_response_text,
+    get_token_usage,
+    send_api_request,
+)
+from codeaide.utils.constants import MAX_CONTINUATIONS
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+# The finish reason each provider reports when a response hits max_tokens
+TRUNCATION_REASONS = {
+    "anthropic": "max_tokens",
+    "openai": "length",
+    "google": "MAX_TOKENS",
+}
+
+CONTINUATION_PROMPT = (
+    "Your last response was cut off because it reached the maximum length. "
+    "Continue it exactly where it stopped, starting with the next character. Don't "
+    "repeat anything you already wrote and don't add any other text."
+)
+
+# How far back to look for text that a continuation repeats
+MAX_OVERLAP = 200
+
+
+def is_truncated(response, provider):
+    """
+    Check if a response was cut off because it reached max_tokens.
+
+    Args:
+        response: The response object returned by send_api_request.
+        provider (str): The provider that produced the response.
+
+    Returns:
+        bool: True if the response is incomplete.
+    """
+    return get_finish_reason(response, provider) == TRUNCATION_REASONS.get(
+        provider.lower()
+    )
+
+
+def complete_truncated_response(
+    api_client,
+    conversation_history,
+    response,
+    max_tokens,
+    model,
+    provider,
+    stream_callback=None,
+):
+    """
+    Request continuations of a truncated response and join the pieces.
+
+    Anthropic continues from the partial response given as the start of its own
+    reply, so the pieces join exactly. OpenAI and Gemini are sent the partial
+    response followed by a request to continue it, and any text the continuation
+    repeats is removed. Continuations are plain text requests, since each one is
+    only part of the response object.
+
+    Args:
+        api_client: The provider client returned by get_api_client.
+        conversation_history (list): The messages that produced the response.
+        response: The response returned by send_api_request.
+        max_tokens (int): The maximum number of output tokens per request.
+        model (str): The model name.
+        provider (str): The provider name.
+        stream_callback (callable, optional): Called with the text of the
+            continuations, so streamed output carries on where it stopped.
+
+    Returns:
+        The response itself if it wasn't truncated, otherwise a response with the
+        joined text (which may still be truncated after MAX_CONTINUATIONS), or None
+        if the truncated response can't be continued.
+    """
+    if response is None or not is_truncated(response, provider):
+        return response
+
+    first_block = response.content[0] if provider.lower() == "anthropic" else None
+    if getattr(first_block, "type", None) == "tool_use":
+        # Only a streamed tool call keeps its partial JSON (see stream_api_request)
+        logger.warning("Can't continue a truncated tool call that wasn't streamed")
+        return None
+
+    text = get_response_text(response, provider)
+    usage = get_token_usage(response, provider)
+    finish_reason = get_finish_reason(response, provider)
+    for continuation in range(1, MAX_CONTINUATIONS + 1):
+        logger.info(
+            f"Response from {provider} was truncated at {len(text)} characters; "
+            f"requesting continuation {continuation} of {MAX_CONTINUATIONS}"
+        )
+        if provider.lower() == "anthropic":
+            # The reply can't end with whitespace; the model writes it again
+            text = text.rstrip()
+            request_history = conversation_history + [
+                {"role": "assistant", "content": text}
+            ]
+            piece = send_api_request(
+                api_client,
+                request_history,
+                max_tokens,
+                model,
+                provider,
+                stream_callback=stream_callback,
+                structured_output=False,
+            )
+        else:
+            request_history = conversation_history + [
+                {"role": "assistant", "content": text},
+                {"role": "user", "content": CONTINUATION_PROMPT},
+            ]
+            piece = send_api_request(
+                api_client,
+                request_history,
+                max_tokens,
+                model,
+                provider,
+                structured_output=False,
+            )
+        if piece is None:
+            logger.warning("Continuation request failed")
+            break
+
+        piece_text = get_response_text(piece, provider)
+        if provider.lower() != "anthropic":
+            piece_text = remove_overlap(text, piece_text)
+            if stream_callback is not None and piece_text:
+                stream_callback(piece_text)
+        text += piece_text
+        for key, count in get_token_usage(piece, provider).items():
+            usage[key] += count
+        finish_reason = get_finish_reason(piece, provider)
+        if not is_truncated(piece, provider):
+            break
+
+    return build_response(provider, text, finish_reason, build_usage(provider, usage))
+
+
+def remove_overlap(text, continuation):
+    """
+    Remove the start of a continuation that repeats the end of the text.
+    """
+    continuation = continuation.lstrip("\n")
+    if continuation.startswith("```"):
+        # Drop a code fence the continuation was wrapped in
+        continuation = continuation.split("\n", 1)[-1]
+        if continuation.rstrip().endswith("```"):
+            continuation = continuation.rstrip()[:-3].rstrip("\n")
+    tail = text[-MAX_OVERLAP:]
+    for length in range(min(len(tail), len(continuation)), 0, -1):
+        if tail.endswith(continuation[:length]):
+            # Only treat it as repeated text if it's more than a few characters
+            return continuation[length:] if length >= 10 else continuation
+    return continuation
+
+
+def build_usage(provider, usage):
+    """
+    Build a usage object in the provider's own format from get_token_usage counts.
+    """
+    if provider.lower() == "anthropic":
+        return SimpleNamespace(
+            input_tokens=usage["input_tokens"],
+            output_tokens=usage["output_tokens"],
+            cache_read_input_tokens=usage["cache_read_tokens"],
+            cache_creation_input_tokens=usage["cache_write_tokens"],
+        )
+    elif provider.lower() == "openai":
+        return SimpleNamespace(
+            prompt_tokens=usage["input_tokens"] + usage["cache_read_tokens"],
+            completion_tokens=usage["output_tokens"],
+            prompt_tokens_details=SimpleNamespace(
+                cached_tokens=usage["cache_read_tokens"]
+            ),
+        )
+    else:
+        return SimpleNamespace(
+            prompt_token_count=usage["input_tokens"] + usage["cache_read_tokens"],
+            candidates_token_count=usage["output_tokens"],
+            cached_content_token_count=usage["cache_read_tokens"],
+        )
@@ -1,10 +1,61 @@
+import time
+
+from codeaide.utils.api_utils import get_token_usage
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+
 class CostTracker:
     def __init__(self):
         self.cost_log = []
         self.cost_per_1k_tokens = 0.03  # Update this with actual pricing
 
-    def log_request(self, response):
-        pass
+    def log_request(self, response, provider):
+        """
+        Record the token usage of a response, including prompt cache reads/writes.
+
+        Args:
+            response: The response object returned by send_api_request.
+            provider (str): The provider that produced the response.
+
+        Returns:
+            dict: The token usage that was recorded.
+        """
+        return self.log_usage(provider, get_token_usage(response, provider))
+
+    def log_usage(self, provider, usage):
+        """
+        Record token usage that log_request can't read from a response in the
+        provider's own format, such as a converted or abandoned one's.
+
+        Args:
+            provider (str): The provider that used the tokens.
+            usage (dict): The token counts, as returned by get_token_usage.
+
+        Returns:
+            dict: The token usage that was recorded.
+        """
+        self.cost_log.append({"time": time.time(), "provider": provider, **usage})
+        logger.info(
+            f"Token usage: {usage['input_tokens']} input, "
+            f"{usage['cache_read_tokens']} cache read, "
+            f"{usage['cache_write_tokens']} cache write, "
+            f"{usage['output_tokens']} output"
+        )
+        return usage
+
+    def get_total_usage(self):
+        totals = {
+            "input_tokens": 0,
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0,
+            "output_tokens": 0,
+        }
+        for entry in self.cost_log:
+            for key in totals:
+                totals[key] += entry[key]
+        return totals
 
     def get_total_cost(self):
         return 0
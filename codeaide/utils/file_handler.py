@@ -39,7 +39,9 @@ class FileHandler:
         if self.session_dir:
             os.makedirs(self.session_dir, exist_ok=True)
 
-    def save_code(self, code, version, version_description, requirements=[]):
+    def save_code(
+        self, code, version, version_description, requirements=[], problems=[]
+    ):
         if not self.session_dir:
             raise ValueError("Session directory not set. Cannot save code.")
 
@@ -64,10 +66,30 @@ class FileHandler:
             "requirements": requirements,
             "code_path": abs_code_path,
             "requirements_path": abs_req_path,
+            "problems": problems,
         }
         self.logger.debug(f"Current versions dict: {self.versions_dict}")
         return code_path
 
+    def save_candidate(self, code, name):
+        """
+        Save candidate code (e.g. from a model comparison) that isn't a version yet.
+
+        Args:
+            code (str): The code.
+            name (str): A name for the candidate, used as the file name.
+
+        Returns:
+            str: The path of the saved file.
+        """
+        candidates_dir = os.path.join(self.session_dir, "candidates")
+        os.makedirs(candidates_dir, exist_ok=True)
+        path = os.path.join(candidates_dir, f"{name}.py")
+        with open(path, "w") as file:
+            file.write(code)
+        self.logger.info(f"Saved candidate {name} to: {path}")
+        return path
+
     def save_requirements(self, requirements, version):
         if not self.session_dir:
             raise ValueError("Session directory not set. Cannot save requirements.")
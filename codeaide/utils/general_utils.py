@@ -105,6 +105,11 @@ def format_chat_message(sender, message, font, color):
     return html_message
 
 
+def format_questions(message, questions):
+    """Format a response's text and questions as one chat message."""
+    return f"{message}\n" + "\n".join(f"  * {question}" for question in questions)
+
+
 def increment_version(version, increment=1, major_or_minor="minor"):
     major, minor = map(int, version.split("."))
     if major_or_minor == "major":
@@ -0,0 +1,136 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+from codeaide.utils.constants import HEADLESS_RUN_TIMEOUT
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+TRACEBACK_HEADER = "Traceback (most recent call last)"
+
+# Use non-interactive backends, so plots and games run without opening windows
+# where the toolkit supports it
+HEADLESS_ENV = {
+    "MPLBACKEND": "Agg",
+    "QT_QPA_PLATFORM": "offscreen",
+    "SDL_VIDEODRIVER": "dummy",
+    "SDL_AUDIODRIVER": "dummy",
+    "PYTHONUNBUFFERED": "1",
+}
+
+# Installing into the same environment from several threads at once breaks pip
+install_lock = threading.Lock()
+
+
+class RunResult:
+    """
+    The outcome of running a script headlessly.
+
+    A script that is still running when the timeout expires (e.g. a game loop)
+    counts as a success as long as it hasn't printed a traceback.
+    """
+
+    def __init__(self, returncode, output, timed_out, duration):
+        self.returncode = returncode
+        self.output = output
+        self.timed_out = timed_out
+        self.duration = duration
+
+    @property
+    def traceback(self):
+        index = self.output.rfind(TRACEBACK_HEADER)
+        return self.output[index:].strip() if index != -1 else None
+
+    @property
+    def succeeded(self):
+        return (self.timed_out or self.returncode == 0) and self.traceback is None
+
+
+def check_syntax(code):
+    """
+    Compile code without running it.
+
+    Args:
+        code (str): The Python source.
+
+    Returns:
+        str: A description of the syntax error, or None if the code compiles.
+    """
+    try:
+        compile(code, "<generated code>", "exec")
+        return None
+    except (SyntaxError, ValueError) as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def run_headless(code, requirements, environment_manager, timeout=HEADLESS_RUN_TIMEOUT):
+    """
+    Run code in the session's virtual environment without a terminal window.
+
+    Args:
+        code (str): The Python source to run.
+        requirements (list): Packages to install first.
+        environment_manager (EnvironmentManager): The session's environment.
+        timeout (float): Seconds to let the script run before stopping it.
+
+    Returns:
+        RunResult: The exit code, combined stdout/stderr and timing.
+    """
+    with tempfile.TemporaryDirectory(prefix="codeaide_run_") as temp_dir:
+        if requirements:
+            requirements_path = os.path.join(temp_dir, "requirements.txt")
+            with open(requirements_path, "w") as f:
+                f.write("\n".join(requirements))
+            with install_lock:
+                environment_manager.install_requirements(requirements_path)
+
+        script_path = os.path.join(temp_dir, "script.py")
+        with open(script_path, "w") as f:
+            f.write(code)
+
+        return run_script(
+            environment_manager.get_python_executable(), script_path, timeout
+        )
+
+
+def run_script(python_executable, script_path, timeout=HEADLESS_RUN_TIMEOUT):
+    """
+    Run a script with non-interactive backends, capturing its output.
+
+    Args:
+        python_executable (str): The interpreter to run it with.
+        script_path (str): The script, which is run from its own directory.
+        timeout (float): Seconds to let the script run before stopping it.
+
+    Returns:
+        RunResult: The exit code, combined stdout/stderr and timing.
+    """
+    started = time.monotonic()
+    try:
+        result = subprocess.run(
+            [python_executable, script_path],
+            cwd=os.path.dirname(os.path.abspath(script_path)),
+            env={**os.environ, **HEADLESS_ENV},
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            timeout=timeout,
+        )
+        returncode, output, timed_out = result.returncode, result.stdout, False
+    except subprocess.TimeoutExpired as e:
+        output = e.output or ""
+        if isinstance(output, bytes):
+            output = output.decode(errors="replace")
+        returncode, timed_out = None, True
+    duration = time.monotonic() - started
+
+    run_result = RunResult(returncode, output, timed_out, duration)
+    logger.info(
+        f"Headless run {'succeeded' if run_result.succeeded else 'failed'} "
+        f"in {duration:.1f} seconds"
+    )
+    return run_result
@@ -0,0 +1,255 @@
+import math
+import queue
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from codeaide.utils.api_utils import (
+    RequestCancelled,
+    build_response,
+    get_response_text,
+    get_token_usage,
+)
+from codeaide.utils.constants import (
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_LATENCY_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    MAX_HEDGES_PER_SESSION,
+)
+from codeaide.utils.continuation import TRUNCATION_REASONS, build_usage, is_truncated
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+# How many recent times to first token are kept per model
+LATENCY_WINDOW = 50
+
+
+class RequestArm:
+    """
+    One of the requests sent by HedgedRequester.
+    """
+
+    def __init__(self, name, provider, model):
+        self.name = name
+        self.provider = provider
+        self.model = model
+        self.started = time.monotonic()
+        self.first_token = threading.Event()
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        # Set by the first token or the end of the request, whichever is first
+        self.progress = threading.Event()
+        self.succeeded = False
+        # Including the chunk that was streamed when the request was cancelled
+        self.streamed_chars = 0
+
+
+class HedgedRequester:
+    """
+    Sends a duplicate request to a second model when the first one is slow.
+
+    Each request is streamed, so the time to first token can be measured and the
+    losing request can be cancelled from its stream callback. If no token has
+    arrived after the chosen percentile of the model's recent times to first
+    token, the request is also sent to the hedge model, and whichever response
+    arrives first is used.
+    """
+
+    def __init__(
+        self,
+        percentile=HEDGE_LATENCY_PERCENTILE,
+        max_hedges=MAX_HEDGES_PER_SESSION,
+    ):
+        self.percentile = percentile
+        self.max_hedges = max_hedges
+        self.hedges_sent = 0
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.wins = Counter()
+        self.lock = threading.Lock()
+
+    def start_session(self):
+        """
+        Reset the hedge budget for a new session, keeping the latency history.
+        """
+        with self.lock:
+            self.hedges_sent = 0
+            self.wins.clear()
+
+    def record_latency(self, provider, model, seconds):
+        with self.lock:
+            self.latencies[(provider, model)].append(seconds)
+
+    def get_hedge_delay(self, provider, model):
+        """
+        Get how long to wait for the first token before sending a hedged request.
+
+        Args:
+            provider (str): The provider name.
+            model (str): The model name.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        with self.lock:
+            samples = sorted(self.latencies[(provider, model)])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        index = math.ceil(self.percentile / 100 * len(samples)) - 1
+        return samples[max(0, index)]
+
+    def reserve_hedge(self):
+        with self.lock:
+            if self.hedges_sent >= self.max_hedges:
+                return False
+            self.hedges_sent += 1
+            return True
+
+    def send(
+        self,
+        primary,
+        hedge,
+        send_request,
+        stream_callback=None,
+        on_winner=None,
+        on_abandoned=None,
+    ):
+        """
+        Send a request, hedging it with a second model if it is slow to start.
+
+        Args:
+            primary (tuple): The (provider, model) to send the request to.
+            hedge (tuple): The (provider, model) to hedge with, or None.
+            send_request (callable): Called with (provider, model, stream_callback)
+                to send the request; returns the response or None on failure.
+            stream_callback (callable, optional): Called with the streamed text of
+                the primary request.
+            on_winner (callable, optional): Called with the RequestArm whose
+                response is returned, so its usage can be put down to its provider.
+            on_abandoned (callable, optional): Called from a background thread
+                with (arm, response) for each request abandoned for the winner,
+                once it ends. The response is None if the request was cancelled
+                part way through; the usage of those can only be estimated, from
+                the arm's streamed_chars.
+
+        Returns:
+            The first successful response, in the primary provider's format, or
+            None if every request failed.
+
+        Raises:
+            Exception: The error raised by the last request, if none succeeded.
+        """
+        results = queue.Queue()
+        primary_arm = self.start_arm(
+            "primary", primary, send_request, results, stream_callback
+        )
+        arms = [primary_arm]
+
+        delay = self.get_hedge_delay(*primary)
+        # A primary that fails is hedged straight away, without waiting the delay
+        primary_arm.progress.wait(delay)
+        if (
+            hedge is not None
+            and not primary_arm.first_token.is_set()
+            and not primary_arm.succeeded
+            and self.reserve_hedge()
+        ):
+            if primary_arm.done.is_set():
+                reason = f"The request to {primary[1]} failed"
+            else:
+                reason = f"No response from {primary[1]} after {delay:.1f} seconds"
+            logger.info(f"{reason}; sending a hedged request to {hedge[1]}")
+            arms.append(self.start_arm("hedge", hedge, send_request, results))
+
+        winner, response, error = None, None, None
+        ended = 0
+        for _ in arms:
+            arm, response, error = results.get()
+            ended += 1
+            if response is not None:
+                winner = arm
+                break
+
+        for arm in arms:
+            if arm is not winner:
+                arm.cancelled.set()
+
+        if winner is None:
+            if error is not None:
+                raise error
+            return None
+        if on_abandoned is not None and ended < len(arms):
+            threading.Thread(
+                target=report_abandoned,
+                args=(results, len(arms) - ended, on_abandoned),
+                daemon=True,
+            ).start()
+        if on_winner is not None:
+            on_winner(winner)
+        if len(arms) > 1:
+            with self.lock:
+                self.wins[winner.name] += 1
+            logger.info(
+                f"Hedged request won by {winner.name} ({winner.model}); "
+                f"wins so far: {dict(self.wins)}"
+            )
+        if winner is not primary_arm:
+            return convert_response(response, winner.provider, primary[0])
+        return response
+
+    def start_arm(self, name, target, send_request, results, stream_callback=None):
+        arm = RequestArm(name, *target)
+
+        def callback(text):
+            arm.streamed_chars += len(text)
+            if arm.cancelled.is_set():
+                raise RequestCancelled()
+            if not arm.first_token.is_set():
+                arm.first_token.set()
+                arm.progress.set()
+                self.record_latency(
+                    arm.provider, arm.model, time.monotonic() - arm.started
+                )
+            if stream_callback is not None:
+                stream_callback(text)
+
+        def run():
+            response, error = None, None
+            try:
+                response = send_request(arm.provider, arm.model, callback)
+            except Exception as e:
+                if not isinstance(e, RequestCancelled):
+                    logger.error(f"Error in {name} request to {arm.provider}: {e}")
+                error = e
+            arm.succeeded = response is not None
+            arm.done.set()
+            arm.progress.set()
+            results.put((arm, response, error))
+
+        threading.Thread(target=run, daemon=True).start()
+        return arm
+
+
+def report_abandoned(results, count, on_abandoned):
+    # Waits for the abandoned requests to end; those that failed used nothing
+    for _ in range(count):
+        arm, response, error = results.get()
+        if response is not None or isinstance(error, RequestCancelled):
+            on_abandoned(arm, response)
+
+
+def convert_response(response, from_provider, to_provider):
+    """
+    Rebuild a response in another provider's format, keeping its text and usage.
+    """
+    if from_provider.lower() == to_provider.lower():
+        return response
+    finish_reason = None
+    if is_truncated(response, from_provider):
+        finish_reason = TRUNCATION_REASONS[to_provider.lower()]
+    return build_response(
+        to_provider,
+        get_response_text(response, from_provider),
+        finish_reason,
+        build_usage(to_provider, get_token_usage(response, from_provider)),
+    )
@@ -0,0 +1,143 @@
+import json
+import threading
+from collections import Counter
+
+import hjson
+
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+# Escapes that are valid after a backslash in a JSON string
+VALID_ESCAPES = set('"\\/bfnrtu')
+CONTROL_CHARACTER_ESCAPES = {
+    "\n": "\\n",
+    "\r": "\\r",
+    "\t": "\\t",
+    "\b": "\\b",
+    "\f": "\\f",
+}
+
+# Number of responses recovered locally, by kind of repair. Each one is a request
+# that would otherwise have been retried.
+repair_counts = Counter()
+repair_counts_lock = threading.Lock()
+
+
+def record_repair(kind):
+    with repair_counts_lock:
+        repair_counts[kind] += 1
+        total = sum(repair_counts.values())
+    logger.info(
+        f"Recovered a response locally ({kind}); {total} round trips saved so far"
+    )
+
+
+def get_repair_stats():
+    with repair_counts_lock:
+        stats = dict(repair_counts)
+    stats["round_trips_saved"] = sum(stats.values())
+    return stats
+
+
+def extract_first_object(text):
+    """
+    Extract the first balanced JSON object from a string.
+
+    Anything before the first '{' (prose, code fences) and after its matching
+    '}' is dropped. Braces inside strings are ignored.
+
+    Args:
+        text (str): The text that contains the object.
+
+    Returns:
+        str: The object, or None if there is no complete object.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return None
+
+
+def escape_string_contents(json_str):
+    """
+    Escape raw control characters and invalid backslash escapes inside strings.
+
+    Models often put literal newlines or tabs in the 'code' field, or code with
+    regular expressions or Windows paths whose backslashes aren't escaped; both
+    are invalid JSON.
+
+    Args:
+        json_str (str): A JSON object.
+
+    Returns:
+        str: The object with its strings escaped.
+    """
+    result = []
+    in_string = False
+    i = 0
+    while i < len(json_str):
+        char = json_str[i]
+        if not in_string:
+            in_string = char == '"'
+            result.append(char)
+        elif char == "\\":
+            next_char = json_str[i + 1] if i + 1 < len(json_str) else ""
+            if next_char in VALID_ESCAPES and next_char:
+                result.append(char + next_char)
+                i += 1
+            else:
+                result.append("\\\\")
+        elif char == '"':
+            in_string = False
+            result.append(char)
+        elif ord(char) < 0x20:
+            result.append(CONTROL_CHARACTER_ESCAPES.get(char, f"\\u{ord(char):04x}"))
+        else:
+            result.append(char)
+        i += 1
+    return "".join(result)
+
+
+def repair_json(json_str):
+    """
+    Try to recover a JSON object from a malformed response.
+
+    Args:
+        json_str (str): The raw response text.
+
+    Returns:
+        dict: The parsed object, or None if it couldn't be recovered.
+    """
+    candidate = extract_first_object(json_str)
+    if candidate is None:
+        return None
+    candidate = escape_string_contents(candidate)
+    for loads in (json.loads, hjson.loads):
+        try:
+            parsed = loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            return dict(parsed)
+    return None
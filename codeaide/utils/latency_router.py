@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+
+from codeaide.utils.constants import (
+    AI_PROVIDERS,
+    ENABLE_STREAMING,
+    LATENCY_EWMA_ALPHA,
+    LATENCY_PROBE_INTERVAL,
+    MODEL_TIERS,
+)
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+# The request sent by background probes, kept as short as possible
+LATENCY_PROBE_PROMPT = "Reply with the single word OK."
+LATENCY_PROBE_MAX_TOKENS = 5
+
+
+def get_models_in_tier(min_tier):
+    """
+    Get every model whose capability tier is at least min_tier.
+
+    Args:
+        min_tier (str): One of MODEL_TIERS.
+
+    Returns:
+        list: (provider, model) tuples, in AI_PROVIDERS order.
+    """
+    min_rank = MODEL_TIERS.index(min_tier)
+    return [
+        (provider, model)
+        for provider, config in AI_PROVIDERS.items()
+        for model, model_config in config["models"].items()
+        if MODEL_TIERS.index(model_config["tier"]) >= min_rank
+    ]
+
+
+class LatencyRouter:
+    """
+    Measures the latency of each model and picks the fastest one.
+
+    The time to first token and total latency of every request are kept as
+    exponentially weighted moving averages per model, and saved to disk so new
+    sessions start with the estimates from earlier ones.
+    """
+
+    def __init__(self, stats_path=None, alpha=LATENCY_EWMA_ALPHA):
+        if stats_path is None:
+            stats_path = os.path.join(
+                os.path.expanduser("~"), ".codeaide_cache", "latency_stats.json"
+            )
+        self.stats_path = stats_path
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.probe_thread = None
+        self.stop_probes = threading.Event()
+        self.stats = self._load()
+
+    def _load(self):
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+            with open(self.stats_path, "w", encoding="utf-8") as f:
+                json.dump(self.stats, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Couldn't save latency stats: {e}")
+
+    def record(self, provider, model, total_latency, first_token_latency=None):
+        """
+        Update the moving averages of a model with a new measurement.
+
+        Args:
+            provider (str): The provider name.
+            model (str): The model name.
+            total_latency (float): Seconds until the whole response had arrived.
+            first_token_latency (float, optional): Seconds until the first
+                streamed text arrived.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            entry = self.stats.setdefault(f"{provider}/{model}", {"samples": 0})
+            for key, value in (
+                ("total", total_latency),
+                ("first_token", first_token_latency),
+            ):
+                if value is None:
+                    continue
+                previous = entry.get(key)
+                entry[key] = (
+                    value
+                    if previous is None
+                    else self.alpha * value + (1 - self.alpha) * previous
+                )
+            entry["samples"] += 1
+            self._save()
+
+    def get_estimate(self, provider, model, total=False):
+        """
+        Get the expected latency of a model, or None if it hasn't been measured.
+
+        With streaming on, the time to first token is what the user waits for, so
+        it's used when it's available, unless total is True.
+        """
+        with self.lock:
+            entry = self.stats.get(f"{provider}/{model}", {})
+        if ENABLE_STREAMING and not total and entry.get("first_token") is not None:
+            return entry["first_token"]
+        return entry.get("total")
+
+    def measure(self, provider, model, send_request, stream_callback=None):
+        """
+        Send a request and record how long it took.
+
+        Args:
+            provider (str): The provider name.
+            model (str): The model name.
+            send_request (callable): Called with a stream callback (None if
+                stream_callback is None); returns the response or None.
+            stream_callback (callable, optional): Called with the streamed text.
+
+        Returns:
+            The value returned by send_request.
+        """
+        started = time.monotonic()
+        first_token = []
+
+        def timed_callback(text):
+            if not first_token:
+                first_token.append(time.monotonic() - started)
+            stream_callback(text)
+
+        response = send_request(None if stream_callback is None else timed_callback)
+        if response is not None:
+            self.record(
+                provider,
+                model,
+                time.monotonic() - started,
+                first_token[0] if first_token else None,
+            )
+        return response
+
+    def rank_models(self, min_tier):
+        """
+        Get the models of at least min_tier, fastest first.
+
+        Models that haven't been measured come last, in AI_PROVIDERS order.
+        """
+        models = get_models_in_tier(min_tier)
+        estimates = {model: self.get_estimate(*model) for model in models}
+        measured = sorted(
+            (model for model in models if estimates[model] is not None),
+            key=estimates.get,
+        )
+        return measured + [model for model in models if estimates[model] is None]
+
+    def choose_model(self, min_tier, is_usable):
+        """
+        Pick the fastest usable model of at least min_tier.
+
+        Args:
+            min_tier (str): One of MODEL_TIERS.
+            is_usable (callable): Called with (provider, model); returns False if
+                the model can't be used right now.
+
+        Returns:
+            tuple: The (provider, model), or None if no model is usable.
+        """
+        for provider, model in self.rank_models(min_tier):
+            if is_usable(provider, model):
+                return provider, model
+        return None
+
+    def start_probes(self, min_tier, is_usable, send_probe):
+        """
+        Measure every usable model of at least min_tier in the background, every
+        LATENCY_PROBE_INTERVAL seconds, until stop() is called.
+
+        Args:
+            min_tier (str): One of MODEL_TIERS.
+            is_usable (callable): Called with (provider, model).
+            send_probe (callable): Called with (provider, model, stream_callback)
+                to send LATENCY_PROBE_PROMPT; returns the response or None.
+
+        Returns:
+            None
+        """
+        if self.probe_thread is not None and self.probe_thread.is_alive():
+            return
+        self.stop_probes.clear()
+
+        def run():
+            while not self.stop_probes.is_set():
+                for provider, model in get_models_in_tier(min_tier):
+                    if self.stop_probes.is_set():
+                        return
+                    if not is_usable(provider, model):
+                        continue
+                    try:
+                        self.measure(
+                            provider,
+                            model,
+                            lambda callback: send_probe(provider, model, callback),
+                            stream_callback=lambda text: None,
+                        )
+                    except Exception as e:
+                        logger.warning(f"Latency probe to {model} failed: {e}")
+                logger.info(f"Latency estimates after probes: {self.stats}")
+                self.stop_probes.wait(LATENCY_PROBE_INTERVAL)
+
+        self.probe_thread = threading.Thread(target=run, daemon=True)
+        self.probe_thread.start()
+
+    def stop(self):
+        self.stop_probes.set()
@@ -0,0 +1,141 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from codeaide.utils.api_utils import get_token_usage, parse_response
+from codeaide.utils.constants import COMPARISON_MAX_WORKERS, HEADLESS_RUN_TIMEOUT
+from codeaide.utils.headless_runner import check_syntax, run_headless
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+
+class ComparisonResult:
+    """
+    The response of one model to a compared prompt, with its timing and checks.
+    """
+
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.response = None
+        self.first_token_latency = None
+        self.total_latency = None
+        self.usage = None
+        self.parsed = None
+        self.code = None
+        self.error = None
+        self.run_result = None
+
+    @property
+    def json_parsed(self):
+        return self.parsed is not None
+
+    @property
+    def code_ran(self):
+        """
+        True if the code ran cleanly, False if it didn't, None if there was none.
+        """
+        if self.code is None:
+            return None
+        return self.run_result is not None and self.run_result.succeeded
+
+    def get_summary(self):
+        return {
+            "model": f"{self.provider}/{self.model}",
+            "first_token_latency": self.first_token_latency,
+            "total_latency": self.total_latency,
+            "input_tokens": self.usage["input_tokens"] if self.usage else None,
+            "output_tokens": self.usage["output_tokens"] if self.usage else None,
+            "json_parsed": self.json_parsed,
+            "code_ran": self.code_ran,
+            "error": self.error,
+        }
+
+
+class ModelComparison:
+    """
+    Sends one prompt to several models at once and checks each response.
+
+    Every response is streamed to measure the time to first token, parsed, and
+    its code is syntax-checked and run headlessly in the session's environment.
+    """
+
+    def __init__(
+        self,
+        environment_manager,
+        max_workers=COMPARISON_MAX_WORKERS,
+        timeout=HEADLESS_RUN_TIMEOUT,
+    ):
+        self.environment_manager = environment_manager
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def compare(self, models, send_model, resolve_code=None):
+        """
+        Get and check a response from each model, concurrently.
+
+        Args:
+            models (list): (provider, model) tuples.
+            send_model (callable): Called with (provider, model, stream_callback);
+                returns the response, or None if the request failed.
+            resolve_code (callable, optional): Turns the 'code' field of a
+                response into the complete code. It may raise ValueError.
+
+        Returns:
+            list: A ComparisonResult per model, in the same order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self.evaluate, provider, model, send_model, resolve_code
+                )
+                for provider, model in models
+            ]
+            results = [future.result() for future in futures]
+        for result in results:
+            logger.info(f"Model comparison: {result.get_summary()}")
+        return results
+
+    def evaluate(self, provider, model, send_model, resolve_code=None):
+        result = ComparisonResult(provider, model)
+        started = time.monotonic()
+
+        def stream_callback(text):
+            if result.first_token_latency is None:
+                result.first_token_latency = time.monotonic() - started
+
+        try:
+            result.response = send_model(provider, model, stream_callback)
+        except Exception as e:
+            result.error = str(e)
+            return result
+        result.total_latency = time.monotonic() - started
+        if result.response is None:
+            result.error = "The request failed"
+            return result
+
+        result.usage = get_token_usage(result.response, provider)
+        try:
+            result.parsed = parse_response(result.response, provider)
+            code = result.parsed[2]
+            if code and resolve_code is not None:
+                code = resolve_code(code)
+        except ValueError as e:
+            result.error = str(e)
+            return result
+        if not code:
+            return result
+
+        result.code = code
+        syntax_error = check_syntax(code)
+        if syntax_error:
+            result.error = syntax_error
+            return result
+        result.run_result = run_headless(
+            code, result.parsed[5] or [], self.environment_manager, self.timeout
+        )
+        if not result.run_result.succeeded:
+            result.error = result.run_result.traceback or (
+                f"Exited with code {result.run_result.returncode}"
+            )
+        return result
@@ -0,0 +1,78 @@
+from codeaide.utils.constants import AI_PROVIDERS, MODEL_TIERS, SIMPLE_TURN_MAX_CHARS
+
+# Text that marks a turn as a request to fix an error, which needs the full model
+TRACEBACK_MARKERS = (
+    "Traceback (most recent call last)",
+    "The following error occurred when running the code",
+)
+
+
+def is_simple_turn(user_input, has_code):
+    """
+    Classify a turn as a small edit that a fast model can handle.
+
+    Args:
+        user_input (str): The user's message.
+        has_code (bool): True if the session already has code to edit.
+
+    Returns:
+        bool: True if the turn is short, edits existing code and isn't fixing
+        a traceback.
+    """
+    if not has_code or len(user_input.strip()) > SIMPLE_TURN_MAX_CHARS:
+        return False
+    return not any(marker in user_input for marker in TRACEBACK_MARKERS)
+
+
+def get_fast_model(provider):
+    """
+    Get the provider's first model in the fastest tier, or None if it has none.
+    """
+    for model, config in AI_PROVIDERS[provider]["models"].items():
+        if config["tier"] == MODEL_TIERS[0]:
+            return model
+    return None
+
+
+class TieringStats:
+    """
+    Counts the turns sent to the fast tier in a session, the tokens they used and
+    the time they saved.
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.fast_turns = 0
+        self.escalations = 0
+        self.fast_tokens = 0
+        self.seconds_saved = 0.0
+
+    def record_turn(self, used_fast_tier, tokens=0, seconds_saved=0.0):
+        """
+        Record a completed turn.
+
+        Args:
+            used_fast_tier (bool): True if the turn was answered by a fast model.
+            tokens (int): The tokens used by the fast model.
+            seconds_saved (float): The selected model's average latency minus
+                the fast model's latency for this turn.
+
+        Returns:
+            None
+        """
+        self.turns += 1
+        if used_fast_tier:
+            self.fast_turns += 1
+            self.fast_tokens += tokens
+            self.seconds_saved += seconds_saved
+
+    def record_escalation(self):
+        self.escalations += 1
+
+    def get_report(self):
+        return (
+            f"{self.fast_turns} of {self.turns} turns used the fast tier "
+            f"({self.fast_tokens} tokens used by the fast tier, about "
+            f"{self.seconds_saved:.1f} seconds saved); {self.escalations} escalated "
+            f"to the selected model"
+        )
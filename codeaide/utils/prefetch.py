@@ -0,0 +1,137 @@
+import threading
+
+from codeaide.utils.api_utils import RequestCancelled
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+
+class SpeculativeRequest:
+    """
+    A request sent in the background before the user has asked for it.
+
+    It is always streamed, so it can be abandoned part way through by discard().
+    The text streamed before it is adopted is kept and replayed to the stream
+    callback passed to adopt(), which then gets the rest as it arrives.
+    """
+
+    def __init__(self, key, send_request):
+        self.key = key
+        self.response = None
+        self.error = None
+        self.chunks = []
+        self.stream_callback = None
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.discarded = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, args=(send_request,), daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self, send_request):
+        try:
+            self.response = send_request(self.on_chunk)
+        except Exception as e:
+            self.error = e
+            if not isinstance(e, RequestCancelled):
+                logger.error(f"Speculative request failed: {e}")
+        finally:
+            self.done.set()
+
+    def on_chunk(self, text):
+        if self.discarded.is_set():
+            raise RequestCancelled()
+        # The callback is called under the lock so adopt() can replay the text
+        # streamed so far without it being interleaved with new text
+        with self.lock:
+            self.chunks.append(text)
+            if self.stream_callback is not None:
+                self.stream_callback(text)
+
+    def adopt(self, stream_callback=None):
+        """
+        Take over the request, waiting for its response if it's still in flight.
+
+        Args:
+            stream_callback (callable, optional): Called with the text streamed so
+                far, then with the rest of it as it arrives.
+
+        Returns:
+            The response, or None if the request failed.
+        """
+        if stream_callback is not None:
+            with self.lock:
+                try:
+                    for text in self.chunks:
+                        stream_callback(text)
+                except RequestCancelled:
+                    self.discard()
+                    raise
+                self.stream_callback = stream_callback
+        self.done.wait()
+        if isinstance(self.error, RequestCancelled):
+            raise self.error
+        return self.response
+
+    def discard(self):
+        self.discarded.set()
+
+
+class SpeculativePrefetcher:
+    """
+    Holds at most one speculative request, until it is adopted or discarded.
+
+    A request is identified by a key describing exactly what it sends, so it is
+    only adopted by a turn that would have sent the same request.
+    """
+
+    def __init__(self):
+        self.request = None
+        self.lock = threading.Lock()
+
+    def start(self, key, send_request):
+        """
+        Send a request in the background, discarding any earlier one.
+
+        Args:
+            key: What the request sends, compared with the key passed to take().
+            send_request (callable): Called with a stream callback to send the
+                request; returns the response or None on failure.
+        """
+        request = SpeculativeRequest(key, send_request)
+        with self.lock:
+            previous, self.request = self.request, request
+        if previous is not None:
+            previous.discard()
+        request.start()
+
+    def take(self, key):
+        """
+        Take the speculative request if it sends the same as key.
+
+        A request that doesn't match is discarded, since it was for a turn the
+        user didn't take.
+
+        Returns:
+            SpeculativeRequest: The matching request, or None.
+        """
+        with self.lock:
+            request, self.request = self.request, None
+        if request is None:
+            return None
+        if request.key != key:
+            request.discard()
+            logger.info("Discarded a speculative request that didn't match the turn")
+            return None
+        return request
+
+    def discard(self):
+        with self.lock:
+            request, self.request = self.request, None
+        if request is not None:
+            request.discard()
+            logger.info("Discarded an unused speculative request")
@@ -0,0 +1,204 @@
+import random
+import threading
+import time
+
+from codeaide.utils.api_utils import QuotaExceededException, RateLimitException
+from codeaide.utils.constants import (
+    AI_PROVIDERS,
+    MAX_CONCURRENT_REQUESTS,
+    RATE_LIMIT_MAX_WAIT,
+)
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+# Retry-after delays are stretched by a random factor up to this much, so queued
+# requests don't all go out at the same moment
+RETRY_JITTER = 0.25
+# Delay after a 429 without a retry-after header, doubled for each one in a row
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# How often a queued request checks whether its turn has been stopped
+CANCEL_CHECK_INTERVAL = 0.25
+
+
+class ProviderLimiter:
+    """
+    Rate and concurrency limits for one (provider, model).
+
+    A token bucket keeps requests within requests_per_minute, with a small burst.
+    The number of concurrent requests is adjusted with AIMD: it grows by one per
+    "round" of successful requests and is halved by each rate limit error, which
+    also blocks new requests until the retry-after time has passed.
+    """
+
+    def __init__(self, requests_per_minute, max_concurrency=MAX_CONCURRENT_REQUESTS):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, requests_per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.condition = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _get_wait_time(self, now):
+        # Returns 0 if a request can start now, otherwise how long to wait (None
+        # means until another request finishes)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.in_flight >= int(self.concurrency_limit):
+            return None
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        return 0
+
+    def acquire(self, timeout, turn=None):
+        """
+        Wait until a request can be sent.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait.
+            turn (TurnCancellation, optional): The turn the request is for, checked
+                every CANCEL_CHECK_INTERVAL seconds while waiting.
+
+        Returns:
+            bool: True if the request can be sent, False if the wait timed out.
+
+        Raises:
+            RequestCancelled: If the turn is cancelled while waiting.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if turn is not None:
+                    turn.check()
+                now = time.monotonic()
+                self._refill(now)
+                wait_time = self._get_wait_time(now)
+                if wait_time == 0:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return True
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                wait_time = (
+                    remaining if wait_time is None else min(wait_time, remaining)
+                )
+                if turn is not None:
+                    wait_time = min(wait_time, CANCEL_CHECK_INTERVAL)
+                self.condition.wait(wait_time)
+
+    def release(self, rate_limited=False, retry_after=None):
+        """
+        Record the outcome of a request and let waiting requests through.
+
+        Args:
+            rate_limited (bool): True if the provider returned a rate limit error.
+            retry_after (float, optional): The delay the provider asked for.
+
+        Returns:
+            float: The delay before the next request, if it was rate limited.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            delay = 0.0
+            if rate_limited:
+                self.consecutive_rate_limits += 1
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                if retry_after is None:
+                    retry_after = min(
+                        MAX_BACKOFF,
+                        BASE_BACKOFF * 2 ** (self.consecutive_rate_limits - 1),
+                    )
+                delay = retry_after * random.uniform(1, 1 + RETRY_JITTER)
+                self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            else:
+                self.consecutive_rate_limits = 0
+                self.concurrency_limit = min(
+                    self.max_concurrency,
+                    self.concurrency_limit + 1 / self.concurrency_limit,
+                )
+            self.condition.notify_all()
+            return delay
+
+
+class RequestScheduler:
+    """
+    Sends requests through a ProviderLimiter per (provider, model).
+
+    Requests wait for capacity instead of failing; a request that is rate limited
+    is queued again and sent once the provider's retry-after time has passed.
+    """
+
+    def __init__(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        self.max_wait = max_wait
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def get_limiter(self, provider, model):
+        key = (provider.lower(), model)
+        with self.lock:
+            if key not in self.limiters:
+                model_config = AI_PROVIDERS.get(key[0], {}).get("models", {})
+                requests_per_minute = model_config.get(model, {}).get(
+                    "requests_per_minute", 60
+                )
+                self.limiters[key] = ProviderLimiter(requests_per_minute)
+            return self.limiters[key]
+
+    def run(self, provider, model, send_request, turn=None):
+        """
+        Send a request when there is capacity for it, retrying on rate limits.
+
+        Args:
+            provider (str): The provider name.
+            model (str): The model name.
+            send_request (callable): Sends the request and returns its response.
+            turn (TurnCancellation, optional): The turn the request is for, so
+                stopping it ends the wait for capacity.
+
+        Returns:
+            The value returned by send_request.
+
+        Raises:
+            QuotaExceededException: If the request couldn't be sent within
+                max_wait seconds.
+            RequestCancelled: If the turn is cancelled while the request waits.
+        """
+        limiter = self.get_limiter(provider, model)
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            if not limiter.acquire(deadline - time.monotonic(), turn):
+                raise QuotaExceededException(
+                    f"Timed out after {self.max_wait} seconds waiting for the "
+                    f"{provider} rate limit. You might need to wait briefly before "
+                    "trying again or try using a different model."
+                )
+            try:
+                response = send_request()
+            except RateLimitException as e:
+                delay = limiter.release(rate_limited=True, retry_after=e.retry_after)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(
+                    f"Rate limited by {provider} ({model}); sending the request "
+                    f"again in {delay:.1f} seconds"
+                )
+                continue
+            except BaseException:
+                limiter.release()
+                raise
+            limiter.release()
+            return response
+
+
+# Shared by every ChatHandler (and batch job) in the process, since they share keys
+request_scheduler = RequestScheduler()
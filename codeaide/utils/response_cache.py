@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from codeaide.utils.api_utils import (
+    build_response,
+    get_finish_reason,
+    get_response_text,
+)
+from codeaide.utils.constants import RESPONSE_CACHE_MAX_MB, SYSTEM_PROMPT
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+
+class InFlightRequest:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+class ResponseCache:
+    """
+    A content-addressed on-disk cache for LLM responses.
+
+    Entries are keyed by a hash of everything that determines the response
+    (provider, model, max_tokens, system prompt and conversation history) and
+    store the normalized response text. The cache is kept under a size budget by
+    evicting the least recently used entries, and identical requests that are in
+    flight at the same time are only sent once.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=RESPONSE_CACHE_MAX_MB * 1024 * 1024):
+        if cache_dir is None:
+            cache_dir = os.path.join(
+                os.path.expanduser("~"), ".codeaide_cache", "responses"
+            )
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        # Maps key -> file size, ordered from least to most recently used
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".json"):
+                path = os.path.join(self.cache_dir, filename)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, filename[:-5], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        logger.info(
+            f"Response cache at {self.cache_dir} has {len(self.entries)} entries "
+            f"({self.total_bytes / 1024:.1f} KB)"
+        )
+
+    @staticmethod
+    def make_key(provider, model, max_tokens, conversation_history):
+        payload = json.dumps(
+            [provider, model, max_tokens, SYSTEM_PROMPT, conversation_history],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Return the cached entry for a key, or None if it isn't cached.
+        """
+        with self.lock:
+            if key not in self.entries:
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            os.utime(self._path(key))
+            return entry
+
+    def put(self, key, entry):
+        """
+        Store an entry, evicting the least recently used ones if needed.
+        """
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            with open(self._path(key), "wb") as f:
+                f.write(data)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                oldest_key = next(iter(self.entries))
+                logger.info(f"Evicting cached response {oldest_key}")
+                self._remove(oldest_key)
+
+    def evict(self, key):
+        """
+        Remove an entry, for a cached response that turned out to be unusable.
+        """
+        with self.lock:
+            if key in self.entries:
+                logger.info(f"Evicting unusable cached response {key}")
+                self._remove(key)
+
+    def _remove(self, key):
+        self.total_bytes -= self.entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get_or_send(
+        self, provider, model, max_tokens, conversation_history, send_request
+    ):
+        """
+        Return the cached response for this request, or send it and cache the result.
+
+        Args:
+            provider (str): The provider name.
+            model (str): The model name.
+            max_tokens (int): The maximum number of output tokens.
+            conversation_history (list): The messages being sent.
+            send_request (callable): Sends the request and returns the response
+                (or None on failure) when the response isn't cached.
+
+        Returns:
+            The provider response, or None if the request failed.
+        """
+        key = self.make_key(provider, model, max_tokens, conversation_history)
+        entry = self.get(key)
+        if entry is not None:
+            with self.lock:
+                self.hits += 1
+            logger.info(f"Response cache hit for {provider}/{model}")
+            return build_response(provider, entry["text"], entry.get("finish_reason"))
+
+        with self.lock:
+            pending = self.in_flight.get(key)
+            is_owner = pending is None
+            if is_owner:
+                pending = self.in_flight[key] = InFlightRequest()
+
+        if not is_owner:
+            # An identical request is already on its way; share its response
+            logger.info(f"Waiting for identical in-flight request to {provider}")
+            pending.done.wait()
+            with self.lock:
+                self.deduplicated += 1
+            return pending.response
+
+        with self.lock:
+            self.misses += 1
+        try:
+            pending.response = send_request()
+            if pending.response is not None:
+                self.put(
+                    key,
+                    {
+                        "provider": provider,
+                        "model": model,
+                        "text": get_response_text(pending.response, provider),
+                        "finish_reason": get_finish_reason(pending.response, provider),
+                    },
+                )
+            return pending.response
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            pending.done.set()
+
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+        }
@@ -0,0 +1,143 @@
+from codeaide.utils.logging_config import get_logger
+
+logger = get_logger()
+
+JSON_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class StreamingJSONFieldExtractor:
+    """
+    Incrementally extract top-level string fields from a streamed JSON object.
+
+    Chunks of the model's raw output are passed to feed() as they arrive. Whenever
+    new characters belonging to one of the watched fields (e.g. 'text' or 'code')
+    have been decoded, the callback is called with (field_name, new_text). Escape
+    sequences are decoded, so the callback receives the text as it will appear once
+    the full response is parsed. Anything before the opening brace (such as a
+    ```json fence) is ignored.
+    """
+
+    def __init__(self, fields, callback):
+        self.fields = set(fields)
+        self.callback = callback
+        self.values = {field: "" for field in self.fields}
+
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.string_is_key = False
+        self.expect_key = False
+        self.escape = False
+        self.unicode_buffer = None
+        self.pending_high_surrogate = None
+        self.current_key = ""
+        self.last_key = None
+        self.active_field = None
+
+    def feed(self, chunk):
+        """
+        Process the next chunk of streamed output.
+
+        Args:
+            chunk (str): The newly received text.
+
+        Returns:
+            None
+        """
+        deltas = {}
+        for char in chunk:
+            decoded = self._process_char(char)
+            if decoded:
+                deltas[self.active_field] = deltas.get(self.active_field, "") + decoded
+
+        for field, delta in deltas.items():
+            self.values[field] += delta
+            self.callback(field, delta)
+
+    def _process_char(self, char):
+        if not self.started:
+            if char == "{":
+                self.started = True
+                self.depth = 1
+                self.expect_key = True
+            return None
+
+        if self.in_string:
+            return self._process_string_char(char)
+
+        if char == '"':
+            self.in_string = True
+            self.string_is_key = self.depth == 1 and self.expect_key
+            if self.string_is_key:
+                self.current_key = ""
+            elif self.depth == 1 and self.last_key in self.fields:
+                self.active_field = self.last_key
+        elif char in "{[":
+            self.depth += 1
+        elif char in "}]":
+            self.depth -= 1
+        elif char == "," and self.depth == 1:
+            self.expect_key = True
+        elif char == ":" and self.depth == 1:
+            self.expect_key = False
+        return None
+
+    def _process_string_char(self, char):
+        if self.unicode_buffer is not None:
+            self.unicode_buffer += char
+            if len(self.unicode_buffer) < 4:
+                return None
+            try:
+                code_point = int(self.unicode_buffer, 16)
+            except ValueError:
+                code_point = ord("?")
+            self.unicode_buffer = None
+            return self._emit(self._decode_code_point(code_point))
+
+        if self.escape:
+            self.escape = False
+            if char == "u":
+                self.unicode_buffer = ""
+                return None
+            return self._emit(JSON_ESCAPES.get(char, char))
+
+        if char == "\\":
+            self.escape = True
+            return None
+
+        if char == '"':
+            self.in_string = False
+            if self.string_is_key:
+                self.last_key = self.current_key
+            self.active_field = None
+            return None
+
+        return self._emit(char)
+
+    def _decode_code_point(self, code_point):
+        # Characters outside the BMP arrive as a pair of \\u escapes
+        if 0xD800 <= code_point <= 0xDBFF:
+            self.pending_high_surrogate = code_point
+            return ""
+        if 0xDC00 <= code_point <= 0xDFFF and self.pending_high_surrogate:
+            high = self.pending_high_surrogate
+            self.pending_high_surrogate = None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code_point - 0xDC00))
+        return chr(code_point)
+
+    def _emit(self, text):
+        if self.string_is_key:
+            self.current_key += text
+            return None
+        if self.active_field is None:
+            return None
+        return text
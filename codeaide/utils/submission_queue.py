@@ -0,0 +1,51 @@
+import threading
+
+
+class SubmissionQueue:
+    """
+    Messages submitted while a turn is in flight, waiting for the next turn.
+
+    Everything queued is sent together as the next turn, in the order it was
+    submitted, so follow-ups like "also add a legend" can be typed without
+    waiting for each response.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.messages)
+
+    def put(self, message):
+        """
+        Queue a message.
+
+        Returns:
+            int: The number of messages queued, including this one.
+        """
+        with self.lock:
+            self.messages.append(message)
+            return len(self.messages)
+
+    def pending(self):
+        with self.lock:
+            return list(self.messages)
+
+    def take(self):
+        """
+        Take every queued message, merged into one in the order submitted.
+
+        Returns:
+            str: The merged message, or None if nothing was queued.
+        """
+        with self.lock:
+            messages, self.messages = self.messages, []
+        if not messages:
+            return None
+        return "\n\n".join(messages)
+
+    def clear(self):
+        with self.lock:
+            self.messages = []
@@ -7,6 +7,9 @@ import logging
 import queue
 import time
 
+from codeaide.utils.constants import HEADLESS_RUN_TIMEOUT
+from codeaide.utils.headless_runner import install_lock, run_script
+
 
 class ScriptRunner:
     def __init__(
@@ -204,6 +207,28 @@ class TerminalManager:
         self.runners.append(runner)
         runner.start()
 
+    def run_script_captured(
+        self, script_path, requirements_path, timeout=HEADLESS_RUN_TIMEOUT
+    ):
+        """
+        Run a script in the session's environment without a terminal window,
+        capturing its output instead.
+
+        Args:
+            script_path (str): The script to run.
+            requirements_path (str): Its requirements file.
+            timeout (float): Seconds to let the script run before stopping it.
+
+        Returns:
+            RunResult: The exit code, combined stdout/stderr and timing.
+        """
+        with install_lock:
+            self.env_manager.install_requirements(requirements_path)
+        self.logger.info(f"Running {os.path.basename(script_path)} headlessly")
+        return run_script(
+            self.env_manager.get_python_executable(), script_path, timeout
+        )
+
     def _create_script_content(self, script_path, activation_command, new_packages):
         script_name = os.path.basename(script_path)
         current_env_name = self.env_manager.get_current_env_name()
@@ -0,0 +1,93 @@
+"""
+Compare time-to-first-code on the example prompts with "assume defaults" on and off.
+
+Each prompt in examples.yaml is sent in a new session with the mode off, then in
+another with it on. With the mode off, any questions the model asks are answered
+straight away with ASSUME_DEFAULTS_REPLY, as a user who accepts the defaults
+would, so its times leave out the time the user takes to read and reply. Each row
+shows the seconds until the first response with code, and the requests it took.
+
+Requests go to the default provider and model, so its API key must be set, and
+each session is saved in session_data/ like any other.
+
+Usage:
+    python -m sandbox.benchmark_assume_defaults --examples 3 --max-rounds 3
+"""
+
+import argparse
+import statistics
+import time
+
+from codeaide.logic.chat_handler import ChatHandler
+from codeaide.utils.constants import ASSUME_DEFAULTS_REPLY
+from codeaide.utils.general_utils import load_examples
+
+
+def time_to_first_code(prompt, assume_defaults, max_rounds):
+    chat_handler = ChatHandler()
+    try:
+        if not chat_handler.api_key_set:
+            raise SystemExit(chat_handler.api_key_message)
+        chat_handler.set_assume_defaults(assume_defaults)
+        started = time.monotonic()
+        message = prompt
+        for _ in range(max_rounds):
+            response = chat_handler.process_input(message)
+            if response["type"] != "questions":
+                break
+            message = ASSUME_DEFAULTS_REPLY
+        elapsed = time.monotonic() - started
+        requests = len(chat_handler.cost_tracker.cost_log)
+        return (elapsed if response["type"] == "code" else None), requests
+    finally:
+        chat_handler.cleanup()
+
+
+def format_result(elapsed, requests):
+    seconds = "no code" if elapsed is None else f"{elapsed:.1f} s"
+    return f"{seconds:>8} / {requests}"
+
+
+def summarize(name, results):
+    times = [elapsed for elapsed, _ in results if elapsed is not None]
+    requests = sum(requests for _, requests in results)
+    median = f"{statistics.median(times):.1f} s" if times else "n/a"
+    print(
+        f"{name:>14}: median {median}, code for {len(times)}/{len(results)} "
+        f"prompts, {requests} requests"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--examples", type=int, default=None, help="Only use the first N examples"
+    )
+    parser.add_argument(
+        "--max-rounds",
+        type=int,
+        default=3,
+        help="The most messages to send for each prompt",
+    )
+    args = parser.parse_args()
+
+    examples = load_examples()[: args.examples]
+    print(f"{'example':<50} {'off (s / requests)':>20} {'on (s / requests)':>20}")
+    results = {False: [], True: []}
+    for example in examples:
+        row = []
+        for assume_defaults in (False, True):
+            result = time_to_first_code(
+                example["prompt"], assume_defaults, args.max_rounds
+            )
+            results[assume_defaults].append(result)
+            row.append(format_result(*result))
+        print(f"{example['description'][:50]:<50} {row[0]:>20} {row[1]:>20}")
+
+    print()
+    summarize("mode off", results[False])
+    summarize("mode on", results[True])
+
+
+if __name__ == "__main__":
+    main()
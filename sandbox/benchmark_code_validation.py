@@ -0,0 +1,120 @@
+"""
+Benchmark the static checks run on every new version of generated code.
+
+Builds a synthetic script of the requested length (imports, classes, functions,
+loops and a main block, with a few undefined names and unused imports) and times
+check_code on it directly and through CodeValidator's worker process, which is
+what ChatHandler uses. The worker is warmed up first, as it is when a session
+starts. No API calls are made.
+
+Usage:
+    python -m sandbox.benchmark_code_validation --lines 1000 --runs 50
+"""
+
+import argparse
+import statistics
+import time
+
+from codeaide.utils.code_validator import CodeValidator, check_code
+
+TARGET_MS = 50
+
+HEADER = """import math
+import os
+import random
+import sys
+from collections import defaultdict
+"""
+
+BLOCK = '''
+
+class Particle{i}:
+    """A particle with a position and a velocity."""
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.vx = random.uniform(-1, 1)
+        self.vy = random.uniform(-1, 1)
+
+    def step(self, dt):
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        if not 0 <= self.x <= 100:
+            self.vx = -self.vx
+        return math.hypot(self.x, self.y)
+
+
+def simulate_{i}(count, steps):
+    particles = [Particle{i}(random.random(), random.random()) for _ in range(count)]
+    totals = defaultdict(float)
+    for step in range(steps):
+        for index, particle in enumerate(particles):
+            totals[index] += particle.step(0.1)
+    return {{key: value / steps for key, value in totals.items()}}
+'''
+
+FOOTER = """
+
+if __name__ == "__main__":
+    results = simulate_0(10, 100)
+    print(len(results), np.mean(list(results.values())))
+    sys.exit(0)
+"""
+
+
+def make_script(lines):
+    blocks = []
+    i = 0
+    while len((HEADER + "".join(blocks) + FOOTER).splitlines()) < lines:
+        blocks.append(BLOCK.format(i=i))
+        i += 1
+    return HEADER + "".join(blocks) + FOOTER
+
+
+def time_ms(function, code, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        problems = function(code)
+        times.append((time.perf_counter() - started) * 1000)
+    return times, problems
+
+
+def report(name, times):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(
+        f"{name:>16}: median {statistics.median(times):6.1f} ms, "
+        f"p95 {p95:6.1f} ms, max {times[-1]:6.1f} ms "
+        f"({'within' if p95 < TARGET_MS else 'OVER'} the {TARGET_MS} ms target)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    code = make_script(args.lines)
+    print(f"Script of {len(code.splitlines())} lines, {args.runs} runs each\n")
+
+    times, problems = time_ms(check_code, code, args.runs)
+    report("in process", times)
+
+    validator = CodeValidator(timeout=30)
+    try:
+        validator.validate("")
+        times, _ = time_ms(validator.validate, code, args.runs)
+        report("worker process", times)
+    finally:
+        validator.shutdown()
+
+    print("\nProblems found:")
+    for problem in problems:
+        print(f"  {problem.severity}: {problem}")
+
+
+if __name__ == "__main__":
+    main()
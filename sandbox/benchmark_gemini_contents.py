@@ -0,0 +1,118 @@
+"""
+Benchmark the cost of building Gemini requests over a long session.
+
+Compares the old approach (re-serializing the whole history into a single prompt
+string on every turn) with the structured contents built by build_google_contents,
+which reuses the already-converted earlier turns.
+For every turn of a synthetic session it measures the time to build the request,
+including the SDK's conversion to a GenerateContentRequest proto, and the size of
+the serialized request. No API calls are made.
+
+Usage:
+    python -m sandbox.benchmark_gemini_contents --turns 100
+"""
+
+import argparse
+import json
+import time
+
+from google.generativeai import protos
+from google.generativeai.types import content_types
+
+from codeaide.utils.api_utils import build_google_contents
+
+
+def legacy_build_prompt(conversation_history):
+    prompt = ""
+    for message in conversation_history:
+        role = message["role"]
+        content = message["content"]
+        prompt += f"{role.capitalize()}: {content}\n\n"
+    return prompt
+
+
+def make_session(turns, code_lines):
+    code = "\n".join(
+        f"    value_{i} = compute(value_{i - 1}, factor={i})  # step {i}"
+        for i in range(code_lines)
+    )
+    history = []
+    for turn in range(turns):
+        history.append(
+            {
+                "role": "user",
+                "content": f"Turn {turn}: please tweak the plot colors and labels.",
+            }
+        )
+        history.append(
+            {
+                "role": "assistant",
+                "content": json.dumps(
+                    {
+                        "text": f"Updated the plot for turn {turn}.",
+                        "questions": [],
+                        "code": code,
+                        "code_version": f"1.{turn}",
+                        "version_description": f"Tweak {turn}",
+                        "requirements": ["matplotlib"],
+                    }
+                ),
+            }
+        )
+    return history
+
+
+def time_build(build, history, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        request = protos.GenerateContentRequest(
+            model="models/gemini-1.5-flash",
+            contents=content_types.to_contents(build(history)),
+        )
+    elapsed = (time.perf_counter() - start) / repeats
+    return elapsed, len(protos.GenerateContentRequest.serialize(request))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--code-lines", type=int, default=150)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    session = make_session(args.turns, args.code_lines)
+    totals = {"legacy": [0.0, 0], "contents": [0.0, 0]}
+
+    print(
+        f"{'turn':>5} {'legacy ms':>10} {'contents ms':>12} "
+        f"{'legacy KB':>10} {'contents KB':>12}"
+    )
+    for turn in range(1, args.turns + 1):
+        # Each request contains the history so far plus the new user message
+        history = session[: 2 * turn - 1]
+        legacy_time, legacy_size = time_build(
+            legacy_build_prompt, history, args.repeats
+        )
+        contents_time, contents_size = time_build(
+            build_google_contents, history, args.repeats
+        )
+        totals["legacy"][0] += legacy_time
+        totals["legacy"][1] += legacy_size
+        totals["contents"][0] += contents_time
+        totals["contents"][1] += contents_size
+        if turn == 1 or turn % 10 == 0:
+            print(
+                f"{turn:>5} {legacy_time * 1000:>10.3f} {contents_time * 1000:>12.3f} "
+                f"{legacy_size / 1024:>10.1f} {contents_size / 1024:>12.1f}"
+            )
+
+    print()
+    for name, (total_time, total_size) in totals.items():
+        print(
+            f"{name:>8}: {total_time * 1000:.1f} ms building requests, "
+            f"{total_size / 1024 / 1024:.1f} MB sent over {args.turns} turns"
+        )
+
+
+if __name__ == "__main__":
+    main()
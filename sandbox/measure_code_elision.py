@@ -0,0 +1,53 @@
+"""
+Measure how many input tokens code elision saves on a saved session.
+
+Replays the requests of a session from its chat_history.json (found in
+session_data/<session_id>/) and, for every request, compares the estimated input
+tokens of the full history with the history that is actually sent once superseded
+code versions are elided.
+
+Usage:
+    python -m sandbox.measure_code_elision session_data/<session_id>/chat_history.json
+"""
+
+import argparse
+import json
+
+from codeaide.utils.context_utils import (
+    elide_superseded_code,
+    estimate_history_tokens,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("chat_history", help="Path to a chat_history.json file")
+    args = parser.parse_args()
+
+    with open(args.chat_history, "r", encoding="utf-8") as f:
+        conversation_history = json.load(f)
+
+    total_full = 0
+    total_sent = 0
+    print(f"{'request':>8} {'full tokens':>12} {'sent tokens':>12} {'saved':>7}")
+    request = 0
+    for i, message in enumerate(conversation_history):
+        if message["role"] != "user":
+            continue
+        request += 1
+        history = conversation_history[: i + 1]
+        full = estimate_history_tokens(history)
+        sent = estimate_history_tokens(elide_superseded_code(history))
+        total_full += full
+        total_sent += sent
+        print(f"{request:>8} {full:>12} {sent:>12} {1 - sent / full:>7.0%}")
+
+    if total_full:
+        print(
+            f"\nTotal over {request} requests: ~{total_full} -> ~{total_sent} "
+            f"estimated input tokens ({1 - total_sent / total_full:.0%} reduction)"
+        )
+
+
+if __name__ == "__main__":
+    main()
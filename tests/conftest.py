@@ -1,3 +1,4 @@
+import sys
 from unittest.mock import Mock
 
 import anthropic
@@ -11,3 +12,24 @@ def mock_anthropic_client(monkeypatch):
     mock_client.messages = mock_messages
     monkeypatch.setattr("codeaide.utils.api_utils.client", mock_client)
     return mock_client
+
+
+class FakeEnvironmentManager:
+    """
+    Stands in for EnvironmentManager, running code with the current interpreter.
+    """
+
+    def __init__(self):
+        self.installed = []
+
+    def get_python_executable(self):
+        return sys.executable
+
+    def install_requirements(self, requirements_file):
+        with open(requirements_file) as f:
+            self.installed.extend(f.read().split())
+
+
+@pytest.fixture
+def environment_manager():
+    return FakeEnvironmentManager()
@@ -0,0 +1,255 @@
+import atexit
+import functools
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from codeaide.logic import chat_handler as chat_handler_module
+from codeaide.logic.chat_handler import ChatHandler
+from codeaide.utils.api_utils import build_response
+from codeaide.utils.cancellation import TurnCancellation
+from codeaide.utils.circuit_breaker import (
+    HALF_OPEN,
+    OPEN,
+    CircuitBreakerRegistry,
+)
+from codeaide.utils.constants import AUTO_MODEL, AUTO_PROVIDER, EDIT_BLOCKS_ADVICE
+from codeaide.utils.file_handler import FileHandler
+
+
+def make_response(text="", questions=None, code=None, code_version=None):
+    return build_response(
+        "anthropic",
+        json.dumps(
+            {
+                "text": text,
+                "questions": questions or [],
+                "code": code,
+                "code_version": code_version,
+                "version_description": "A version" if code else None,
+                "requirements": [],
+            }
+        ),
+        "end_turn",
+    )
+
+
+@pytest.fixture
+def chat_handler(monkeypatch, tmp_path, environment_manager):
+    """
+    A ChatHandler with its session in tmp_path, no virtual environment, and
+    get_ai_response replaced by handler.send, which returns handler.responses in
+    turn.
+    """
+    monkeypatch.setattr(
+        chat_handler_module,
+        "FileHandler",
+        functools.partial(FileHandler, base_dir=str(tmp_path)),
+    )
+    monkeypatch.setattr(
+        chat_handler_module,
+        "EnvironmentManager",
+        lambda session_id: environment_manager,
+    )
+    monkeypatch.setattr(chat_handler_module, "VALIDATE_GENERATED_CODE", False)
+    monkeypatch.setattr(chat_handler_module, "ENABLE_RESPONSE_CACHE", False)
+    monkeypatch.setattr(chat_handler_module, "ENABLE_CONTEXT_BUDGET", False)
+    monkeypatch.setattr(
+        chat_handler_module, "circuit_breakers", CircuitBreakerRegistry()
+    )
+
+    handler = ChatHandler()
+    atexit.unregister(handler.terminal_manager.cleanup)
+    handler.api_key_set = True
+    handler.current_provider = "anthropic"
+    handler.current_model = "claude-3-5-sonnet-20240620"
+    handler.selected_model = (handler.current_provider, handler.current_model)
+    handler.responses = []
+    handler.requests = []
+    handler.models = []
+
+    def send(model=None, turn=None):
+        handler.requests.append(list(handler.conversation_history))
+        handler.models.append(model)
+        response = handler.responses.pop(0)
+        return response(turn) if callable(response) else response
+
+    monkeypatch.setattr(handler, "get_ai_response", send)
+    monkeypatch.setattr(handler, "is_model_usable", lambda provider, model: True)
+    yield handler
+    handler.latency_router.stop()
+
+
+def test_stopped_probe_turn_releases_the_probe(chat_handler):
+    breaker = chat_handler_module.circuit_breakers.get_breaker("anthropic")
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.open_until = 0
+    turn = TurnCancellation()
+
+    def stop(turn):
+        assert breaker.state == HALF_OPEN
+        chat_handler.cancel_turn(turn)
+        return make_response("Too late")
+
+    chat_handler.responses.append(stop)
+
+    response = chat_handler.process_input("Plot a sine wave", turn)
+
+    assert response["type"] == "cancelled"
+    assert breaker.state == OPEN
+    assert breaker.allow_request()
+
+
+def test_auto_mode_keeps_its_tier_for_simple_turns(chat_handler, monkeypatch):
+    monkeypatch.setattr(chat_handler_module, "ENABLE_MODEL_TIERING", True)
+    monkeypatch.setattr(chat_handler, "select_fastest_model", lambda: None)
+    chat_handler.selected_model = (AUTO_PROVIDER, AUTO_MODEL)
+    chat_handler.latest_version = "1.0"
+    chat_handler.responses.append(make_response("Done"))
+
+    chat_handler.process_input("Make the line red")
+
+    assert chat_handler.models == ["claude-3-5-sonnet-20240620"]
+
+
+def test_failed_adopt_leaves_history_unchanged(chat_handler):
+    chat_handler.conversation_history = [{"role": "user", "content": "Hello"}]
+    result = SimpleNamespace(
+        provider="anthropic",
+        model="claude-3-haiku-20240307",
+        response=build_response("anthropic", "not JSON", "end_turn"),
+    )
+    chat_handler.comparison = ({"role": "user", "content": "Plot"}, [result])
+
+    response = chat_handler.adopt_comparison_result(0)
+
+    assert response["type"] == "error"
+    assert chat_handler.conversation_history == [{"role": "user", "content": "Hello"}]
+    assert chat_handler.file_handler.load_chat_history() == [
+        {"role": "user", "content": "Hello"}
+    ]
+
+
+def test_stop_while_handling_a_bad_response(chat_handler, monkeypatch):
+    chat_handler.conversation_history = [{"role": "user", "content": "Hello"}]
+    turn = TurnCancellation()
+    chat_handler.responses.append(make_response("Done"))
+
+    def stop_then_fail(response, reject_invalid_code=False):
+        # What cancel_turn does, while process_input holds turn_lock
+        turn.cancel()
+        chat_handler.roll_back_turn(turn)
+        raise ValueError("Failed to parse AI response")
+
+    monkeypatch.setattr(chat_handler, "process_ai_response", stop_then_fail)
+
+    response = chat_handler.process_input("Plot a sine wave", turn)
+
+    assert response["type"] == "cancelled"
+    assert chat_handler.conversation_history == [{"role": "user", "content": "Hello"}]
+
+
+def test_assume_defaults_replies_once_per_turn(chat_handler, monkeypatch):
+    monkeypatch.setattr(chat_handler_module, "ENABLE_MODEL_TIERING", True)
+    chat_handler.set_assume_defaults(True)
+    chat_handler.latest_version = "1.0"
+    chat_handler.responses.extend(
+        [
+            make_response("Which colour?", questions=["Which colour?"]),
+            make_response("Which width?", questions=["Which width?"]),
+        ]
+    )
+
+    # Too long for the fast tier, unlike the short reply
+    response = chat_handler.process_input("Rewrite the plot " + "in detail " * 30)
+
+    assert response["type"] == "questions"
+    assert response["questions"] == ["Which width?"]
+    assert len(chat_handler.requests) == 2
+    assert chat_handler.models == ["claude-3-5-sonnet-20240620"] * 2
+    assert len(chat_handler.conversation_history) == 4
+
+
+def test_stop_during_assume_defaults_reply_rolls_back_the_turn(chat_handler):
+    chat_handler.conversation_history = [{"role": "user", "content": "Hello"}]
+    chat_handler.set_assume_defaults(True)
+    turn = TurnCancellation()
+
+    def stop(turn):
+        assert chat_handler.cancel_turn(turn)
+        return make_response("Too late")
+
+    chat_handler.responses.extend(
+        [make_response("Which colour?", questions=["Which colour?"]), stop]
+    )
+
+    response = chat_handler.process_input("Plot a sine wave", turn)
+
+    assert response["type"] == "cancelled"
+    assert chat_handler.conversation_history == [{"role": "user", "content": "Hello"}]
+    assert chat_handler.file_handler.load_chat_history() == [
+        {"role": "user", "content": "Hello"}
+    ]
+
+
+def test_auto_mode_without_a_usable_model_does_not_ask_for_a_key(
+    chat_handler, monkeypatch
+):
+    monkeypatch.setattr(chat_handler, "is_model_usable", lambda provider, model: False)
+
+    success, message, needs_api_key = chat_handler.set_model(AUTO_PROVIDER, AUTO_MODEL)
+
+    assert not success
+    assert message.startswith("Auto mode needs an API key")
+    assert not needs_api_key
+    assert chat_handler.selected_model == (
+        "anthropic",
+        "claude-3-5-sonnet-20240620",
+    )
+
+
+def test_hedged_response_is_logged_under_the_provider_that_answered(chat_handler):
+    def answered_by_hedge(turn):
+        chat_handler.response_provider = "openai"
+        return make_response("Done")
+
+    chat_handler.responses.append(answered_by_hedge)
+
+    chat_handler.process_input("Plot a sine wave")
+
+    assert [entry["provider"] for entry in chat_handler.cost_tracker.cost_log] == [
+        "openai"
+    ]
+
+
+def test_abandoned_request_usage_is_estimated(chat_handler):
+    request_history = [{"role": "user", "content": "x" * 400}]
+
+    usage = chat_handler.log_abandoned_request(
+        "openai", request_history, streamed_chars=80
+    )
+
+    assert usage["input_tokens"] == 101
+    assert usage["output_tokens"] == 20
+    assert chat_handler.cost_tracker.cost_log[-1]["provider"] == "openai"
+
+
+def test_edit_blocks_that_do_not_apply_get_their_own_advice(chat_handler):
+    chat_handler.file_handler.save_code("print('hi')\n", "1.0", "First version")
+    chat_handler.latest_version = "1.0"
+    patch = "<<<<<<< SEARCH\nprint('bye')\n=======\nprint('hello')\n>>>>>>> REPLACE"
+    chat_handler.responses.extend(
+        [
+            make_response("Edited", code=patch, code_version="1.1"),
+            make_response("Edited", code="print('hello')\n", code_version="1.1"),
+        ]
+    )
+
+    response = chat_handler.process_input("Say hello")
+
+    assert response["type"] == "code"
+    retry_prompt = chat_handler.requests[1][-1]["content"]
+    assert "could not be applied to version 1.0" in retry_prompt
+    assert EDIT_BLOCKS_ADVICE in retry_prompt
@@ -1,4 +1,4 @@
-from unittest.mock import Mock, patch
+from unittest.mock import ANY, Mock, patch
 import pytest
 import logging
 import os
@@ -39,9 +39,13 @@ def mock_chat_handler():
     mock_handler.api_key_valid = True
     mock_handler.api_key_message = "API key is valid"
     mock_handler.cost_tracker = Mock()
+    mock_handler.assume_defaults = False
+    # Nothing is queued while a response is on its way
+    mock_handler.get_queued_input = Mock(return_value=[])
+    mock_handler.take_queued_input = Mock(return_value=None)
 
     # Mock the set_model method to return a tuple
-    mock_handler.set_model = Mock(return_value=(True, "Model set successfully"))
+    mock_handler.set_model = Mock(return_value=(True, None, False))
 
     return mock_handler
 
@@ -70,8 +74,10 @@ def test_send_message(chat_window, mock_chat_handler):
     QTest.keyClicks(window.input_text, "Hello, AI!")
     # Simulate pressing the submit button
     QTest.mouseClick(window.submit_button, Qt.LeftButton)
+    # process_input runs on a worker thread, so wait for it to finish
+    window.process_thread.wait()
     # Check if the chat_handler's process_input method was called
-    mock_chat_handler.process_input.assert_called_once_with("Hello, AI!")
+    mock_chat_handler.process_input.assert_called_once_with("Hello, AI!", ANY)
 
 
 def test_model_switching(chat_window, mock_chat_handler, caplog):
@@ -133,6 +139,15 @@ def test_handle_code_response(mock_code_popup, chat_window, mock_chat_handler):
     assert "Here's your code" in window.chat_display.toPlainText()
 
 
+def test_assume_defaults_toggle(chat_window, mock_chat_handler):
+    window = chat_window()
+    assert not window.assume_defaults_checkbox.isChecked()
+
+    window.assume_defaults_checkbox.setChecked(True)
+
+    mock_chat_handler.set_assume_defaults.assert_called_once_with(True)
+
+
 def test_load_example(chat_window, monkeypatch):
     window = chat_window()  # Create the window
     # Mock the show_example_dialog function
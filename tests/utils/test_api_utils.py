@@ -6,12 +6,17 @@ import pytest
 from anthropic import APIError
 
 from codeaide.utils.api_utils import (
+    build_anthropic_request,
+    build_google_contents,
+    build_google_generation_config,
+    build_openai_request,
     check_api_connection,
+    client_registry,
+    get_api_client,
     parse_response,
     send_api_request,
 )
 from codeaide.utils.constants import (
-    SYSTEM_PROMPT,
     AI_PROVIDERS,
 )
 
@@ -87,8 +92,7 @@ class TestSendAPIRequest:
         mock_client.chat.completions.create.assert_called_once_with(
             model=model,
             max_tokens=MAX_TOKENS,
-            messages=[{"role": "system", "content": SYSTEM_PROMPT}]
-            + conversation_history,
+            **build_openai_request(model, conversation_history),
         )
         assert result is not None
 
@@ -113,8 +117,7 @@ class TestSendAPIRequest:
         mock_client.messages.create.assert_called_once_with(
             model=model,
             max_tokens=MAX_TOKENS,
-            messages=conversation_history,
-            system=SYSTEM_PROMPT,
+            **build_anthropic_request(conversation_history),
         )
         assert result is None, "Expected None for empty response content"
 
@@ -190,11 +193,174 @@ class TestSendAPIRequest:
         mock_anthropic_client.messages.create.assert_called_once_with(
             model=model,
             max_tokens=custom_max_tokens,
-            messages=conversation_history,
-            system=SYSTEM_PROMPT,
+            **build_anthropic_request(conversation_history),
         )
         assert result == mock_response
 
+    def test_send_api_request_google_contents(self):
+        """
+        Test that Google requests send the history as alternating role/parts
+        turns rather than as a single concatenated prompt.
+        """
+        conversation_history = [
+            {"role": "user", "content": "Plot a sine wave"},
+            {"role": "assistant", "content": '{"text": "Done"}'},
+            {"role": "user", "content": "Make it red"},
+            {"role": "user", "content": "And add a title"},
+        ]
+        mock_client = Mock()
+
+        model = list(AI_PROVIDERS["google"]["models"].keys())[0]
+        send_api_request(mock_client, conversation_history, MAX_TOKENS, model, "google")
+
+        contents = mock_client.generate_content.call_args.kwargs["contents"]
+        assert [content.role for content in contents] == ["user", "model", "user"]
+        assert [part.text for part in contents[2].parts] == [
+            "Make it red",
+            "And add a title",
+        ]
+        assert build_google_contents(conversation_history)[0] is contents[0]
+
+
+class TestStreamAPIRequest:
+    """
+    Tests for streamed requests made through send_api_request.
+
+    These verify that each chunk is passed to the stream callback as it arrives
+    and that the assembled response can be handled like a regular response.
+    """
+
+    def test_stream_openai(self):
+        """
+        Test that a streamed OpenAI response is forwarded chunk by chunk and
+        assembled into a response that parse_response accepts.
+        """
+        content = json.dumps({"text": "Hello", "code": None})
+        chunks = [
+            Mock(
+                usage=None,
+                choices=[Mock(delta=Mock(content=content[:10]), finish_reason=None)],
+            ),
+            Mock(
+                usage=None,
+                choices=[Mock(delta=Mock(content=content[10:]), finish_reason="stop")],
+            ),
+            Mock(usage=Mock(prompt_tokens=5, completion_tokens=7), choices=[]),
+        ]
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value = iter(chunks)
+        received = []
+
+        model = list(AI_PROVIDERS["openai"]["models"].keys())[0]
+        result = send_api_request(
+            mock_client,
+            [{"role": "user", "content": "Hi"}],
+            MAX_TOKENS,
+            model,
+            "openai",
+            stream_callback=received.append,
+        )
+
+        assert "".join(received) == content
+        assert mock_client.chat.completions.create.call_args.kwargs["stream"] is True
+        assert result.choices[0].finish_reason == "stop"
+        assert result.usage.completion_tokens == 7
+        assert parse_response(result, "openai")[0] == "Hello"
+
+    def test_stream_anthropic(self):
+        """
+        Test that a streamed Anthropic response uses the SDK stream helper and
+        returns its final message.
+        """
+        final_message = Response(content=[TextBlock(text='{"text": "Hi"}')])
+        stream = Mock()
+        stream.__iter__ = Mock(
+            return_value=iter(
+                [
+                    Mock(type="content_block_start"),
+                    Mock(
+                        type="content_block_delta",
+                        delta=Mock(text=None, partial_json='{"text": '),
+                    ),
+                    Mock(type="content_block_delta", delta=Mock(text='"Hi"}')),
+                    Mock(type="message_stop"),
+                ]
+            )
+        )
+        stream.get_final_message.return_value = final_message
+        mock_client = Mock()
+        mock_client.messages.stream.return_value.__enter__ = Mock(return_value=stream)
+        mock_client.messages.stream.return_value.__exit__ = Mock(return_value=False)
+        received = []
+
+        model = list(AI_PROVIDERS["anthropic"]["models"].keys())[0]
+        result = send_api_request(
+            mock_client,
+            [{"role": "user", "content": "Hi"}],
+            MAX_TOKENS,
+            model,
+            "anthropic",
+            stream_callback=received.append,
+        )
+
+        assert received == ['{"text": ', '"Hi"}']
+        assert result == final_message
+
+
+class TestStructuredOutput:
+    """
+    Tests for the schema-constrained response formats sent to each provider.
+    """
+
+    def test_anthropic_forces_response_tool(self):
+        """
+        Test that Anthropic requests force a call to the response tool and that
+        the tool input is returned as the response text.
+        """
+        request = build_anthropic_request([{"role": "user", "content": "Hi"}])
+
+        tool = request["tools"][0]
+        assert request["tool_choice"] == {"type": "tool", "name": tool["name"]}
+        assert set(tool["input_schema"]["required"]) == {
+            "text",
+            "questions",
+            "code",
+            "code_version",
+            "version_description",
+            "requirements",
+        }
+
+        block = Mock(type="tool_use", input={"text": "Hi", "code": None})
+        response = Mock(content=[block])
+        assert parse_response(response, "anthropic")[:3] == ("Hi", [], None)
+
+    def test_openai_response_format(self):
+        """
+        Test that OpenAI models that support it get a strict JSON schema and the
+        others get JSON mode.
+        """
+        history = [{"role": "user", "content": "Hi"}]
+
+        schema_format = build_openai_request("gpt-4o-mini", history)["response_format"]
+        json_format = build_openai_request("gpt-3.5-turbo", history)["response_format"]
+
+        assert schema_format["type"] == "json_schema"
+        assert schema_format["json_schema"]["strict"] is True
+        assert json_format == {"type": "json_object"}
+
+    def test_google_response_schema(self):
+        """
+        Test that the Gemini generation config requests JSON that matches the
+        schema, with nullable fields instead of union types.
+        """
+        config = build_google_generation_config(MAX_TOKENS)
+
+        assert config.response_mime_type == "application/json"
+        properties = config.response_schema["properties"]
+        assert properties["code"] == {"type": "string", "nullable": True}
+        assert properties["questions"] == {"type": "array", "items": {"type": "string"}}
+        assert "additionalProperties" not in config.response_schema
+
 
 class TestParseResponse:
     """
@@ -411,6 +577,62 @@ class TestParseResponse:
             parse_response(response, "anthropic")
 
 
+class TestGetAPIClient:
+    """
+    Tests for the client registry behind get_api_client.
+    """
+
+    @pytest.fixture(autouse=True)
+    def empty_registry(self):
+        client_registry.clear()
+        yield
+        client_registry.clear()
+
+    @patch("codeaide.utils.api_utils.config_manager")
+    @patch("anthropic.Anthropic")
+    def test_client_is_reused(self, mock_anthropic, mock_config_manager):
+        """
+        Test that repeated calls with the same provider, model and key return
+        the same client instead of building a new one.
+        """
+        mock_config_manager.get_api_key.return_value = "key-1"
+        model = list(AI_PROVIDERS["anthropic"]["models"].keys())[0]
+
+        first = get_api_client("anthropic", model)
+        second = get_api_client("anthropic", model)
+
+        assert first is second
+        mock_anthropic.assert_called_once()
+
+    @patch("codeaide.utils.api_utils.config_manager")
+    @patch("anthropic.Anthropic")
+    def test_new_key_creates_new_client(self, mock_anthropic, mock_config_manager):
+        """
+        Test that changing the API key results in a new client, while both
+        clients share the provider's HTTP connection pool.
+        """
+        mock_anthropic.side_effect = lambda **kwargs: Mock(**kwargs)
+        model = list(AI_PROVIDERS["anthropic"]["models"].keys())[0]
+
+        mock_config_manager.get_api_key.return_value = "key-1"
+        first = get_api_client("anthropic", model)
+        mock_config_manager.get_api_key.return_value = "key-2"
+        second = get_api_client("anthropic", model)
+
+        assert first is not second
+        assert first.http_client is second.http_client
+
+    @patch("codeaide.utils.api_utils.config_manager")
+    def test_missing_key_returns_none(self, mock_config_manager):
+        """
+        Test that no client is created or cached when the API key is missing.
+        """
+        mock_config_manager.get_api_key.return_value = None
+
+        assert get_api_client("openai", "gpt-4o-mini") is None
+        assert client_registry == {}
+
+
 class TestAPIConnection:
     """
     Test suite for the API connection functionality.
@@ -0,0 +1,98 @@
+import atexit
+
+from codeaide.utils.auto_fix import AutoFixLoop
+from codeaide.utils.headless_runner import RunResult
+from codeaide.utils.terminal_manager import TerminalManager
+
+TRACEBACK = (
+    "Traceback (most recent call last):\n"
+    '  File "script.py", line 1, in <module>\n'
+    "ZeroDivisionError: division by zero"
+)
+
+
+def test_stops_at_first_clean_run():
+    runs = [
+        RunResult(1, f"output\n{TRACEBACK}\n", False, 0.1),
+        RunResult(1, "  File 'script.py'\nSyntaxError: invalid syntax\n", False, 0.1),
+        RunResult(0, "ok\n", False, 0.1),
+    ]
+    sent = []
+
+    def send_message(message, seconds_left):
+        sent.append(message)
+        return {"type": "code", "message": "Here you go"}, 100
+
+    loop = AutoFixLoop(max_iterations=5, budget=60)
+    result = loop.run(
+        "Plot a sine wave",
+        send_message,
+        lambda timeout: runs.pop(0),
+        lambda error: f"Fix: {error}",
+    )
+
+    assert result.succeeded
+    assert result.total_tokens == 300
+    assert [i.succeeded for i in result.iterations] == [False, False, True]
+    assert sent[0] == "Plot a sine wave"
+    assert sent[1] == f"Fix: {TRACEBACK}"
+    assert sent[2].startswith("Fix: ERROR: Script exited with code 1")
+    assert "SyntaxError" in sent[2]
+
+
+def test_iteration_cap():
+    loop = AutoFixLoop(max_iterations=2, budget=60)
+    result = loop.run(
+        "Plot a sine wave",
+        lambda message, seconds_left: ({"type": "code"}, 10),
+        lambda timeout: RunResult(1, TRACEBACK, False, 0.1),
+        lambda error: error,
+    )
+
+    assert not result.succeeded
+    assert len(result.iterations) == 2
+    assert result.reason == "No clean run after 2 iterations"
+
+
+def test_budget():
+    loop = AutoFixLoop(max_iterations=5, budget=0)
+    result = loop.run("Plot a sine wave", None, None, None)
+
+    assert not result.succeeded
+    assert result.iterations == []
+    assert result.reason == "Out of time after 0 seconds"
+
+
+def test_stops_at_response_without_code():
+    loop = AutoFixLoop(max_iterations=5, budget=60)
+    result = loop.run(
+        "Make a game",
+        lambda message, seconds_left: (
+            {"type": "questions", "message": "Which game?"},
+            10,
+        ),
+        None,
+        None,
+    )
+
+    assert not result.succeeded
+    assert result.iterations[0].response_type == "questions"
+    assert result.reason == "The response had no code: Which game?"
+
+
+def test_run_script_captured(environment_manager, tmp_path):
+    script_path = tmp_path / "generated_script_1.0.py"
+    script_path.write_text("print('hello')\n1 / 0\n")
+    requirements_path = tmp_path / "requirements_1.0.txt"
+    requirements_path.write_text("numpy\n")
+
+    terminal_manager = TerminalManager(environment_manager)
+    atexit.unregister(terminal_manager.cleanup)
+
+    result = terminal_manager.run_script_captured(
+        str(script_path), str(requirements_path), timeout=10
+    )
+
+    assert environment_manager.installed == ["numpy"]
+    assert result.output.startswith("hello")
+    assert result.traceback.endswith("ZeroDivisionError: division by zero")
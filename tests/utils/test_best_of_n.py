@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+
+from codeaide.utils.api_utils import build_response
+from codeaide.utils.best_of_n import BestOfNGenerator
+from codeaide.utils.headless_runner import check_syntax, run_headless
+
+
+def response_with_code(code, requirements=()):
+    text = json.dumps(
+        {
+            "text": "Here you go",
+            "questions": [],
+            "code": code,
+            "code_version": "1.0",
+            "version_description": "Test",
+            "requirements": list(requirements),
+        }
+    )
+    return build_response("openai", text, "stop")
+
+
+def test_check_syntax():
+    assert check_syntax("print('hi')") is None
+    assert "SyntaxError" in check_syntax("print('hi'")
+
+
+def test_run_headless(environment_manager):
+    result = run_headless("print('hello')", ["numpy"], environment_manager, timeout=10)
+    assert result.succeeded
+    assert result.output.strip() == "hello"
+    assert environment_manager.installed == ["numpy"]
+
+    result = run_headless("1 / 0", [], environment_manager, timeout=10)
+    assert not result.succeeded
+    assert result.traceback.endswith("ZeroDivisionError: division by zero")
+
+
+def test_script_still_running_at_timeout_succeeds(environment_manager):
+    result = run_headless("while True: pass", [], environment_manager, timeout=0.5)
+
+    assert result.timed_out
+    assert result.succeeded
+
+
+def test_first_clean_candidate_wins(environment_manager):
+    codes = {
+        0.0: "print('missing paren'",
+        0.5: "raise RuntimeError('boom')",
+        1.0: "print('ok')",
+    }
+    # One worker, so the candidates are checked in order
+    generator = BestOfNGenerator(environment_manager, max_workers=1)
+
+    winner, candidates = generator.generate(
+        [{"temperature": t} for t in codes],
+        lambda variant: response_with_code(codes[variant["temperature"]]),
+        "openai",
+    )
+
+    assert winner.variant == {"temperature": 1.0}
+    assert winner.run_result.output.strip() == "ok"
+    errors = {c.variant["temperature"]: c.error for c in candidates}
+    assert "SyntaxError" in errors[0.0]
+    assert "RuntimeError: boom" in errors[0.5]
+
+
+def test_falls_back_to_first_valid_response(environment_manager):
+    generator = BestOfNGenerator(environment_manager, max_workers=2)
+    responses = {"a": None, "b": response_with_code(None)}
+
+    winner, candidates = generator.generate(
+        [{"model": "a"}, {"model": "b"}],
+        lambda variant: responses[variant["model"]],
+        "openai",
+    )
+
+    assert winner.variant == {"model": "b"}
+    assert winner.error == "no code to run"
+    assert candidates[0].error == "the request failed"
+
+
+def test_abandoned_candidates_are_reported(environment_manager):
+    generator = BestOfNGenerator(environment_manager, max_workers=2)
+    reported = []
+    done = threading.Event()
+
+    def send_variant(variant):
+        if variant["model"] == "slow":
+            time.sleep(2)
+        return response_with_code(f"print('{variant['model']}')")
+
+    def on_abandoned(candidate):
+        reported.append(candidate.variant)
+        done.set()
+
+    winner, candidates = generator.generate(
+        [{"model": "fast"}, {"model": "slow"}],
+        send_variant,
+        "openai",
+        on_abandoned=on_abandoned,
+    )
+
+    assert winner.variant == {"model": "fast"}
+    # Still running when the winner was picked
+    assert candidates[1].response is None
+    assert done.wait(10)
+    assert reported == [{"model": "slow"}]
@@ -0,0 +1,80 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from codeaide.utils.api_utils import RequestCancelled, send_api_request
+from codeaide.utils.cancellation import STOPPED_REASON, TurnCancellation
+
+
+def test_stop():
+    turn = TurnCancellation(deadline=None)
+    turn.check()
+    assert turn.remaining() is None
+
+    turn.cancel()
+    turn.cancel("Stopped again")
+
+    assert turn.is_cancelled
+    assert turn.reason == STOPPED_REASON
+    with pytest.raises(RequestCancelled):
+        turn.check()
+
+
+def test_deadline_covers_the_whole_turn():
+    turn = TurnCancellation(deadline=0.1)
+    assert 0 < turn.remaining() <= 0.1
+    assert not turn.is_cancelled
+
+    time.sleep(0.15)
+
+    assert turn.remaining() == 0
+    assert turn.is_cancelled
+    assert turn.reason == "No response within 0.1 seconds"
+
+
+def test_stream_is_abandoned_once_cancelled():
+    turn = TurnCancellation(deadline=None)
+    sent = []
+
+    def chunks():
+        for text in ["a", "b", "c"]:
+            sent.append(text)
+            yield Mock(
+                usage=None,
+                choices=[Mock(delta=Mock(content=text), finish_reason=None)],
+            )
+
+    received = []
+
+    def stream_callback(text):
+        received.append(text)
+        if text == "b":
+            turn.cancel()
+
+    mock_client = Mock()
+    mock_client.chat.completions.create.return_value = chunks()
+
+    with pytest.raises(RequestCancelled):
+        send_api_request(
+            mock_client,
+            [{"role": "user", "content": "Hi"}],
+            100,
+            "gpt-4o-mini",
+            "openai",
+            stream_callback=turn.wrap_callback(stream_callback),
+        )
+
+    assert received == ["a", "b"]
+    assert sent == ["a", "b", "c"]
+
+
+def test_wrapped_callback_without_stream_callback():
+    turn = TurnCancellation(deadline=None)
+    callback = turn.wrap_callback()
+    callback("text")
+
+    turn.cancel()
+
+    with pytest.raises(RequestCancelled):
+        callback("text")
@@ -0,0 +1,100 @@
+import time
+
+from codeaide.utils.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    get_failover_chain,
+)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, base_cooldown=60)
+
+    assert not breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_breaker_probes_after_cooldown():
+    breaker = CircuitBreaker(failure_threshold=1, base_cooldown=0.05)
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    time.sleep(0.07)
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_released_probe_can_be_sent_again():
+    breaker = CircuitBreaker(failure_threshold=1, base_cooldown=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.release_probe()
+
+    assert breaker.state == OPEN
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+
+
+def test_probe_without_result_times_out():
+    breaker = CircuitBreaker(failure_threshold=1, base_cooldown=0, probe_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    time.sleep(0.07)
+
+    assert breaker.allow_request()
+
+
+def test_failed_probe_doubles_cooldown():
+    breaker = CircuitBreaker(failure_threshold=3, base_cooldown=0.05, max_cooldown=1)
+    for _ in range(3):
+        breaker.record_failure()
+    first_cooldown = breaker.open_until - time.monotonic()
+
+    time.sleep(0.07)
+    assert breaker.allow_request()
+    # A single failed probe opens the breaker again
+    assert breaker.record_failure()
+    second_cooldown = breaker.open_until - time.monotonic()
+
+    assert breaker.times_opened == 2
+    assert second_cooldown > first_cooldown
+
+
+def test_failover_chain_follows_providers_once():
+    chain = get_failover_chain("anthropic")
+
+    assert [provider for provider, _ in chain] == ["openai", "google"]
+    assert chain[0] == ("openai", "gpt-3.5-turbo")
+
+
+def test_choose_model_skips_open_and_unusable_providers():
+    registry = CircuitBreakerRegistry(failure_threshold=1, base_cooldown=60)
+    selected = ("anthropic", "claude-3-haiku-20240307")
+
+    assert registry.choose_model(*selected, lambda p, m: True) == selected
+
+    registry.record_failure("anthropic")
+    assert registry.choose_model(*selected, lambda p, m: True)[0] == "openai"
+    assert registry.choose_model(*selected, lambda p, m: p != "openai")[0] == "google"
+
+    registry.record_failure("openai")
+    registry.record_failure("google")
+    assert registry.choose_model(*selected, lambda p, m: True) is None
@@ -0,0 +1,76 @@
+import pytest
+
+from codeaide.utils.code_patcher import PatchError, apply_patch, is_patch
+
+CODE = """import matplotlib.pyplot as plt
+
+
+def plot():
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3], color="blue")
+    ax.set_title("Line")
+    plt.show()
+
+
+if __name__ == "__main__":
+    plot()
+"""
+
+
+def edit_block(search, replace):
+    return f"<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE"
+
+
+def test_is_patch():
+    assert is_patch(edit_block("a\n", "b\n"))
+    assert not is_patch(CODE)
+    assert not is_patch(None)
+
+
+def test_apply_single_edit():
+    patch = edit_block(
+        '    ax.plot([1, 2, 3], color="blue")\n',
+        '    ax.plot([1, 2, 3], color="red")\n',
+    )
+
+    result = apply_patch(CODE, patch)
+
+    assert result == CODE.replace('"blue"', '"red"')
+
+
+def test_apply_multiple_edits_in_order():
+    patch = "\n".join(
+        [
+            edit_block("import matplotlib.pyplot as plt\n", "import numpy as np\n"),
+            edit_block(
+                "import numpy as np\n",
+                "import numpy as np\nimport matplotlib.pyplot as plt\n",
+            ),
+            edit_block('    ax.set_title("Line")\n', '    ax.set_title("Sine")\n'),
+        ]
+    )
+
+    result = apply_patch(CODE, patch)
+
+    assert result.startswith("import numpy as np\nimport matplotlib.pyplot as plt\n")
+    assert '"Sine"' in result
+
+
+def test_trailing_whitespace_is_ignored():
+    patch = edit_block('    ax.set_title("Line")   \n', '    ax.set_title("Sine")\n')
+
+    assert '"Sine"' in apply_patch(CODE, patch)
+
+
+@pytest.mark.parametrize(
+    "patch, message",
+    [
+        (edit_block("    print('missing')\n", "    pass\n"), "doesn't match"),
+        (edit_block("\n\n", "\n"), r"matches \d+ places"),
+        (edit_block("    plt.show()\n", "    plt.show(\n"), "not valid Python"),
+        ("<<<<<<< SEARCH\nplot()\n>>>>>>> REPLACE", "malformed"),
+    ],
+)
+def test_patch_errors(patch, message):
+    with pytest.raises(PatchError, match=message):
+        apply_patch(CODE, patch)
@@ -0,0 +1,82 @@
+from codeaide.utils.code_validator import CodeValidator, check_code
+
+
+def test_clean_code():
+    assert check_code("import math\n\nprint(math.pi)\n") == []
+
+
+def test_syntax_error():
+    (problem,) = check_code("print('hi'\n")
+
+    assert problem.is_error
+    assert problem.message.startswith("SyntaxError")
+
+
+def test_undefined_names_and_unused_imports():
+    code = "import os\nimport sys\n\nx = np.zeros(3)\nprint(sys.argv, x)\n"
+
+    problems = check_code(code)
+
+    assert [(p.severity, p.line) for p in problems] == [
+        ("warning", 1),
+        ("error", 4),
+    ]
+    assert str(problems[1]) == "Line 4: undefined name 'np'"
+
+
+def test_nested_scopes():
+    code = (
+        "import json\n"
+        "\n"
+        "class Grid:\n"
+        "    size = 3\n"
+        "\n"
+        "    def cells(self):\n"
+        "        return range(size)\n"
+        "\n"
+        "def reset():\n"
+        "    global counter\n"
+        "    counter = 0\n"
+        "\n"
+        "def dump():\n"
+        "    import json as j\n"
+        "    return [j.dumps(value) for value in (counter,)]\n"
+    )
+
+    problems = check_code(code)
+
+    assert [str(p) for p in problems] == [
+        "Line 1: 'json' imported but unused",
+        "Line 7: undefined name 'size'",
+    ]
+
+
+def test_imports_declared_global():
+    code = (
+        "def load():\n"
+        "    global np, pd\n"
+        "    import numpy as np\n"
+        "    import pandas as pd\n"
+        "\n"
+        "def zeros():\n"
+        "    return np.zeros(3)\n"
+    )
+
+    problems = check_code(code)
+
+    assert [str(p) for p in problems] == ["Line 4: 'pd' imported but unused"]
+
+
+def test_module_dunders():
+    code = "x: int = 1\nprint(__doc__, __annotations__, __name__, __file__)\n"
+
+    assert check_code(code) == []
+
+
+def test_validator_checks_in_worker_process():
+    validator = CodeValidator(timeout=30)
+    try:
+        (problem,) = validator.validate("print(undefined)\n")
+        assert problem.is_error
+    finally:
+        validator.shutdown()
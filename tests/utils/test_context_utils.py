@@ -0,0 +1,138 @@
+import json
+
+from codeaide.utils.context_utils import (
+    SUMMARY_HEADER,
+    ContextWindowManager,
+    elide_superseded_code,
+    estimate_history_tokens,
+)
+
+
+def assistant_message(version, code, description):
+    return {
+        "role": "assistant",
+        "content": json.dumps(
+            {
+                "text": f"Version {version}",
+                "questions": [],
+                "code": code,
+                "code_version": version,
+                "version_description": description,
+                "requirements": [],
+            }
+        ),
+    }
+
+
+def make_history():
+    return [
+        {"role": "user", "content": "Plot a sine wave"},
+        assistant_message("1.0", "print('v1')\n" * 50, "Initial plot"),
+        {"role": "user", "content": "Make it red"},
+        assistant_message("1.1", "print('v2')\n" * 50, "Red line"),
+        {"role": "user", "content": "What does it do?"},
+        {
+            "role": "assistant",
+            "content": json.dumps({"text": "It plots.", "code": None}),
+        },
+        {"role": "user", "content": "Add a title"},
+    ]
+
+
+def test_only_latest_code_is_sent_in_full():
+    history = make_history()
+
+    request_history = elide_superseded_code(history)
+
+    first = json.loads(request_history[1]["content"])
+    assert "print('v1')" not in first["code"]
+    assert "version 1.0" in first["code"]
+    assert "Initial plot" in first["code"]
+    assert first["text"] == "Version 1.0"
+    assert request_history[3] == history[3]
+    assert request_history[5:] == history[5:]
+
+
+def test_history_is_not_modified():
+    history = make_history()
+    original = json.dumps(history)
+
+    elide_superseded_code(history)
+
+    assert json.dumps(history) == original
+
+
+def test_uses_versions_dict_description():
+    history = make_history()
+    versions_dict = {"1.0": {"version_description": "From the file handler"}}
+
+    request_history = elide_superseded_code(history, versions_dict)
+
+    assert "From the file handler" in json.loads(request_history[1]["content"])["code"]
+
+
+def test_single_version_is_unchanged():
+    history = make_history()[:3]
+
+    assert elide_superseded_code(history) == history
+
+
+def make_long_history(turns=20):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Question {turn} " + "x" * 400})
+        history.append(
+            {
+                "role": "assistant",
+                "content": json.dumps({"text": f"Answer {turn} " + "y" * 400}),
+            }
+        )
+    history.append({"role": "user", "content": "Latest question"})
+    return history
+
+
+def test_history_within_budget_is_unchanged():
+    history = make_history()
+
+    assert ContextWindowManager().fit_to_budget(history, 100000) is history
+
+
+def test_history_over_budget_is_summarized():
+    history = make_long_history()
+
+    request_history = ContextWindowManager().fit_to_budget(history, 1000)
+
+    assert estimate_history_tokens(request_history) <= 1000
+    assert request_history[0]["role"] == "user"
+    assert request_history[0]["content"].startswith(SUMMARY_HEADER.split("{")[0])
+    assert "Question 0" in request_history[0]["content"]
+    assert request_history[-1] == history[-1]
+
+
+def test_latest_code_is_kept():
+    history = make_history() + make_long_history()[1:]
+    history[0] = {"role": "user", "content": "Plot a sine wave " + "z" * 4000}
+
+    request_history = ContextWindowManager().fit_to_budget(history, 1000)
+
+    assert history[3] in request_history
+    assert history[1] not in request_history
+
+
+def test_background_summary_is_used():
+    history = make_long_history()
+    manager = ContextWindowManager()
+    calls = []
+
+    def summarize(messages, previous_summary):
+        calls.append((messages, previous_summary))
+        return "The user asked many questions."
+
+    manager.refresh_summary_async(history, 1000, summarize)
+    manager.summary_thread.join()
+    request_history = manager.fit_to_budget(history, 1000)
+
+    assert calls[0][0][0] == history[0]
+    assert calls[0][1] is None
+    assert "The user asked many questions." in request_history[0]["content"]
+    assert "Question 0" not in request_history[0]["content"]
@@ -0,0 +1,113 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from codeaide.utils.api_utils import build_response, get_token_usage, parse_response
+from codeaide.utils.continuation import (
+    CONTINUATION_PROMPT,
+    complete_truncated_response,
+    is_truncated,
+    remove_overlap,
+)
+
+FULL_TEXT = json.dumps(
+    {
+        "text": "Here is the game.",
+        "questions": [],
+        "code": "\n".join(f"print({i})" for i in range(100)),
+        "code_version": "1.0",
+        "version_description": "Game",
+        "requirements": [],
+    }
+)
+HISTORY = [{"role": "user", "content": "Write a game"}]
+
+
+def usage(provider, output_tokens):
+    if provider == "anthropic":
+        return SimpleNamespace(input_tokens=10, output_tokens=output_tokens)
+    return SimpleNamespace(prompt_tokens=10, completion_tokens=output_tokens)
+
+
+def test_is_truncated():
+    assert is_truncated(build_response("anthropic", "{", "max_tokens"), "anthropic")
+    assert is_truncated(build_response("openai", "{", "length"), "openai")
+    assert not is_truncated(build_response("openai", "{}", "stop"), "openai")
+    finish_reason = SimpleNamespace(name="MAX_TOKENS")
+    assert is_truncated(build_response("google", "{", finish_reason), "google")
+
+
+def test_response_that_is_not_truncated_is_returned_as_is():
+    response = build_response("openai", FULL_TEXT, "stop")
+
+    with patch("codeaide.utils.continuation.send_api_request") as mock_send:
+        result = complete_truncated_response(
+            None, HISTORY, response, 100, "gpt-4o-mini", "openai"
+        )
+
+    assert result is response
+    mock_send.assert_not_called()
+
+
+@patch("codeaide.utils.continuation.send_api_request")
+def test_anthropic_continues_from_prefill(mock_send):
+    pieces = [FULL_TEXT[:300] + "  ", FULL_TEXT[300:700], FULL_TEXT[700:]]
+    mock_send.side_effect = [
+        build_response("anthropic", pieces[1], "max_tokens", usage("anthropic", 100)),
+        build_response("anthropic", pieces[2], "end_turn", usage("anthropic", 50)),
+    ]
+    first = build_response("anthropic", pieces[0], "max_tokens", usage("anthropic", 90))
+    streamed = []
+
+    result = complete_truncated_response(
+        None,
+        HISTORY,
+        first,
+        100,
+        "claude-3-haiku-20240307",
+        "anthropic",
+        stream_callback=streamed.append,
+    )
+
+    # Trailing whitespace is removed from the prefill
+    prefill = mock_send.call_args_list[0].args[1][-1]
+    assert prefill == {"role": "assistant", "content": FULL_TEXT[:300]}
+    assert mock_send.call_args_list[0].kwargs["structured_output"] is False
+    assert parse_response(result, "anthropic")[4] == "Game"
+    assert result.stop_reason == "end_turn"
+    assert get_token_usage(result, "anthropic")["output_tokens"] == 240
+
+
+@patch("codeaide.utils.continuation.send_api_request")
+def test_openai_continuation_removes_repeated_text(mock_send):
+    # The continuation repeats the last part of the truncated text
+    mock_send.return_value = build_response(
+        "openai", FULL_TEXT[250:], "stop", usage("openai", 200)
+    )
+    first = build_response("openai", FULL_TEXT[:300], "length", usage("openai", 100))
+    streamed = []
+
+    result = complete_truncated_response(
+        None,
+        HISTORY,
+        first,
+        100,
+        "gpt-4o-mini",
+        "openai",
+        stream_callback=streamed.append,
+    )
+
+    request_history = mock_send.call_args.args[1]
+    assert request_history[-2] == {"role": "assistant", "content": FULL_TEXT[:300]}
+    assert request_history[-1] == {"role": "user", "content": CONTINUATION_PROMPT}
+    assert result.choices[0].message.content == FULL_TEXT
+    assert streamed == [FULL_TEXT[300:]]
+    assert get_token_usage(result, "openai")["output_tokens"] == 300
+
+
+def test_remove_overlap():
+    text = '{"code": "for i in range(10):\\n    print(i)'
+
+    assert remove_overlap(text, "\\n    print(i)\\nprint('done')") == "\\nprint('done')"
+    assert remove_overlap(text, "```json\n\\nprint('done')\n```") == "\\nprint('done')"
+    assert remove_overlap(text, ")\\n") == ")\\n"
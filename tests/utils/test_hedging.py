@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+
+import pytest
+
+from codeaide.utils.api_utils import (
+    RequestCancelled,
+    build_response,
+    get_response_text,
+    parse_response,
+)
+from codeaide.utils.hedging import HedgedRequester, convert_response
+
+PRIMARY = ("google", "gemini-1.5-pro")
+HEDGE = ("anthropic", "claude-3-5-sonnet-20240620")
+TEXT = json.dumps({"text": "Hi", "questions": [], "code": None})
+
+
+def fake_send(delays, cancelled=None, fail=()):
+    # Each provider streams its response after a delay; failing providers
+    # return None instead
+    def send_request(provider, model, stream_callback):
+        time.sleep(delays[provider])
+        if provider in fail:
+            return None
+        try:
+            stream_callback(TEXT)
+        except RequestCancelled:
+            cancelled.append(provider)
+            raise
+        return build_response(provider, TEXT)
+
+    return send_request
+
+
+def fast_requester(delay=0.05, max_hedges=10):
+    requester = HedgedRequester(max_hedges=max_hedges)
+    for _ in range(10):
+        requester.record_latency(*PRIMARY, delay)
+    return requester
+
+
+def test_fast_primary_is_not_hedged():
+    requester = fast_requester(delay=1)
+    calls = []
+
+    def send_request(provider, model, stream_callback):
+        calls.append(provider)
+        stream_callback(TEXT)
+        return build_response(provider, TEXT)
+
+    response = requester.send(PRIMARY, HEDGE, send_request)
+
+    assert calls == ["google"]
+    assert requester.hedges_sent == 0
+    assert get_response_text(response, "google") == TEXT
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    requester = fast_requester()
+    cancelled = []
+    streamed = []
+
+    response = requester.send(
+        PRIMARY,
+        HEDGE,
+        fake_send({"google": 0.3, "anthropic": 0.05}, cancelled),
+        stream_callback=streamed.append,
+    )
+
+    # The hedge's response is returned in the primary provider's format
+    assert parse_response(response, "google")[0] == "Hi"
+    assert requester.wins == {"hedge": 1}
+    assert streamed == []
+    # The primary request is cancelled the next time it streams
+    time.sleep(0.5)
+    assert cancelled == ["google"]
+    assert streamed == []
+
+
+def test_winner_and_abandoned_requests_are_reported():
+    requester = fast_requester()
+    winners = []
+    abandoned = []
+    done = threading.Event()
+
+    def on_abandoned(arm, response):
+        abandoned.append((arm.provider, response, arm.streamed_chars))
+        done.set()
+
+    requester.send(
+        PRIMARY,
+        HEDGE,
+        fake_send({"google": 0.3, "anthropic": 0.05}, []),
+        on_winner=winners.append,
+        on_abandoned=on_abandoned,
+    )
+
+    assert [arm.provider for arm in winners] == ["anthropic"]
+    assert done.wait(2)
+    # Cancelled at its first chunk, which it had still streamed
+    assert abandoned == [("google", None, len(TEXT))]
+
+
+def test_abandoned_request_that_ends_anyway_is_reported():
+    requester = fast_requester()
+    abandoned = []
+    done = threading.Event()
+
+    def send_request(provider, model, stream_callback):
+        # Not streamed, so it can't be cancelled
+        time.sleep({"google": 0.3, "anthropic": 0.05}[provider])
+        return build_response(provider, TEXT)
+
+    def on_abandoned(arm, response):
+        abandoned.append((arm.provider, response))
+        done.set()
+
+    requester.send(PRIMARY, HEDGE, send_request, on_abandoned=on_abandoned)
+
+    assert done.wait(2)
+    ((provider, response),) = abandoned
+    assert provider == "google"
+    assert get_response_text(response, "google") == TEXT
+
+
+def test_hedge_budget_is_capped():
+    requester = fast_requester(max_hedges=1)
+    send_request = fake_send({"google": 0.2, "anthropic": 0.5})
+
+    requester.send(PRIMARY, HEDGE, send_request)
+    requester.send(PRIMARY, HEDGE, send_request)
+
+    assert requester.hedges_sent == 1
+    requester.start_session()
+    assert requester.hedges_sent == 0
+
+
+def test_failed_primary_waits_for_hedge():
+    requester = fast_requester()
+
+    response = requester.send(
+        PRIMARY, HEDGE, fake_send({"google": 0.1, "anthropic": 0.2}, fail=("google",))
+    )
+
+    assert get_response_text(response, "google") == TEXT
+    assert requester.wins == {"hedge": 1}
+
+
+def test_failed_primary_is_hedged_without_waiting():
+    requester = fast_requester(delay=5)
+
+    started = time.monotonic()
+    response = requester.send(
+        PRIMARY, HEDGE, fake_send({"google": 0, "anthropic": 0}, fail=("google",))
+    )
+
+    assert time.monotonic() - started < 1
+    assert requester.hedges_sent == 1
+    assert get_response_text(response, "google") == TEXT
+
+
+def test_error_is_raised_if_every_request_fails():
+    requester = HedgedRequester()
+
+    def send_request(provider, model, stream_callback):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        requester.send(PRIMARY, None, send_request)
+
+
+def test_hedge_delay_uses_percentile():
+    requester = HedgedRequester(percentile=90)
+    assert requester.get_hedge_delay(*PRIMARY) == 15
+
+    for seconds in range(1, 11):
+        requester.record_latency(*PRIMARY, seconds)
+    assert requester.get_hedge_delay(*PRIMARY) == 9
+
+
+def test_convert_response_keeps_truncation():
+    response = build_response("openai", TEXT, "length")
+
+    converted = convert_response(response, "openai", "anthropic")
+
+    assert converted.stop_reason == "max_tokens"
+    assert get_response_text(converted, "anthropic") == TEXT
+
+
+def test_first_token_is_recorded():
+    requester = HedgedRequester()
+    done = threading.Event()
+
+    def send_request(provider, model, stream_callback):
+        stream_callback("x")
+        done.set()
+        return build_response(provider, TEXT)
+
+    requester.send(HEDGE, None, send_request)
+
+    assert done.is_set()
+    assert len(requester.latencies[HEDGE]) == 1
@@ -0,0 +1,63 @@
+import json
+from collections import namedtuple
+
+import pytest
+
+from codeaide.utils.api_utils import parse_response
+from codeaide.utils.json_repair import (
+    extract_first_object,
+    get_repair_stats,
+    repair_json,
+)
+
+Response = namedtuple("Response", ["content"])
+TextBlock = namedtuple("TextBlock", ["text"])
+
+
+def test_extract_first_object_ignores_surrounding_text():
+    text = 'Here you go:\n```json\n{"text": "a } in a string", "n": {"x": 1}}\n```\nBye'
+
+    assert extract_first_object(text) == '{"text": "a } in a string", "n": {"x": 1}}'
+
+
+def test_extract_first_object_incomplete():
+    assert extract_first_object('{"text": "cut off') is None
+    assert extract_first_object("no object here") is None
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ('{"code": "line 1\nline 2\tindented"}', {"code": "line 1\nline 2\tindented"}),
+        ('{"code": "re.match(r\'\\d+\', s)"}', {"code": "re.match(r'\\d+', s)"}),
+        ('Sure! {"text": "Done"} Let me know.', {"text": "Done"}),
+    ],
+)
+def test_repair_json(raw, expected):
+    assert repair_json(raw) == expected
+
+
+def test_repair_json_unrecoverable():
+    assert repair_json("This is not JSON") is None
+    assert repair_json('{"text": "truncated') is None
+
+
+def test_parse_response_repairs_locally():
+    code = "import re\nprint(re.findall('\\d', 'a1b2'))"
+    raw = (
+        "```json\n"
+        + json.dumps({"text": "Done", "code": "CODE", "code_version": "1.0"})
+        + "\n```\nHope this helps!"
+    ).replace('"CODE"', '"' + code + '"')
+    before = get_repair_stats().get("json", 0)
+
+    text, _, parsed_code, code_version, _, _ = parse_response(
+        Response(content=[TextBlock(text=raw)]), "anthropic"
+    )
+
+    assert text == "Done"
+    assert parsed_code == code
+    assert code_version == "1.0"
+    stats = get_repair_stats()
+    assert stats["json"] == before + 1
+    assert stats["round_trips_saved"] >= stats["json"]
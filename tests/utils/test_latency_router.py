@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from codeaide.utils.latency_router import LatencyRouter, get_models_in_tier
+
+
+@pytest.fixture
+def router(tmp_path):
+    return LatencyRouter(stats_path=str(tmp_path / "latency_stats.json"), alpha=0.5)
+
+
+def test_moving_average(router):
+    router.record("openai", "gpt-4o-mini", 4.0, first_token_latency=1.0)
+    router.record("openai", "gpt-4o-mini", 2.0, first_token_latency=3.0)
+
+    stats = router.stats["openai/gpt-4o-mini"]
+    assert stats["total"] == 3.0
+    assert stats["first_token"] == 2.0
+    assert stats["samples"] == 2
+
+
+def test_stats_persist_across_instances(router):
+    router.record("google", "gemini-1.5-pro", 5.0)
+
+    reloaded = LatencyRouter(stats_path=router.stats_path)
+
+    assert reloaded.get_estimate("google", "gemini-1.5-pro") == 5.0
+
+
+def test_measure_records_first_token(router):
+    streamed = []
+
+    def send_request(callback):
+        time.sleep(0.05)
+        callback("{")
+        time.sleep(0.05)
+        return "response"
+
+    result = router.measure(
+        "anthropic", "claude-3-opus-20240229", send_request, streamed.append
+    )
+
+    stats = router.stats["anthropic/claude-3-opus-20240229"]
+    assert result == "response"
+    assert streamed == ["{"]
+    assert 0.05 <= stats["first_token"] < stats["total"]
+
+
+def test_failed_request_is_not_recorded(router):
+    router.measure("openai", "gpt-4-turbo", lambda callback: None)
+
+    assert router.stats == {}
+
+
+def test_tiers():
+    fast_models = get_models_in_tier("fast")
+    strong_models = get_models_in_tier("strong")
+
+    assert ("anthropic", "claude-3-haiku-20240307") in fast_models
+    assert ("anthropic", "claude-3-haiku-20240307") not in strong_models
+    assert set(strong_models) < set(fast_models)
+
+
+def test_fastest_usable_model_is_chosen(router):
+    router.record("openai", "gpt-4-turbo", 3.0, first_token_latency=0.8)
+    router.record(
+        "anthropic", "claude-3-5-sonnet-20240620", 2.0, first_token_latency=0.5
+    )
+    router.record("openai", "gpt-4o-mini", 1.0, first_token_latency=0.2)
+
+    ranked = router.rank_models("strong")
+    # gpt-4o-mini is the fastest, but it isn't in the strong tier
+    assert ranked[:2] == [
+        ("anthropic", "claude-3-5-sonnet-20240620"),
+        ("openai", "gpt-4-turbo"),
+    ]
+    # Unmeasured models come last
+    assert ranked[2] == ("google", "gemini-1.5-pro")
+
+    assert router.choose_model("strong", lambda p, m: p != "anthropic") == (
+        "openai",
+        "gpt-4-turbo",
+    )
+    assert router.choose_model("strong", lambda p, m: False) is None
@@ -0,0 +1,56 @@
+import json
+import time
+from types import SimpleNamespace
+
+from codeaide.utils.api_utils import build_response
+from codeaide.utils.model_comparison import ModelComparison
+
+
+def response(provider, code):
+    text = json.dumps(
+        {
+            "text": f"Answer from {provider}",
+            "questions": [],
+            "code": code,
+            "code_version": "1.0",
+            "version_description": "Test",
+            "requirements": [],
+        }
+    )
+    if provider == "anthropic":
+        usage = SimpleNamespace(input_tokens=100, output_tokens=20)
+    else:
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+    return build_response(provider, text, usage=usage)
+
+
+def test_compare_models(environment_manager):
+    def send_model(provider, model, stream_callback):
+        time.sleep(0.05)
+        stream_callback("{")
+        if model == "broken":
+            return build_response(provider, "not json at all")
+        if model == "failed":
+            return None
+        code = "print('ok')" if provider == "anthropic" else "1 / 0"
+        return response(provider, code)
+
+    comparison = ModelComparison(environment_manager)
+    results = comparison.compare(
+        [
+            ("anthropic", "claude-3-haiku-20240307"),
+            ("openai", "gpt-4o-mini"),
+            ("openai", "broken"),
+            ("openai", "failed"),
+        ],
+        send_model,
+    )
+
+    haiku, mini, broken, failed = [result.get_summary() for result in results]
+    assert haiku["json_parsed"] and haiku["code_ran"]
+    assert haiku["input_tokens"] == 100 and haiku["output_tokens"] == 20
+    assert 0.05 <= haiku["first_token_latency"] <= haiku["total_latency"]
+    assert mini["json_parsed"] and mini["code_ran"] is False
+    assert "ZeroDivisionError" in mini["error"]
+    assert not broken["json_parsed"] and broken["code_ran"] is None
+    assert failed["error"] == "The request failed"
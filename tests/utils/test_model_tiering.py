@@ -0,0 +1,39 @@
+import pytest
+
+from codeaide.utils.model_tiering import TieringStats, get_fast_model, is_simple_turn
+
+
+@pytest.mark.parametrize(
+    "user_input, has_code, expected",
+    [
+        ("Make the line red", True, True),
+        ("Make the line red", False, False),
+        ("Build me a Pong game. " * 20, True, False),
+        (
+            "The following error occurred when running the code you just "
+            "provided:\n\n```\nTraceback (most recent call last):\n```",
+            True,
+            False,
+        ),
+    ],
+)
+def test_is_simple_turn(user_input, has_code, expected):
+    assert is_simple_turn(user_input, has_code) == expected
+
+
+def test_get_fast_model():
+    assert get_fast_model("anthropic") == "claude-3-haiku-20240307"
+    assert get_fast_model("google") == "gemini-1.5-flash"
+    assert get_fast_model("openai") == "gpt-4o-mini"
+
+
+def test_tiering_report():
+    stats = TieringStats()
+    stats.record_turn(False)
+    stats.record_turn(True, tokens=1200, seconds_saved=3.5)
+    stats.record_escalation()
+
+    assert stats.get_report() == (
+        "1 of 2 turns used the fast tier (1200 tokens used by the fast tier, "
+        "about 3.5 seconds saved); 1 escalated to the selected model"
+    )
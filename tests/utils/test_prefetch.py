@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from codeaide.utils.api_utils import RequestCancelled
+from codeaide.utils.prefetch import SpeculativePrefetcher
+
+
+def streaming_request(chunks, halfway, resume):
+    """
+    A request that streams half its chunks, then waits to be resumed.
+    """
+
+    def send_request(callback):
+        for i, text in enumerate(chunks):
+            if i == len(chunks) // 2:
+                halfway.set()
+                resume.wait(5)
+            callback(text)
+        return "".join(chunks)
+
+    return send_request
+
+
+def test_adopted_part_way_through():
+    halfway, resume = threading.Event(), threading.Event()
+    prefetcher = SpeculativePrefetcher()
+    prefetcher.start("key", streaming_request(["a", "b", "c", "d"], halfway, resume))
+    assert halfway.wait(5)
+
+    request = prefetcher.take("key")
+    received = []
+    resume.set()
+
+    assert request.adopt(received.append) == "abcd"
+    assert received == ["a", "b", "c", "d"]
+    assert prefetcher.take("key") is None
+
+
+def test_discarded_when_not_taken():
+    halfway, resume = threading.Event(), threading.Event()
+    prefetcher = SpeculativePrefetcher()
+    prefetcher.start("key", streaming_request(["a", "b", "c", "d"], halfway, resume))
+    assert halfway.wait(5)
+    request = prefetcher.request
+
+    assert prefetcher.take("another key") is None
+    resume.set()
+
+    assert request.done.wait(5)
+    assert isinstance(request.error, RequestCancelled)
+    assert request.chunks == ["a", "b"]
+
+
+def test_adopting_turn_cancelled():
+    halfway, resume = threading.Event(), threading.Event()
+    prefetcher = SpeculativePrefetcher()
+    prefetcher.start("key", streaming_request(["a", "b", "c", "d"], halfway, resume))
+    assert halfway.wait(5)
+
+    def stream_callback(text):
+        raise RequestCancelled()
+
+    with pytest.raises(RequestCancelled):
+        prefetcher.take("key").adopt(stream_callback)
+    resume.set()
@@ -0,0 +1,343 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import anthropic
+import google.generativeai as genai
+import openai
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from codeaide.utils import api_utils
+from codeaide.utils.api_utils import (
+    build_response,
+    get_token_usage,
+    parse_response,
+    send_api_request,
+)
+from codeaide.utils.constants import (
+    AI_PROVIDERS,
+    GOOGLE_MIN_CACHE_TOKENS,
+    SYSTEM_PROMPT,
+)
+from codeaide.utils.cost_tracker import CostTracker
+
+REPLY = json.dumps({"text": "Done", "questions": [], "code": None})
+
+
+def count_tokens(text):
+    return len(text) // 4 + 1
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    """
+    Imitates the Anthropic and OpenAI endpoints, including their cache usage fields.
+
+    Anthropic: the prompt up to each cache_control breakpoint is cached; a request
+    reads the longest prefix that was cached before and writes the rest.
+    OpenAI: a request reads the longest list of leading messages seen before.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        if self.path.endswith("/messages"):
+            response = self.anthropic_response(body)
+        else:
+            response = self.openai_response(body)
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+    def anthropic_response(self, body):
+        blocks = [body["system"]] if isinstance(body["system"], str) else body["system"]
+        for message in body["messages"]:
+            if isinstance(message["content"], str):
+                blocks.append({"text": message["content"]})
+            else:
+                blocks.extend(message["content"])
+
+        prefix, total, read, written = "", 0, 0, 0
+        for block in blocks:
+            text = block if isinstance(block, str) else block["text"]
+            prefix += text
+            total += count_tokens(text)
+            if isinstance(block, dict) and "cache_control" in block:
+                if prefix in self.server.cache:
+                    read = total
+                else:
+                    self.server.cache.add(prefix)
+                    written = total - read
+        if "tools" in body:
+            content = {
+                "type": "tool_use",
+                "id": "toolu_mock",
+                "name": body["tools"][0]["name"],
+                "input": json.loads(REPLY),
+            }
+        else:
+            content = {"type": "text", "text": REPLY}
+        return {
+            "id": "msg_mock",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [content],
+            "stop_reason": "tool_use" if "tools" in body else "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": total - read - written,
+                "output_tokens": count_tokens(REPLY),
+                "cache_creation_input_tokens": written,
+                "cache_read_input_tokens": read,
+            },
+        }
+
+    def openai_response(self, body):
+        messages = body["messages"]
+        cached = 0
+        for length in range(len(messages), 0, -1):
+            if json.dumps(messages[:length]) in self.server.cache:
+                cached = sum(count_tokens(m["content"]) for m in messages[:length])
+                break
+        for length in range(1, len(messages) + 1):
+            self.server.cache.add(json.dumps(messages[:length]))
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REPLY},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": count_tokens(REPLY),
+                "total_tokens": prompt_tokens + count_tokens(REPLY),
+                "prompt_tokens_details": {"cached_tokens": cached},
+            },
+        }
+
+
+@pytest.fixture
+def mock_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockProviderHandler)
+    server.requests = []
+    server.cache = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def server_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def make_history(turns):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Request {turn} " + "x" * 2000})
+        history.append({"role": "assistant", "content": REPLY})
+    return history[:-1]
+
+
+def test_anthropic_marks_cache_breakpoints(mock_server):
+    client = anthropic.Anthropic(
+        api_key="test",
+        base_url=server_url(mock_server),
+        http_client=anthropic.DefaultHttpxClient(),
+        max_retries=0,
+    )
+
+    send_api_request(
+        client, make_history(3), 100, "claude-3-haiku-20240307", "anthropic"
+    )
+
+    body = mock_server.requests[0]
+    assert body["system"][0]["text"] == SYSTEM_PROMPT
+    assert body["system"][0]["cache_control"] == {"type": "ephemeral"}
+    marked = [
+        i
+        for i, message in enumerate(body["messages"])
+        if isinstance(message["content"], list)
+        and "cache_control" in message["content"][-1]
+    ]
+    assert marked == [2, 4]
+
+
+def test_anthropic_cache_usage_is_recorded(mock_server):
+    client = anthropic.Anthropic(
+        api_key="test",
+        base_url=server_url(mock_server),
+        http_client=anthropic.DefaultHttpxClient(),
+        max_retries=0,
+    )
+    cost_tracker = CostTracker()
+    model = "claude-3-haiku-20240307"
+
+    first = send_api_request(client, make_history(2), 100, model, "anthropic")
+    second = send_api_request(client, make_history(3), 100, model, "anthropic")
+    first_usage = cost_tracker.log_request(first, "anthropic")
+    second_usage = cost_tracker.log_request(second, "anthropic")
+
+    assert parse_response(second, "anthropic")[0] == "Done"
+    assert first_usage["cache_read_tokens"] == 0
+    assert first_usage["cache_write_tokens"] > count_tokens(SYSTEM_PROMPT)
+    # The second turn reads everything the first one wrote
+    assert second_usage["cache_read_tokens"] == first_usage["cache_write_tokens"]
+    assert second_usage["input_tokens"] == 0
+    totals = cost_tracker.get_total_usage()
+    assert totals["cache_read_tokens"] == second_usage["cache_read_tokens"]
+
+
+def test_openai_cached_tokens_are_recorded(mock_server):
+    client = openai.OpenAI(
+        api_key="test", base_url=f"{server_url(mock_server)}/v1", max_retries=0
+    )
+
+    send_api_request(client, make_history(2), 100, "gpt-4o-mini", "openai")
+    response = send_api_request(client, make_history(3), 100, "gpt-4o-mini", "openai")
+    usage = get_token_usage(response, "openai")
+
+    # The system prompt is sent first, so the earlier request is a cached prefix
+    assert mock_server.requests[1]["messages"][0]["content"] == SYSTEM_PROMPT
+    assert usage["cache_read_tokens"] > count_tokens(SYSTEM_PROMPT)
+    assert usage["input_tokens"] == count_tokens(REPLY) + count_tokens(
+        "Request 2 " + "x" * 2000
+    )
+    assert usage["cache_write_tokens"] == 0
+
+
+def test_gemini_cached_tokens_are_recorded():
+    usage_metadata = SimpleNamespace(
+        prompt_token_count=40000,
+        cached_content_token_count=36000,
+        candidates_token_count=500,
+    )
+    response = build_response("google", REPLY, usage=usage_metadata)
+
+    assert get_token_usage(response, "google") == {
+        "input_tokens": 4000,
+        "cache_read_tokens": 36000,
+        "cache_write_tokens": 0,
+        "output_tokens": 500,
+    }
+
+
+class FakeGeminiModel:
+    """
+    Stands in for a GenerativeModel, recording the contents of each request.
+    Requests through an expired cache raise NotFound, as the API does.
+    """
+
+    def __init__(self, requests, cached_content=None, expired=()):
+        self.requests = requests
+        self.cached_content = cached_content
+        self.expired = expired
+
+    def generate_content(self, contents, generation_config):
+        if self.cached_content in self.expired:
+            raise google_exceptions.NotFound("Cached content not found")
+        self.requests.append((self.cached_content, len(contents)))
+        return build_response("google", REPLY)
+
+
+@pytest.fixture
+def gemini_caches(monkeypatch):
+    """
+    Fakes the Gemini caching API. Yields the caches created; the requests sent
+    and the caches to treat as expired are set on the fixture's namespace.
+    """
+    created = []
+    fake = SimpleNamespace(caches=created, requests=[], expired=[])
+
+    def create(model, system_instruction, contents, ttl):
+        cached_content = SimpleNamespace(name=f"cachedContents/{len(created)}")
+        created.append(cached_content)
+        return cached_content
+
+    def from_cached_content(cached_content):
+        return FakeGeminiModel(fake.requests, cached_content, fake.expired)
+
+    monkeypatch.setattr(api_utils, "google_cached_contents", {})
+    monkeypatch.setattr(genai.caching.CachedContent, "create", create)
+    monkeypatch.setattr(
+        genai.GenerativeModel, "from_cached_content", from_cached_content
+    )
+    return fake
+
+
+def make_long_history(turns):
+    # Each pair of messages is about a third of the minimum cacheable size
+    text = "x" * (GOOGLE_MIN_CACHE_TOKENS * 4 // 3)
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Request {i} {text}"})
+        history.append({"role": "assistant", "content": REPLY})
+    history.append({"role": "user", "content": "Latest request"})
+    return history
+
+
+def send_gemini(history, fake):
+    return send_api_request(
+        FakeGeminiModel(fake.requests), history, 100, "gemini-1.5-pro", "google"
+    )
+
+
+def test_gemini_budget_allows_caching():
+    for model in AI_PROVIDERS["google"]["models"].values():
+        assert model["context_budget"] > GOOGLE_MIN_CACHE_TOKENS
+
+
+def test_gemini_caches_long_prefix(gemini_caches):
+    history = make_long_history(4)
+    send_gemini(history, gemini_caches)
+    history += [
+        {"role": "assistant", "content": REPLY},
+        {"role": "user", "content": "Another request"},
+    ]
+
+    send_gemini(history, gemini_caches)
+
+    (cached_content,) = gemini_caches.caches
+    assert gemini_caches.requests == [(cached_content, 1), (cached_content, 3)]
+
+
+def test_gemini_expired_cache_is_dropped(gemini_caches, monkeypatch):
+    send_gemini(make_long_history(4), gemini_caches)
+    later = api_utils.time.monotonic() + 3600
+    monkeypatch.setattr(api_utils.time, "monotonic", lambda: later)
+
+    send_gemini(make_long_history(4), gemini_caches)
+
+    first, second = gemini_caches.caches
+    assert gemini_caches.requests[1] == (second, 1)
+    assert [
+        entry[2] for entry in api_utils.google_cached_contents["gemini-1.5-pro"]
+    ] == [second]
+
+
+def test_gemini_resends_uncached_when_cache_fails(gemini_caches):
+    history = make_long_history(4)
+    send_gemini(history, gemini_caches)
+    gemini_caches.expired.extend(gemini_caches.caches)
+
+    response = send_gemini(history, gemini_caches)
+
+    assert response is not None
+    assert gemini_caches.requests[-1] == (None, 9)
+    assert api_utils.google_cached_contents["gemini-1.5-pro"] == []
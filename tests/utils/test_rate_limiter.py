@@ -0,0 +1,118 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from codeaide.utils.api_utils import (
+    QuotaExceededException,
+    RateLimitException,
+    RequestCancelled,
+    get_retry_after,
+)
+from codeaide.utils.cancellation import TurnCancellation
+from codeaide.utils.rate_limiter import ProviderLimiter, RequestScheduler
+
+
+def test_token_bucket_limits_rate():
+    limiter = ProviderLimiter(requests_per_minute=60)
+
+    for _ in range(limiter.capacity):
+        assert limiter.acquire(timeout=0)
+        limiter.release()
+
+    assert not limiter.acquire(timeout=0.05)
+
+
+def test_concurrency_limit_queues_requests():
+    limiter = ProviderLimiter(requests_per_minute=6000, max_concurrency=1)
+    assert limiter.acquire(timeout=0)
+    acquired = threading.Event()
+
+    def wait_for_slot():
+        if limiter.acquire(timeout=5):
+            acquired.set()
+
+    thread = threading.Thread(target=wait_for_slot)
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    limiter.release()
+    thread.join()
+    assert acquired.is_set()
+
+
+def test_aimd_concurrency():
+    limiter = ProviderLimiter(requests_per_minute=6000, max_concurrency=8)
+
+    limiter.acquire(timeout=0)
+    delay = limiter.release(rate_limited=True, retry_after=0)
+    assert limiter.concurrency_limit == 4
+    assert delay == 0
+
+    limiter.acquire(timeout=0)
+    limiter.release()
+    assert limiter.concurrency_limit == 4.25
+
+
+def test_retry_after_is_honored_with_jitter():
+    limiter = ProviderLimiter(requests_per_minute=6000)
+
+    limiter.acquire(timeout=0)
+    delay = limiter.release(rate_limited=True, retry_after=10)
+
+    assert 10 <= delay <= 12.5
+    assert not limiter.acquire(timeout=0.05)
+
+
+def test_scheduler_sends_rate_limited_request_again():
+    scheduler = RequestScheduler(max_wait=5)
+    calls = []
+
+    def send_request():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RateLimitException("Too many requests", retry_after=0.1)
+        return "response"
+
+    assert scheduler.run("openai", "gpt-4o-mini", send_request) == "response"
+    assert calls[1] - calls[0] >= 0.1
+    # Halved by the 429, then increased by the successful request
+    assert scheduler.get_limiter("openai", "gpt-4o-mini").concurrency_limit == 2.5
+
+
+def test_scheduler_gives_up_after_max_wait():
+    scheduler = RequestScheduler(max_wait=0.5)
+
+    def send_request():
+        raise RateLimitException("Too many requests", retry_after=60)
+
+    with pytest.raises(QuotaExceededException):
+        scheduler.run("google", "gemini-1.5-flash", send_request)
+
+
+def test_stopped_turn_ends_wait_for_capacity():
+    scheduler = RequestScheduler(max_wait=60)
+    limiter = scheduler.get_limiter("google", "gemini-1.5-pro")
+    assert limiter.acquire(timeout=0)
+    turn = TurnCancellation()
+    threading.Timer(0.1, turn.cancel).start()
+
+    started = time.monotonic()
+    with pytest.raises(RequestCancelled):
+        scheduler.run("google", "gemini-1.5-pro", lambda: "sent", turn)
+
+    assert time.monotonic() - started < 1
+
+
+def test_get_retry_after():
+    def response(headers):
+        return SimpleNamespace(headers=headers)
+
+    assert get_retry_after(response({"retry-after": "3"})) == 3
+    assert get_retry_after(response({"retry-after-ms": "250"})) == 0.25
+    assert get_retry_after(response({})) is None
+    http_date = get_retry_after(
+        response({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    )
+    assert http_date == 0
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from codeaide.utils.api_utils import build_response, get_response_text
+from codeaide.utils.response_cache import ResponseCache
+
+HISTORY = [{"role": "user", "content": "Plot a sine wave"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(cache_dir=str(tmp_path))
+
+
+def send_text(text, calls):
+    def send_request():
+        calls.append(text)
+        return build_response("anthropic", text, "end_turn")
+
+    return send_request
+
+
+def test_miss_then_hit(cache):
+    calls = []
+
+    first = cache.get_or_send(
+        "anthropic", "model", 100, HISTORY, send_text('{"text": "hi"}', calls)
+    )
+    second = cache.get_or_send(
+        "anthropic", "model", 100, HISTORY, send_text("unused", calls)
+    )
+
+    assert calls == ['{"text": "hi"}']
+    assert get_response_text(second, "anthropic") == '{"text": "hi"}'
+    assert second.stop_reason == first.stop_reason == "end_turn"
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_key_depends_on_request(cache):
+    calls = []
+    cache.get_or_send("anthropic", "model", 100, HISTORY, send_text("a", calls))
+    cache.get_or_send("anthropic", "model", 200, HISTORY, send_text("b", calls))
+    cache.get_or_send("anthropic", "other", 100, HISTORY, send_text("c", calls))
+
+    assert calls == ["a", "b", "c"]
+
+
+def test_failed_requests_are_not_cached(cache):
+    cache.get_or_send("anthropic", "model", 100, HISTORY, lambda: None)
+
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_evict_unusable_response(cache):
+    calls = []
+    cache.get_or_send("anthropic", "model", 100, HISTORY, send_text("bad", calls))
+
+    cache.evict(ResponseCache.make_key("anthropic", "model", 100, HISTORY))
+    response = cache.get_or_send(
+        "anthropic", "model", 100, HISTORY, send_text("good", calls)
+    )
+
+    assert calls == ["bad", "good"]
+    assert get_response_text(response, "anthropic") == "good"
+
+
+def test_persists_across_instances(tmp_path):
+    calls = []
+    ResponseCache(cache_dir=str(tmp_path)).get_or_send(
+        "google", "model", 100, HISTORY, lambda: build_response("google", "cached")
+    )
+
+    response = ResponseCache(cache_dir=str(tmp_path)).get_or_send(
+        "google", "model", 100, HISTORY, send_text("unused", calls)
+    )
+
+    assert calls == []
+    assert get_response_text(response, "google") == "cached"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_bytes=400)
+    keys = [f"key{i}" for i in range(3)]
+    cache.put(keys[0], {"text": "a" * 100})
+    cache.put(keys[1], {"text": "b" * 100})
+    cache.get(keys[0])  # key0 is now more recently used than key1
+    cache.put(keys[2], {"text": "c" * 100})
+    cache.put("key3", {"text": "d" * 100})
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.total_bytes <= 400
+
+
+def test_deduplicates_in_flight_requests(cache):
+    calls = []
+    release = threading.Event()
+
+    def slow_request():
+        calls.append(1)
+        release.wait(5)
+        return build_response("openai", "shared")
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(
+                cache.get_or_send("openai", "model", 100, HISTORY, slow_request)
+            )
+        )
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    while not cache.in_flight:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert [get_response_text(r, "openai") for r in results] == ["shared"] * 3
+    # Late threads may find the stored response instead of the in-flight one
+    stats = cache.get_stats()
+    assert stats["deduplicated"] + stats["hits"] == 2
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from codeaide.utils.stream_parser import StreamingJSONFieldExtractor
+
+
+@pytest.fixture
+def collected():
+    return {"text": "", "code": ""}
+
+
+@pytest.fixture
+def extractor(collected):
+    def callback(field, text):
+        collected[field] += text
+
+    return StreamingJSONFieldExtractor(["text", "code"], callback)
+
+
+def feed_in_chunks(extractor, payload, chunk_size):
+    for i in range(0, len(payload), chunk_size):
+        extractor.feed(payload[i : i + chunk_size])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_extracts_text_and_code(extractor, collected, chunk_size):
+    content = {
+        "text": 'Here is a "quoted" plot\nwith two lines',
+        "questions": ["Which color?"],
+        "code": 'import numpy as np\nprint("tab\\there")\n',
+        "code_version": "1.0",
+        "version_description": "Initial version",
+        "requirements": ["numpy"],
+    }
+    feed_in_chunks(extractor, json.dumps(content), chunk_size)
+
+    assert collected["text"] == content["text"]
+    assert collected["code"] == content["code"]
+    assert extractor.values == collected
+
+
+def test_ignores_leading_fence(extractor, collected):
+    extractor.feed('```json\n{"text": "hi", "code": null}\n```')
+
+    assert collected == {"text": "hi", "code": ""}
+
+
+def test_ignores_nested_fields_with_same_name(extractor, collected):
+    extractor.feed('{"questions": [{"text": "nested"}], "text": "top"}')
+
+    assert collected["text"] == "top"
+
+
+def test_decodes_unicode_escapes_split_across_chunks(extractor, collected):
+    payload = json.dumps({"text": "Robot \U0001f916 and café"})
+    feed_in_chunks(extractor, payload, 2)
+
+    assert collected["text"] == "Robot \U0001f916 and café"
@@ -0,0 +1,14 @@
+from codeaide.utils.submission_queue import SubmissionQueue
+
+
+def test_queued_messages_are_merged_in_order():
+    submission_queue = SubmissionQueue()
+    assert submission_queue.take() is None
+
+    assert submission_queue.put("Make the line red") == 1
+    assert submission_queue.put("also add a legend") == 2
+    assert submission_queue.pending() == ["Make the line red", "also add a legend"]
+
+    assert submission_queue.take() == "Make the line red\n\nalso add a legend"
+    assert len(submission_queue) == 0
+    assert submission_queue.take() is None